@@ -0,0 +1,48 @@
+"""The per-call overhead of PyLapi itself, with the network stubbed out.
+
+Usage:
+    python benchmarks/bench_call_overhead.py [--calls 3000] [--debug]
+
+A stub transport adapter is mounted on the session of the API class, so
+the times are those of method binding, request building, logging and
+response processing: GET with two route variables and a query arg, and
+PUT with `send` and `give`. The stub transport alone is reported for
+reference. With --debug, the PyLapi log level is DEBUG (records are
+formatted but not shown).
+"""
+
+import argparse
+import logging
+
+import requests
+
+from common import StubAdapter, api_class, best_of
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=3000)
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+
+    logging.getLogger("pylapi").addHandler(logging.NullHandler())
+    logging.getLogger("pylapi").propagate = False
+    api = api_class("https://api.example.com/1.0")
+    api.setLogLevel(logging.DEBUG if args.debug else logging.ERROR)
+    adapter = StubAdapter({"data": {"gid": "1", "name": "Item"}})
+    api.session().mount("https://", adapter)
+
+    item = api.resource("item")
+    session = requests.Session()
+    session.mount("https://", adapter)
+    stub = best_of(lambda: session.get("https://api.example.com/1.0/items/w/1").json(), args.calls)
+    get = best_of(lambda: item.get("w", "1", opt_fields="name"), args.calls)
+    put = best_of(lambda: item.update("1", data={"name": "Item"}), args.calls)
+
+    print(f"stub transport alone: {stub * 1e6:7.1f} us/call")
+    print(f"GET:                  {get * 1e6:7.1f} us/call ({(get - stub) * 1e6:.1f} us in PyLapi)")
+    print(f"PUT (send/give):      {put * 1e6:7.1f} us/call ({(put - stub) * 1e6:.1f} us in PyLapi)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Parsing and serialising realistic payloads with the JSON codecs.
+
+Usage:
+    pip install pylapi[orjson]
+    python benchmarks/bench_json.py [--calls 200]
+
+The payloads are synthetic Asana tasks with full opt_fields and GitHub
+repository listings. Parsing compares `json.loads(response.text)`, as
+PyLapi did before the codecs, against each codec parsing the bytes.
+"""
+
+import argparse
+import json
+
+from pylapi import PyLapiJSONCodec, PyLapiOrjsonCodec
+
+from common import best_of
+
+
+def asana_task(n: int) -> dict:
+    user = {"gid": f"12{n:08d}", "resource_type": "user", "name": f"User Ünïcode {n}"}
+    return {
+        "gid": f"1{n:015d}",
+        "resource_type": "task",
+        "name": f"Task {n}: review the quarterly report",
+        "resource_subtype": "default_task",
+        "approval_status": None,
+        "assignee": user,
+        "assignee_status": "upcoming",
+        "completed": n % 3 == 0,
+        "completed_at": None,
+        "completed_by": None,
+        "created_at": "2024-01-01T12:00:00.000Z",
+        "modified_at": "2024-02-01T12:00:00.000Z",
+        "due_at": None,
+        "due_on": "2024-03-01",
+        "start_on": None,
+        "followers": [user, dict(user, gid="1299999999")],
+        "hearted": False,
+        "hearts": [],
+        "likes": [{"gid": f"3{n}", "user": user}],
+        "num_likes": 1,
+        "html_notes": "<body>" + "Notes with <strong>markup</strong>. " * 20 + "</body>",
+        "notes": "Notes with markup. " * 20,
+        "memberships": [{"project": {"gid": "1200", "name": "Project"}, "section": {"gid": "1201", "name": "Doing"}}],
+        "parent": None,
+        "permalink_url": f"https://app.asana.com/0/1200/1{n:015d}",
+        "projects": [{"gid": "1200", "resource_type": "project", "name": "Project"}],
+        "tags": [{"gid": "1300", "name": "tag"}],
+        "workspace": {"gid": "1000", "resource_type": "workspace", "name": "Workspace"},
+        "custom_fields": [
+            {"gid": f"14{_}", "name": f"Field {_}", "type": "number", "number_value": n * 1.5, "enabled": True,
+                "display_value": str(n * 1.5), "precision": 2, "created_by": user}
+            for _ in range(5)
+        ],
+    }
+
+
+def github_repo(n: int) -> dict:
+    owner = {"login": f"owner{n}", "id": 1000 + n, "node_id": "MDQ6VXNlcjE=", "type": "User", "site_admin": False}
+    repo = {
+        "id": 100000 + n,
+        "node_id": "MDEwOlJlcG9zaXRvcnkxMjk2MjY5",
+        "name": f"repo-{n}",
+        "full_name": f"owner{n}/repo-{n}",
+        "owner": owner,
+        "private": False,
+        "description": "A repository description of reasonable length for a listing.",
+        "fork": False,
+        "created_at": "2011-01-26T19:01:12Z",
+        "updated_at": "2024-01-26T19:14:43Z",
+        "pushed_at": "2024-01-26T19:06:43Z",
+        "size": 108 + n,
+        "stargazers_count": 80 * n,
+        "watchers_count": 80 * n,
+        "language": "Python",
+        "forks_count": 9,
+        "open_issues_count": 0,
+        "default_branch": "main",
+        "topics": ["api", "python", "rest"],
+        "permissions": {"admin": False, "push": False, "pull": True},
+        "license": {"key": "mit", "name": "MIT License", "spdx_id": "MIT"},
+    }
+    for key in ("html", "url", "forks", "keys", "collaborators", "teams", "hooks", "issue_events", "events",
+            "assignees", "branches", "tags", "blobs", "git_tags", "git_refs", "trees", "statuses", "languages",
+            "stargazers", "contributors", "subscribers", "subscription", "commits", "git_commits", "comments",
+            "issue_comment", "contents", "compare", "merges", "archive", "downloads", "issues", "pulls",
+            "milestones", "notifications", "labels", "releases", "deployments"):
+        repo[f"{key}_url"] = f"https://api.github.com/repos/owner{n}/repo-{n}/{key}"
+    return repo
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    codecs = [PyLapiJSONCodec()]
+    try:
+        codecs.append(PyLapiOrjsonCodec())
+    except ImportError:
+        print("orjson is not installed: pip install pylapi[orjson]")
+    payloads = {
+        "Asana tasks (100)": {"data": [asana_task(_) for _ in range(100)]},
+        "Asana task (1)": {"data": asana_task(1)},
+        "GitHub repos (100)": [github_repo(_) for _ in range(100)],
+        "GitHub repo (1)": github_repo(1),
+    }
+
+    print(f"{'payload':<20} {'size':>8}  {'parse: text+json':>16}" + "".join(f" {_.name:>8}" for _ in codecs)
+        + "   serialise:" + "".join(f" {_.name:>8}" for _ in codecs))
+    for name, payload in payloads.items():
+        content = json.dumps(payload).encode()
+        calls = max(1, args.calls * 1000 // len(content)) if len(content) > 1000 else args.calls * 50
+        text = best_of(lambda: json.loads(content.decode()), calls)
+        parse = [best_of(lambda: codec.loads(content), calls) for codec in codecs]
+        serialise = [best_of(lambda: codec.encode(payload), calls) for codec in codecs]
+        print(f"{name:<20} {len(content) / 1000:>5.1f} KB  {text * 1e6:>13.1f} us"
+            + "".join(f" {_ * 1e6:>5.1f} us" for _ in parse)
+            + "            " + "".join(f" {_ * 1e6:>5.1f} us" for _ in serialise))
+
+
+if __name__ == "__main__":
+    main()
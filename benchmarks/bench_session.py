@@ -0,0 +1,38 @@
+"""Per-call requests.<method> against the pooled keep-alive session of an API class.
+
+Usage:
+    python benchmarks/bench_session.py [--calls 1000]
+
+Every call goes to a keep-alive HTTP/1.1 server on localhost. The pooled
+session reuses one TCP connection; requests.<method> opens one per call.
+Over TLS, the difference is much larger.
+"""
+
+import argparse
+
+import requests
+
+from common import Server, api_class, best_of
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1000)
+    args = parser.parse_args()
+
+    server = Server()
+    url = f"{server.url}/items/1"
+    per_call = best_of(lambda: requests.get(url, headers={"Authorization": "Bearer benchmark-token"}).json(), args.calls, repeat=1)
+
+    api = api_class(server.url)
+    item = api.resource("item")
+    server.connections.clear()
+    pooled = best_of(lambda: item.get("items", "1"), args.calls, repeat=1)
+    api.close()
+
+    print(f"requests.get per call: {per_call * 1e3:.2f} ms/call")
+    print(f"pooled session:        {pooled * 1e3:.2f} ms/call ({len(server.connections)} connection(s) for {args.calls} calls)")
+
+
+if __name__ == "__main__":
+    main()
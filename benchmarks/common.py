@@ -0,0 +1,96 @@
+"""Shared helpers of the PyLapi benchmarks: a local API server, a stub transport and a timer."""
+
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from pylapi import PyLapi
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def respond(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+        body = json.dumps({"data": {"gid": self.path.rsplit("/", 1)[-1]}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_PUT = do_POST = respond
+
+
+class Server(ThreadingHTTPServer):
+    """A keep-alive JSON API server on localhost, counting the client connections."""
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server_port}/api"
+        self.connections = set()
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class StubAdapter(requests.adapters.BaseAdapter):
+    """A transport adapter answering every request with the same JSON body, without a network."""
+
+    def __init__(self, body: dict) -> None:
+        super().__init__()
+        self.body = json.dumps(body).encode()
+
+    def send(self, request, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json"
+        response._content = self.body
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+def api_class(url: str) -> type:
+    """A new API class with an "item" resource: GET {workspace}/{gid} and PUT {gid}."""
+    class bAPI(PyLapi):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            self.api_url = url
+
+    @bAPI.resource_class("item", "items")
+    class ItemResource(bAPI):
+        @bAPI.resource_method("{workspace}/{gid}", http_method="GET", give="$.data")
+        def get(self, workspace, gid, opt_fields=None): pass
+
+        @bAPI.resource_method("{gid}", http_method="PUT", send={"data": "$"}, give="$.data")
+        def update(self, gid): pass
+
+    bAPI.auth("benchmark-token")
+    return bAPI
+
+
+def best_of(func, calls: int, repeat: int = 5) -> float:
+    """Seconds per call of `func()`: the best of `repeat` runs of `calls` calls."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = (time.perf_counter() - start) / calls
+        best = elapsed if best == None else min(best, elapsed)
+    return best
@@ -30,6 +30,10 @@ setuptools.setup(
         "requests>=2.5",
         "PyYAML>=5.1",
     ],
+    extras_require={
+        "async": ["aiohttp>=3.8"],
+        "orjson": ["orjson>=3.6"],
+    },
 
     project_urls={
         "Source": about["__url__"],
@@ -0,0 +1,430 @@
+"""Response cache backends of PyLapi, see `PyLapi.configure_cache()`."""
+from __future__ import annotations
+import os
+import json
+import threading
+import time
+import weakref
+import sqlite3
+import zlib
+import requests
+from abc import ABC, abstractmethod
+from typing import NamedTuple
+from collections import OrderedDict
+
+import config  # The `config` namespace of pylapi.py, which puts this directory on sys.path
+
+
+# Memory caches, whose locks are reset in forked processes, as another thread may hold one when the process forks
+_pylapi_memory_caches = weakref.WeakSet()
+
+
+def _pylapi_after_fork() -> None:
+    for cache in list(_pylapi_memory_caches):
+        cache._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_pylapi_after_fork)
+
+
+class PyLapiCacheEntry(NamedTuple):
+    """A cached GET response, with its validators for conditional requests."""
+    url: str
+    status_code: int
+    headers: dict
+    content: bytes
+    etag: str = None
+    last_modified: str = None
+    stored: float = 0.0  # The `time.time()` when stored or last revalidated
+    expires: float = None  # The `time.time()` until when it is served without revalidation
+
+    @classmethod
+    def from_response(cls, response: requests.Response, ttl: float = None) -> PyLapiCacheEntry:
+        stored = time.time()
+        return cls(
+            url=response.url,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            content=response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            stored=stored,
+            expires=stored + ttl if ttl else None,
+        )
+
+
+    @property
+    def size(self) -> int:
+        """The approximate number of bytes the entry takes."""
+        return len(self.content) + sum(len(_) + len(__) for _, __ in self.headers.items()) + len(self.url)
+
+
+    def fresh(self) -> bool:
+        """Whether the entry can be served without revalidation."""
+        return self.expires != None and time.time() < self.expires
+
+
+    def stale(self) -> bool:
+        """Whether the entry is expired and cannot be revalidated, so is of no use."""
+        return self.expires != None and not self.fresh() and not (self.etag or self.last_modified)
+
+
+    def validators(self) -> dict:
+        """The conditional request headers to revalidate the entry with."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+    def revalidated(self, response: requests.Response, ttl: float = None) -> PyLapiCacheEntry:
+        """The entry refreshed by a 304 Not Modified response."""
+        headers = {**self.headers, **response.headers}
+        stored = time.time()
+        return self._replace(
+            headers=headers,
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+            stored=stored,
+            expires=stored + ttl if ttl else None,
+        )
+
+
+    def response(self) -> requests.Response:
+        """A `requests.Response` of the cached response."""
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.headers = requests.structures.CaseInsensitiveDict(self.headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = self.url
+        response._content = self.content
+        return response
+
+
+class PyLapiCache(ABC):
+    """The interface of a response cache backend.
+
+    Keys are strings that start with the request URL, followed by the query,
+    the API class and a hash of the credential, so that an URL can be
+    invalidated with all its queries and sub-paths. Backends must be thread-safe.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> PyLapiCacheEntry:
+        """The entry of a key, or None."""
+
+
+    @abstractmethod
+    def set(self, key: str, entry: PyLapiCacheEntry) -> None:
+        """Store the entry of a key."""
+
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove the entry of a key, if any."""
+
+
+    @abstractmethod
+    def invalidate(self, url: str) -> None:
+        """Remove the entries of an URL and its sub-paths."""
+
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all entries."""
+
+
+    @staticmethod
+    def key_matches(key: str, url: str) -> bool:
+        """Whether a key is of an URL or its sub-paths."""
+        return key.startswith(url) and key[len(url):len(url) + 1] in ("", "?", "/")
+
+
+class PyLapiMemoryCache(PyLapiCache):
+    """An in-process LRU response cache, bounded by entry count and by bytes.
+
+    The least recently used entries are evicted first. Expired entries that
+    cannot be revalidated are dropped when they are looked up or evicted.
+
+    Args:
+        max_entries (int): Maximum number of entries.
+        max_bytes (int): Maximum approximate number of bytes of all entries.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None) -> None:
+        self.max_entries = max_entries if max_entries != None else config.default_cache_max_entries
+        self.max_bytes = max_bytes if max_bytes != None else config.default_cache_max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        _pylapi_memory_caches.add(self)
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def get(self, key: str) -> PyLapiCacheEntry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry == None:
+                return None
+            if entry.stale():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+
+    def set(self, key: str, entry: PyLapiCacheEntry) -> None:
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes and entry.size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self.bytes += entry.size
+            while self._entries and (
+                (self.max_entries and len(self._entries) > self.max_entries)
+                or (self.max_bytes and self.bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+
+    def invalidate(self, url: str) -> None:
+        with self._lock:
+            for key in [_ for _ in self._entries if self.key_matches(_, url)]:
+                self._remove(key)
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+    def _remove(self, key: str) -> None:
+        # With the lock held
+        entry = self._entries.pop(key, None)
+        if entry != None:
+            self.bytes -= entry.size
+
+
+class PyLapiSQLiteCache(PyLapiCache):
+    """An on-disk response cache in an SQLite database, shared by processes.
+
+    The database is in WAL mode, so that readers and a writer in different
+    threads and processes do not block one another. Contents are compressed,
+    and beyond the size caps, the least recently used entries are evicted down
+    to `config.default_cache_low_water` of the caps, so that eviction runs once
+    for many writes. The entry count and size are kept by triggers in a
+    metadata row, so checking the caps does not scan the cache.
+
+    Args:
+        path (str): The database file.
+        max_entries (int): Maximum number of entries.
+        max_bytes (int): Maximum number of (compressed) bytes of all entries.
+        max_age (float): Seconds after which an entry is evicted, even if it can be revalidated.
+        compress_level (int): zlib compression level, 0 for no compression.
+        timeout (float): Seconds to wait for a lock held by another process.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            max_entries: int = None,
+            max_bytes: int = None,
+            max_age: float = None,
+            compress_level: int = None,
+            timeout: float = None,
+        ) -> None:
+        self.path = os.path.expanduser(path)
+        self.max_entries = max_entries if max_entries != None else config.default_cache_max_entries
+        self.max_bytes = max_bytes if max_bytes != None else config.default_cache_max_bytes
+        self.max_age = max_age
+        self.compress_level = compress_level if compress_level != None else config.default_cache_compress_level
+        self.timeout = timeout if timeout != None else config.default_cache_timeout
+        self._local = threading.local()
+        db = self._connection()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS pylapi_cache ("
+            " key TEXT PRIMARY KEY, url TEXT, status_code INTEGER, headers TEXT, content BLOB,"
+            " compressed INTEGER, etag TEXT, last_modified TEXT, stored REAL, expires REAL,"
+            " accessed REAL, size INTEGER)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS pylapi_cache_accessed ON pylapi_cache (accessed)")
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS pylapi_cache_stats ("
+                " id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER, bytes INTEGER)"
+            )
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS pylapi_cache_insert AFTER INSERT ON pylapi_cache BEGIN"
+                " UPDATE pylapi_cache_stats SET entries = entries + 1, bytes = bytes + new.size; END"
+            )
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS pylapi_cache_delete AFTER DELETE ON pylapi_cache BEGIN"
+                " UPDATE pylapi_cache_stats SET entries = entries - 1, bytes = bytes - old.size; END"
+            )
+            if db.execute("SELECT 1 FROM pylapi_cache_stats").fetchone() == None:
+                # Counted once for a cache created by a version without the metadata row
+                db.execute(
+                    "INSERT INTO pylapi_cache_stats SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM pylapi_cache"
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread (and per process, as connections must not cross a fork)
+        db = getattr(self._local, "db", None)
+        if db == None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            # So that the rows replaced by INSERT OR REPLACE fire the delete trigger
+            db.execute("PRAGMA recursive_triggers=ON")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+
+    def __len__(self) -> int:
+        return self._stats()[0]
+
+
+    @property
+    def bytes(self) -> int:
+        return self._stats()[1]
+
+
+    def _stats(self) -> tuple:
+        # (entries, bytes) from the metadata row
+        return self._connection().execute("SELECT entries, bytes FROM pylapi_cache_stats").fetchone()
+
+
+    def get(self, key: str) -> PyLapiCacheEntry:
+        db = self._connection()
+        row = db.execute(
+            "SELECT url, status_code, headers, content, compressed, etag, last_modified, stored, expires, accessed"
+            " FROM pylapi_cache WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row == None:
+            return None
+        url, status_code, headers, content, compressed, etag, last_modified, stored, expires, accessed = row
+        now = time.time()
+        entry = PyLapiCacheEntry(
+            url=url,
+            status_code=status_code,
+            headers=json.loads(headers),
+            content=zlib.decompress(content) if compressed else content,
+            etag=etag,
+            last_modified=last_modified,
+            stored=stored,
+            expires=expires,
+        )
+        if entry.stale() or (self.max_age != None and now - stored > self.max_age):
+            self.delete(key)
+            return None
+        if now - accessed > 1.0:
+            # Only roughly least recently used, to save a write for each read
+            db.execute("UPDATE pylapi_cache SET accessed = ? WHERE key = ?", (now, key))
+        return entry
+
+
+    def set(self, key: str, entry: PyLapiCacheEntry) -> None:
+        content = entry.content
+        compressed = self.compress_level > 0 and len(content) > 0
+        if compressed:
+            content = zlib.compress(content, self.compress_level)
+        headers = json.dumps(entry.headers)
+        size = len(content) + len(headers) + len(key)
+        if self.max_bytes and size > self.max_bytes:
+            self.delete(key)
+            return
+        db = self._connection()
+        db.execute(
+            "INSERT OR REPLACE INTO pylapi_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, entry.url, entry.status_code, headers, content, int(compressed),
+             entry.etag, entry.last_modified, entry.stored, entry.expires, time.time(), size),
+        )
+        count, total = self._stats()
+        if (self.max_entries and count > self.max_entries) or (self.max_bytes and total > self.max_bytes):
+            self.evict()
+
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM pylapi_cache WHERE key = ?", (key,))
+
+
+    def invalidate(self, url: str) -> None:
+        self._connection().execute(
+            "DELETE FROM pylapi_cache WHERE substr(key, 1, ?) = ? AND substr(key, ? + 1, 1) IN ('', '?', '/')",
+            (len(url), url, len(url)),
+        )
+
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM pylapi_cache")
+
+
+    def evict(self) -> None:
+        """Remove the expired entries, then the least recently used ones down to the low-water mark of the size caps."""
+        max_entries = int(self.max_entries * config.default_cache_low_water)
+        max_bytes = int(self.max_bytes * config.default_cache_low_water)
+        now = time.time()
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute(
+                "DELETE FROM pylapi_cache WHERE expires < ? AND etag IS NULL AND last_modified IS NULL",
+                (now,),
+            )
+            if self.max_age != None:
+                db.execute("DELETE FROM pylapi_cache WHERE stored < ?", (now - self.max_age,))
+            if self.max_entries:
+                db.execute(
+                    "DELETE FROM pylapi_cache WHERE key IN"
+                    " (SELECT key FROM pylapi_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (max_entries,),
+                )
+            if self.max_bytes and self._stats()[1] > max_bytes:
+                # Keep the most recently used entries that fit in the low-water mark
+                total = 0
+                evicted = []
+                for key, size in db.execute("SELECT key, size FROM pylapi_cache ORDER BY accessed DESC"):
+                    total += size
+                    if total > max_bytes:
+                        evicted.append((key,))
+                db.executemany("DELETE FROM pylapi_cache WHERE key = ?", evicted)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+
+    def vacuum(self) -> None:
+        """Evict entries, then return the free space of the database file to the file system."""
+        self.evict()
+        db = self._connection()
+        db.execute("VACUUM")
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+    def close(self) -> None:
+        """Close the database connection of this thread."""
+        db = getattr(self._local, "db", None)
+        if db != None:
+            db.close()
+            self._local.db = None
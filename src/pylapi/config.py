@@ -9,6 +9,70 @@ default_api_auth_header_name = "Authorization"
 default_api_auth_type = "Bearer"
 default_api_base_headers = {}
 
+# JSON codec - "json", "orjson" or "auto" (orjson if installed), see PyLapi.configure_json()
+default_json_codec = "json"
+
+# HTTP sessions - one keep-alive connection pool per API class
+default_pool_connections = 10  # Number of hosts to keep a pool for
+default_pool_size = 10  # Maximum connections kept alive per host
+default_pool_block = False  # Block (instead of discard) when the pool is full
+default_keep_alive = True
+
+# Async mode - the maximum number of connections (and so in-flight requests) per API class
+default_async_pool_size = 100
+
+# Timeouts - seconds (None for no timeout), see PyLapiTimeout
+default_connect_timeout = 10.0  # To connect to the server
+default_read_timeout = 300.0  # Between two reads of the response
+default_total_timeout = None  # For a whole call, including retries
+
+# Retries - see PyLapiRetry
+default_retry_total = 3  # Maximum number of retries after the first attempt
+default_retry_backoff = 0.5  # Seconds before the first retry, doubled for each retry
+default_retry_backoff_max = 30.0  # Maximum seconds between two attempts
+default_retry_statuses = (429, 500, 502, 503, 504)
+default_retry_methods = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")  # Idempotent methods
+default_idempotency_header = "Idempotency-Key"
+
+# Hedging - see PyLapiHedge
+default_hedge_delay = 0.1  # Seconds before a hedge is sent
+default_hedge_methods = ("GET", "HEAD")
+default_hedge_window = 100  # Number of recent latencies observed
+default_hedge_min_samples = 20  # Latencies observed before a percentile is used
+default_hedge_workers = 32  # Threads sending hedged requests in blocking mode
+default_hedge_budget = 0.1  # Fraction of the hedged calls that may send a hedge
+
+# Rate limiting - see PyLapiRateLimiter
+default_rate_limit_burst = 10  # Requests that can be sent at once
+default_rate_limit_reserve = 0.1  # Fraction of the quota of a window spread over the rest of the window
+default_rate_limit_margin = 1  # Requests of the quota left unused for other clients and in-flight requests
+default_rate_limit_remaining_header = "X-RateLimit-Remaining"
+default_rate_limit_reset_header = "X-RateLimit-Reset"
+
+# Response cache - see PyLapiMemoryCache and PyLapiSQLiteCache
+default_cache_max_entries = 1024
+default_cache_max_bytes = 64 * 1024 * 1024
+default_cache_compress_level = 6  # zlib compression level of the on-disk cache (0 for none)
+default_cache_timeout = 10.0  # Seconds to wait for the on-disk cache locked by another process
+default_cache_low_water = 0.9  # Fraction of the size caps that eviction trims the on-disk cache down to
+
+# Streamed responses - bytes read from the connection at a time
+default_stream_chunk_size = 65536
+
+# Uploads - bytes read from a file or buffer and sent at a time
+default_upload_chunk_size = 65536
+
+# Downloads - see PyLapiDownload (chunks are read with default_stream_chunk_size)
+default_download_max_resumes = 5  # Range requests made to resume a broken download
+default_download_state_suffix = ".pylapi-resume"  # Appended to the path of a partial download to name the file of its validator
+
+# Batching - see PyLapiBatch (Asana Batch API)
+default_batch_path = "/batch"
+default_batch_max_actions = 10
+
+# Bulk operations - calls in flight at a time, see PyLapi.bulk()
+default_bulk_concurrency = 10
+
 ############################################################
 #
 # Controls
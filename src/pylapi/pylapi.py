@@ -1,27 +1,66 @@
 from __future__ import annotations
 import functools
+import itertools
 import sys
 import os
+import socket
 import re
 import json
 import inspect
+import threading
+import queue
+import multiprocessing
+import pickle
+import weakref
+import asyncio
+import contextvars
+import time
+import random
+import hashlib
+import codecs
+import mimetypes
+import mmap
+import uuid
 import requests
+import urllib3
 from enum import IntEnum
 from abc import ABC
-from typing import Any, Union
-from copy import deepcopy
+from typing import Any, Union, NamedTuple, Callable, Iterable, Iterator, AsyncIterator
+from types import SimpleNamespace
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_futures
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from email.utils import parsedate_to_datetime
+from copy import copy, deepcopy
+from collections import deque
 import logging
 from magico import MagicO
+try:
+    import aiohttp  # Optional: only needed in async mode
+except ImportError:
+    aiohttp = None
+try:
+    import orjson  # Optional: a faster JSON codec, see PyLapiOrjsonCodec
+except ImportError:
+    orjson = None
 # from http import HTTPStatus
 
 
 sys.path.append(os.path.dirname(__file__))
 import config  # So that we can use the `config` namespace, e.g., config.<setting>
+from .cache import PyLapiCacheEntry, PyLapiCache, PyLapiMemoryCache, PyLapiSQLiteCache
 
 logging.basicConfig()
-logger = logging.getLogger()
+# A dedicated logger, so that PyLapi log levels do not affect the application's.
+# Debug records are lazily formatted (and expensive ones guarded by isEnabledFor),
+# so that logging costs nothing when debug is disabled.
+logger = logging.getLogger("pylapi")
 logger.setLevel(config.log_level)
 
+# Loggers of the HTTP libraries, controlled by the deep log level
+deep_loggers = [logging.getLogger(_) for _ in ("urllib3", "requests", "aiohttp")]
+for _deep_logger in deep_loggers:
+    _deep_logger.setLevel(config.deep_log_level)
+
 
 ############################################################
 #
@@ -49,237 +88,4136 @@ requests_http = [
     requests.patch,
 ]
 
-# For logger.debug() use only
-requests_http_name = [
-    'GET',
-    'HEAD',
-    'POST',
-    'PUT',
-    'DELETE',
-    'OPTIONS',
-    'PATCH',
-]
+# For logger.debug() use only
+requests_http_name = [
+    'GET',
+    'HEAD',
+    'POST',
+    'PUT',
+    'DELETE',
+    'OPTIONS',
+    'PATCH',
+]
+
+
+class PyLapiError(Exception):
+    def __init__(self, api_response: dict):
+        self.api_response = api_response
+        self.message = "API response: " + str(self.api_response)
+        super().__init__(self.message)
+
+    def __reduce__(self) -> tuple:
+        # Pickled with its API response rather than its message, e.g., across processes
+        return (type(self), (self.api_response,))
+
+
+class PyLapiTimeoutError(PyLapiError, TimeoutError):
+    """A call timed out, or ran out of its deadline (see `PyLapi.deadline()`)."""
+
+
+############################################################
+#
+# JSON codecs
+#
+
+class PyLapiJSONCodec:
+    """The JSON codec on the standard library `json`.
+
+    Subclass it to plug in another JSON library, see `PyLapi.configure_json()`.
+    """
+
+    name = "json"
+
+    @classmethod
+    def named(cls, name: str) -> PyLapiJSONCodec:
+        """The codec of a name: "json", "orjson", or "auto" for orjson if installed."""
+        if name == "auto":
+            name = "orjson" if orjson != None else "json"
+        if name == "json":
+            return PyLapiJSONCodec()
+        if name == "orjson":
+            return PyLapiOrjsonCodec()
+        raise ValueError(f"Unknown JSON codec: {name}")
+
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Parse JSON from UTF-8 bytes or a str."""
+        return json.loads(data)
+
+
+    def dumps(self, obj: Any, indent: int = None) -> str:
+        """Serialise to a JSON str, e.g., for display."""
+        return json.dumps(obj, indent=indent)
+
+
+    def encode(self, obj: Any) -> bytes:
+        """Serialise to compact UTF-8 JSON bytes, e.g., for a request body."""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, allow_nan=False).encode()
+
+
+class PyLapiOrjsonCodec(PyLapiJSONCodec):
+    """The JSON codec on `orjson`.
+
+    What orjson does not support, e.g., integers beyond 64 bits,
+    non-str keys or indents other than 2, falls back to `json`.
+    """
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson == None:
+            raise ImportError("PyLapiOrjsonCodec requires orjson: pip install pylapi[orjson]")
+
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return super().loads(data)
+
+
+    def dumps(self, obj: Any, indent: int = None) -> str:
+        if indent not in (None, 2):
+            return super().dumps(obj, indent=indent)
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+        except TypeError:
+            return super().dumps(obj, indent=indent)
+
+
+    def encode(self, obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            return super().encode(obj)
+
+
+############################################################
+#
+# Call context
+#
+
+class PyLapiCall(NamedTuple):
+    """The immutable context of one resource method call.
+
+    Each stage of a call (request, response, response data) produces a new
+    context with `_replace()`, so concurrent calls never share state.
+    Timings are `time.perf_counter()` values.
+    """
+    method: str = ""
+    http_method: str = ""
+    request: dict = None
+    response: requests.Response = None
+    response_json: Any = None  # The parsed response body, before `give`
+    response_data: Any = None
+    started: float = 0.0
+    sent: float = 0.0
+    received: float = 0.0
+    finished: float = 0.0
+    attempts: int = 0  # The number of times the request was sent
+    cache: str = ""  # "miss", or "hit" or "revalidated" if served from the response cache, see PyLapiCache
+    coalesced: bool = False  # True if the response is shared with an identical concurrent call
+    deadline: float = None  # When the call times out, if it has a deadline or a total timeout
+    download: Any = None  # The PyLapiDownload of a download call
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds from the start of the call to its end (or its response)."""
+        return (self.finished or self.received or self.started) - self.started
+
+    @property
+    def latency(self) -> float:
+        """Seconds the API took to respond."""
+        return self.received - self.sent if self.received else 0.0
+
+    @property
+    def remaining(self) -> float:
+        """Seconds left before the call times out (None if it has no deadline)."""
+        return self.deadline - time.perf_counter() if self.deadline != None else None
+
+
+############################################################
+#
+# Rewrite templates
+#
+
+class PyLapiRewrite:
+    """A compiled `give`, `load` or `send` rewrite template.
+
+    The template is either a path to data, e.g., "$.data.owner.login",
+    or a dict/list whose "$..." string values are paths to data, e.g.,
+    {"data": "$"}. Compiling turns the template into a tree of builders
+    and path accessors that produce the rewritten data directly.
+    """
+
+    def __init__(self, template: Any) -> None:
+        self.template = template
+        if type(template) == str:
+            # A path to data, e.g., $.data.owner.login
+            self._build = self._compile_path(template)
+        else:
+            self._build = self._compile(template)
+
+
+    def __call__(self, data: Any) -> Any:
+        return self._build(data)
+
+
+    def __repr__(self) -> str:
+        return repr(self.template)
+
+
+    @classmethod
+    def _compile(cls, template: Any):
+        if type(template) == str:
+            if template.startswith("$"):
+                return cls._compile_path(template)
+            return lambda data: template
+        elif type(template) == dict:
+            builders = [(key, cls._compile(value)) for key, value in template.items()]
+            return lambda data: {key: build(data) for key, build in builders}
+        elif type(template) in (list, tuple):
+            builders = [cls._compile(value) for value in template]
+            return lambda data: [build(data) for build in builders]
+        elif type(template) == MagicO:
+            return cls._compile(template.to_data())
+        else:
+            return lambda data: template
+
+
+    @staticmethod
+    def _path_keys(path: str) -> list:
+        # The keys and list indexes of a path, or None if it has anything else, e.g., slices
+        keys = []
+        for key in re.sub(r"(\[(-?[0-9:]+)\])", ".\\1", path).split("."):
+            if key == "$" or not key:
+                continue
+            index = re.fullmatch(r"\[(-?[0-9]+)\]", key)
+            if index:
+                keys.append(int(index.group(1)))
+            elif key.startswith("["):
+                return None
+            else:
+                keys.append(key)
+        return keys
+
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _compile_path(path: str):
+        # Keys and list indexes are compiled; anything else, e.g., slices,
+        # falls back to MagicO at runtime.
+        magico_path = lambda data: MagicO(data)[path]
+        keys = PyLapiRewrite._path_keys(path)
+        if keys == None:
+            return magico_path
+
+        def path_accessor(data):
+            node = data
+            for key in keys:
+                if type(key) == int and type(node) in (list, tuple):
+                    node = node[key]
+                elif type(key) == str and type(node) == dict:
+                    if key not in node:
+                        return None
+                    node = node[key]
+                elif node == None:
+                    # A null in the middle of the path
+                    return None
+                else:
+                    return magico_path(data)
+            return node
+
+        return path_accessor
+
+
+############################################################
+#
+# Pagination
+#
+
+class PyLapiPaginator:
+    """The pagination strategy of an API class or a resource method.
+
+    It tells `PyLapi.iterate()` what query args to add to the first request,
+    where the items are in each page, and what query args fetch the next page.
+    This base class treats every response as a single page.
+
+    Args:
+        items_path (str): The path to the items in the data a method gives, e.g., "$.data".
+            Default to the data as given.
+        page_size (int): The number of items to request per page, if any.
+        page_size_param (str): The query parameter for the page size.
+    """
+
+    def __init__(self, items_path: str = None, page_size: int = None, page_size_param: str = None) -> None:
+        self.items_path = items_path
+        self.page_size = page_size
+        self.page_size_param = page_size_param
+
+
+    def first_query(self) -> dict:
+        """Query args to add to the first request."""
+        if self.page_size and self.page_size_param:
+            return {self.page_size_param: self.page_size}
+        return {}
+
+
+    def items(self, page_data: Any, call: PyLapiCall) -> list:
+        """The items of a page.
+
+        Args:
+            page_data (Any): The data given by the resource method.
+            call (PyLapiCall): The call context of the page.
+
+        Returns: The list of items.
+        """
+        _items = PyLapiRewrite._compile_path(self.items_path)(page_data) if self.items_path else page_data
+        if _items == None:
+            return []
+        return _items if type(_items) == list else [_items]
+
+
+    def next_query(self, call: PyLapiCall, items: list) -> dict:
+        """Query args to fetch the next page, or None if it is the last page.
+
+        Args:
+            call (PyLapiCall): The call context of the current page.
+            items (list): The items of the current page.
+
+        Returns: The query args to fetch the next page with, or None.
+        """
+        return None
+
+
+class PyLapiOffsetPaginator(PyLapiPaginator):
+    """Pagination by an offset token in the response body, e.g., Asana's `next_page.offset`."""
+
+    def __init__(
+            self,
+            offset_path: str = "$.next_page.offset",
+            offset_param: str = "offset",
+            page_size: int = 100,
+            page_size_param: str = "limit",
+            items_path: str = None,
+        ) -> None:
+        super().__init__(items_path=items_path, page_size=page_size, page_size_param=page_size_param)
+        self.offset_path = offset_path
+        self.offset_param = offset_param
+
+
+    def next_query(self, call: PyLapiCall, items: list) -> dict:
+        offset = PyLapiRewrite._compile_path(self.offset_path)(call.response_json)
+        return {self.offset_param: offset} if offset else None
+
+
+class PyLapiLinkPaginator(PyLapiPaginator):
+    """Pagination by the `Link: <...>; rel="next"` response header, e.g., GitHub's."""
+
+    def __init__(self, page_size: int = 100, page_size_param: str = "per_page", items_path: str = None) -> None:
+        super().__init__(items_path=items_path, page_size=page_size, page_size_param=page_size_param)
+
+
+    def next_query(self, call: PyLapiCall, items: list) -> dict:
+        next_link = call.response.links.get("next")
+        if not next_link:
+            return None
+        return dict(parse_qsl(urlsplit(next_link["url"]).query))
+
+
+class PyLapiCursorPaginator(PyLapiPaginator):
+    """Pagination by a cursor taken from the last item, e.g., OpenAI's `has_more` and `after`."""
+
+    def __init__(
+            self,
+            has_more_path: str = "$.has_more",
+            cursor_path: str = "$.id",
+            cursor_param: str = "after",
+            page_size: int = None,
+            page_size_param: str = "limit",
+            items_path: str = "$.data",
+        ) -> None:
+        super().__init__(items_path=items_path, page_size=page_size, page_size_param=page_size_param)
+        self.has_more_path = has_more_path
+        self.cursor_path = cursor_path
+        self.cursor_param = cursor_param
+
+
+    def next_query(self, call: PyLapiCall, items: list) -> dict:
+        if not items or not PyLapiRewrite._compile_path(self.has_more_path)(call.response_json):
+            return None
+        cursor = PyLapiRewrite._compile_path(self.cursor_path)(items[-1])
+        return {self.cursor_param: cursor} if cursor != None else None
+
+
+############################################################
+#
+# Retries
+#
+
+class PyLapiRetry:
+    """The retry policy of an API class or a resource method.
+
+    A request is retried on a transient error status (e.g., 429 or 502) or a
+    connection error, after an exponential backoff with full jitter, or after
+    the `Retry-After` seconds the API asks for. Only idempotent methods are
+    retried by default: POST and PATCH are retried only with `retry_post=True`,
+    or when the request carries an idempotency key header.
+
+    Args:
+        total (int): Maximum number of retries after the first attempt.
+        backoff (float): Seconds before the first retry, doubled for each retry.
+        backoff_max (float): Maximum seconds between two attempts.
+        jitter (bool): Randomize the backoff between 0 and its full length.
+        statuses (tuple): The response status codes to retry.
+        methods (tuple): The HTTP methods to retry.
+        retry_post (bool): Also retry POST and PATCH requests.
+        idempotency_header (str): The request header that makes any method retryable.
+        respect_retry_after (bool): Wait as long as the `Retry-After` response header asks.
+        deadline (float): Seconds from the start of the call after which no more retries are made.
+    """
+
+    def __init__(
+            self,
+            total: int = None,
+            backoff: float = None,
+            backoff_max: float = None,
+            jitter: bool = True,
+            statuses: tuple = None,
+            methods: tuple = None,
+            retry_post: bool = False,
+            idempotency_header: str = None,
+            respect_retry_after: bool = True,
+            deadline: float = None,
+        ) -> None:
+        self.total = total if total != None else config.default_retry_total
+        self.backoff = backoff if backoff != None else config.default_retry_backoff
+        self.backoff_max = backoff_max if backoff_max != None else config.default_retry_backoff_max
+        self.jitter = jitter
+        self.statuses = frozenset(statuses if statuses != None else config.default_retry_statuses)
+        self.methods = frozenset(_.upper() for _ in (methods if methods != None else config.default_retry_methods))
+        self.retry_post = retry_post
+        self.idempotency_header = (idempotency_header if idempotency_header != None else config.default_idempotency_header).lower()
+        self.respect_retry_after = respect_retry_after
+        self.deadline = deadline
+
+
+    def __repr__(self) -> str:
+        return f"PyLapiRetry(total={self.total}, backoff={self.backoff}, deadline={self.deadline})"
+
+
+    def allows(self, http_method: str, request: dict) -> bool:
+        """Whether a request may be retried at all.
+
+        Args:
+            http_method (str): The HTTP method of the request, e.g., "GET".
+            request (dict): The request args, with the "headers" sent.
+
+        Returns: True if the request is idempotent, or made so by policy or header.
+        """
+        if self.total <= 0:
+            return False
+        if http_method in self.methods:
+            return True
+        if self.retry_post and http_method in ("POST", "PATCH"):
+            return True
+        headers = (request or {}).get("headers") or {}
+        return any(_.lower() == self.idempotency_header for _ in headers)
+
+
+    @staticmethod
+    def retry_after(response: requests.Response) -> float:
+        """The seconds to wait as asked by the `Retry-After` header, or None."""
+        value = response.headers.get("Retry-After") if response != None else None
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+    def backoff_delay(self, attempt: int) -> float:
+        """The backoff seconds before the retry after the `attempt`-th attempt."""
+        delay = min(self.backoff * (2 ** (attempt - 1)), self.backoff_max)
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+    def next_delay(self, attempt: int, started: float, response: requests.Response = None, error: Exception = None) -> float:
+        """The seconds to wait before retrying, or None to stop.
+
+        Args:
+            attempt (int): The number of attempts made so far.
+            started (float): The `time.perf_counter()` when the call started.
+            response (requests.Response): The response of the last attempt, if any.
+            error (Exception): The connection error of the last attempt, if any.
+
+        Returns: The delay in seconds, or None if the last attempt is final.
+        """
+        if attempt > self.total:
+            return None
+        if error == None and (response == None or response.status_code not in self.statuses):
+            return None
+        delay = self.retry_after(response) if self.respect_retry_after else None
+        if delay == None:
+            delay = self.backoff_delay(attempt)
+        if self.deadline != None and time.perf_counter() + delay - started > self.deadline:
+            return None
+        return delay
+
+
+# Transport errors worth retrying
+_pylapi_transient_errors = (requests.ConnectionError, requests.Timeout)
+if aiohttp != None:
+    _pylapi_transient_errors += (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+# Errors of a broken download, which can be resumed
+_pylapi_download_errors = _pylapi_transient_errors + (requests.exceptions.ChunkedEncodingError,)
+if aiohttp != None:
+    _pylapi_download_errors += (aiohttp.ClientPayloadError,)
+
+
+############################################################
+#
+# Timeouts
+#
+
+class PyLapiTimeout(NamedTuple):
+    """The timeouts of an API class or a resource method, in seconds (None for no timeout).
+
+    A number sets both the connect and read timeouts, see `PyLapiTimeout.of()`.
+    """
+    connect: float = config.default_connect_timeout  # To connect to the server
+    read: float = config.default_read_timeout  # Between two reads of the response
+    total: float = config.default_total_timeout  # For a whole call, including retries
+
+    @classmethod
+    def of(cls, value: Union[float, tuple, PyLapiTimeout]) -> PyLapiTimeout:
+        """A timeout from a PyLapiTimeout, a tuple (connect, read[, total]), or a number of seconds."""
+        if isinstance(value, PyLapiTimeout):
+            return value
+        if type(value) == tuple:
+            return cls(*value)
+        if type(value) in (int, float):
+            return cls(value, value)
+        raise ValueError(f"Invalid timeout: {value}")
+
+
+    def attempt(self, remaining: float = None) -> tuple:
+        """The (connect, read) timeouts of a request, within the seconds remaining of its call."""
+        if remaining == None:
+            return (self.connect, self.read)
+        return tuple(min(_, remaining) if _ != None else remaining for _ in (self.connect, self.read))
+
+
+class PyLapiDeadline:
+    """A deadline shared by all calls made in its context, including their retries,
+    pages and callbacks, see `PyLapi.deadline()`.
+
+    Nested deadlines can only shorten the deadline in effect.
+
+    Args:
+        seconds (float): Seconds from now.
+    """
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.at = None
+        self._token = None
+
+
+    @staticmethod
+    def current() -> float:
+        """The deadline in effect (a `time.perf_counter()` value), or None."""
+        return _pylapi_deadline.get()
+
+
+    @property
+    def remaining(self) -> float:
+        """Seconds left before the deadline."""
+        return self.at - time.perf_counter() if self.at != None else self.seconds
+
+
+    def __enter__(self) -> PyLapiDeadline:
+        self.at = time.perf_counter() + self.seconds
+        current = _pylapi_deadline.get()
+        if current != None and current < self.at:
+            self.at = current
+        self._token = _pylapi_deadline.set(self.at)
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        _pylapi_deadline.reset(self._token)
+
+
+    async def __aenter__(self) -> PyLapiDeadline:
+        return self.__enter__()
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self.__exit__(exc_type, exc_value, traceback)
+
+
+# The deadline in effect (a `time.perf_counter()` value)
+_pylapi_deadline = contextvars.ContextVar("pylapi_deadline", default=None)
+
+# Errors of a request that timed out
+_pylapi_timeout_errors = (requests.Timeout, asyncio.TimeoutError)
+
+
+############################################################
+#
+# Hedging
+#
+
+class PyLapiHedge:
+    """The hedging policy of an API class or a resource method.
+
+    A GET that has not completed after `delay` seconds, or after the
+    `percentile` of the latencies observed, is sent again, and the first
+    response to arrive is used. The other request is cancelled in async mode,
+    or its response discarded in blocking mode. The delay starts when the
+    request is sent. A hedge is only sent within the `budget`, and if the
+    rate limiter can send a request right away.
+
+    In blocking mode, both requests are sent by a pool of `workers` threads
+    of the policy, so that the call can return with either of them. Requests
+    never wait for a thread of the pool: when all are busy, the request is sent
+    by the calling thread, without a hedge.
+
+    Args:
+        delay (float): Seconds before a hedge is sent; with `percentile`, until enough latencies are observed.
+        percentile (float): Send a hedge after this percentile of the observed latencies, e.g., 95.
+        methods (tuple): The HTTP methods to hedge.
+        window (int): Number of recent latencies observed.
+        min_samples (int): Latencies observed before `percentile` is used.
+        workers (int): Threads sending the requests of hedged calls in blocking mode.
+        budget (float): Fraction of the calls that may send a hedge, e.g., 0.1 for one in ten.
+    """
+
+    def __init__(
+            self,
+            delay: float = None,
+            percentile: float = None,
+            methods: tuple = None,
+            window: int = None,
+            min_samples: int = None,
+            workers: int = None,
+            budget: float = None,
+        ) -> None:
+        if percentile != None and not 0 < percentile < 100:
+            raise ValueError(f"Invalid percentile: {percentile}")
+        if budget != None and not 0 <= budget <= 1:
+            raise ValueError(f"Invalid budget: {budget}")
+        self.delay = delay if delay != None or percentile != None else config.default_hedge_delay
+        self.percentile = percentile
+        self.methods = frozenset(_.upper() for _ in (methods if methods != None else config.default_hedge_methods))
+        self.window = window if window != None else config.default_hedge_window
+        self.min_samples = min_samples if min_samples != None else config.default_hedge_min_samples
+        self.workers = workers if workers != None else config.default_hedge_workers
+        self.budget = budget if budget != None else config.default_hedge_budget
+        self._latencies = deque(maxlen=self.window)
+        self._credit = 1.0  # Hedges that can be sent, earning `budget` per call
+        self._busy = 0  # Threads of the pool reserved
+        self._lock = threading.Lock()
+        self._executor = None
+        _pylapi_forkables.add(self)
+
+
+    def __repr__(self) -> str:
+        return f"PyLapiHedge(delay={self.delay}, percentile={self.percentile})"
+
+
+    def _after_fork(self) -> None:
+        # The threads of the pool are not in the forked process
+        self._lock = threading.Lock()
+        self._executor = None
+        self._busy = 0
+
+
+    def allows(self, http_method: str) -> bool:
+        """Whether requests of an HTTP method are hedged."""
+        return http_method in self.methods
+
+
+    def observe(self, latency: float) -> None:
+        """Record the seconds a request took to respond."""
+        with self._lock:
+            self._latencies.append(latency)
+
+
+    def hedge_delay(self) -> float:
+        """The seconds before a hedge is sent, or None not to send one."""
+        if self.percentile != None:
+            with self._lock:
+                latencies = sorted(self._latencies) if len(self._latencies) >= self.min_samples else None
+            if latencies:
+                return latencies[min(int(len(latencies) * self.percentile / 100), len(latencies) - 1)]
+        return self.delay
+
+
+    def earn(self) -> None:
+        """Add the budget of a call, up to one hedge."""
+        with self._lock:
+            self._credit = min(self._credit + self.budget, 1.0)
+
+
+    def spend(self) -> bool:
+        """Take the budget of a hedge if there is enough."""
+        with self._lock:
+            if self._credit < 1.0:
+                return False
+            self._credit -= 1.0
+            return True
+
+
+    def reserve(self) -> bool:
+        """Reserve a thread of the pool if one is not busy."""
+        with self._lock:
+            if self._busy >= self.workers:
+                return False
+            self._busy += 1
+            return True
+
+
+    def release(self) -> None:
+        """Release a thread of the pool reserved with `reserve()`."""
+        with self._lock:
+            self._busy -= 1
+
+
+    def executor(self) -> ThreadPoolExecutor:
+        """The threads sending the requests of hedged calls in blocking mode."""
+        if self._executor == None:
+            with self._lock:
+                if self._executor == None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pylapi-hedge")
+        return self._executor
+
+
+############################################################
+#
+# Rate limiting
+#
+
+class PyLapiTokenBucket:
+    """A thread-safe token bucket pacing the requests of one API quota.
+
+    Each request takes a token. Tokens are refilled at `rate` per second up to
+    `burst`. The quota the API reports is spent as fast as the rate allows
+    until only its `reserve` is left, which is then spread over the rest of the
+    quota window, so that short jobs are not slowed down and long ones do not
+    run out of quota long before the window resets. All requests are held back
+    while the API asks to retry later.
+
+    Args:
+        rate (float): Maximum requests per second, or None for no fixed rate.
+        burst (int): Maximum requests that can be sent at once.
+        reserve (float): The fraction of the quota of a window that is paced.
+    """
+
+    def __init__(self, rate: float = None, burst: int = None, reserve: float = None) -> None:
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst if burst != None else config.default_rate_limit_burst
+        self.reserve = reserve if reserve != None else config.default_rate_limit_reserve
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.quota = None  # Requests left in the reported quota window
+        self.quota_reserve = 0.0  # Requests of the window that are paced
+        self.reset_at = 0.0  # When the reported quota window resets
+        self._lock = threading.Lock()
+        _pylapi_forkables.add(self)
+
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+
+    def take(self) -> float:
+        """Take a token if one is available, or tell how long to wait before trying again.
+
+        Returns: 0.0 if a token is taken, or the seconds to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.reset_at and now >= self.reset_at:
+                # A new quota window: back to the configured rate until the API reports again
+                self.rate = self.max_rate
+                self.quota = None
+                self.reset_at = 0.0
+            if self.blocked_until > now:
+                return self.blocked_until - now
+            if self.quota != None and self.quota < 1:
+                return max(self.reset_at - now, 0.001)
+            self._refill(now)
+            self._pace(now)
+            if self.rate == None or self.tokens >= 1:
+                if self.rate != None:
+                    self.tokens -= 1
+                if self.quota != None:
+                    self.quota -= 1
+                return 0.0
+            wait = (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+            if self.reset_at:
+                # The rate may change with the new quota window
+                wait = min(wait, self.reset_at - now)
+            return max(wait, 0.001)
+
+
+    def _refill(self, now: float) -> None:
+        if self.rate != None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def _pace(self, now: float) -> None:
+        # Spread the reserve of the quota over the rest of the window
+        if self.quota == None or self.quota > self.quota_reserve:
+            self.rate = self.max_rate
+            return
+        rate = self.quota / max(self.reset_at - now, 0.001)
+        if self.rate == None:
+            # Paced from now on, with no tokens saved up
+            self.tokens = min(self.tokens, 1.0)
+        self.rate = min(rate, self.max_rate) if self.max_rate != None else rate
+
+
+    def update(self, remaining: int = None, reset_in: float = None, retry_after: float = None) -> None:
+        """Follow the quota reported by the API.
+
+        Args:
+            remaining (int): Requests left in the current quota window.
+            reset_in (float): Seconds until the quota window resets.
+            retry_after (float): Seconds the API asks to wait before any request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if retry_after != None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            if remaining == None or reset_in == None:
+                return
+            if self.quota == None or abs(now + reset_in - self.reset_at) > 1:
+                # A new quota window
+                self.quota_reserve = max(remaining * self.reserve, 1.0)
+            self.reset_at = now + reset_in
+            self.quota = float(remaining)
+            if remaining <= 0:
+                self.blocked_until = max(self.blocked_until, now + reset_in)
+                self.tokens = 0.0
+                return
+            self._refill(now)
+            self._pace(now)
+
+
+class PyLapiRateLimiter:
+    """The client-side rate limiter of an API class.
+
+    Requests are paced by a token bucket, one for the API class, or one per
+    credential with `per_credential=True`. Buckets follow the rate limit headers
+    (e.g., GitHub's `X-RateLimit-Remaining` and `X-RateLimit-Reset`) and the
+    `Retry-After` header of 429 and 503 responses, so that the requests stay
+    just under the quota instead of hitting it.
+
+    Args:
+        rate (float): Maximum requests per second, or None to follow the API headers only.
+        burst (int): Maximum requests that can be sent at once.
+        per_credential (bool): Keep a separate quota for each auth credential.
+        margin (int): Requests of the quota left unused, e.g., for other clients.
+        remaining_header (str): The response header of the requests left.
+        reset_header (str): The response header of the quota reset time,
+            in epoch seconds (e.g., GitHub) or seconds from now.
+        share (float): The share of the quota this limiter paces, e.g., 1/N in each of
+            N processes sending requests under the same quota (see `divided()`).
+    """
+
+    def __init__(
+            self,
+            rate: float = None,
+            burst: int = None,
+            per_credential: bool = False,
+            margin: int = None,
+            remaining_header: str = None,
+            reset_header: str = None,
+            share: float = 1.0,
+        ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.share = share
+        self.per_credential = per_credential
+        self.margin = margin if margin != None else config.default_rate_limit_margin
+        self.remaining_header = remaining_header if remaining_header != None else config.default_rate_limit_remaining_header
+        self.reset_header = reset_header if reset_header != None else config.default_rate_limit_reset_header
+        self._buckets = {}
+        self._lock = threading.Lock()
+        _pylapi_forkables.add(self)
+
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+
+    def __reduce__(self) -> tuple:
+        # Pickled with its settings, e.g., to a worker process, which starts with full buckets
+        return (type(self), (self.rate, self.burst, self.per_credential, self.margin,
+            self.remaining_header, self.reset_header, self.share))
+
+
+    def divided(self, parts: int) -> PyLapiRateLimiter:
+        """A limiter with the same settings pacing a `parts`-th of this limiter's share of the quota.
+
+        Args:
+            parts (int): The number of limiters sharing the quota, e.g., processes.
+        """
+        limiter = copy(self)
+        limiter.share = self.share / parts
+        return limiter
+
+
+    def bucket(self, credential: str = None) -> PyLapiTokenBucket:
+        """The token bucket of a credential, or of the API class."""
+        key = credential if self.per_credential else None
+        bucket = self._buckets.get(key)
+        if bucket == None:
+            with self._lock:
+                if key not in self._buckets:
+                    burst = self.burst if self.burst != None else config.default_rate_limit_burst
+                    self._buckets[key] = PyLapiTokenBucket(
+                        self.rate * self.share if self.rate != None else None,
+                        max(1, int(burst * self.share)),
+                    )
+                bucket = self._buckets[key]
+        return bucket
+
+
+    def acquire(self, credential: str = None) -> None:
+        """Wait until a request can be sent."""
+        bucket = self.bucket(credential)
+        wait = bucket.take()
+        while wait > 0:
+            logger.debug("Rate limited: waiting %.3fs", wait)
+            time.sleep(wait)
+            wait = bucket.take()
+
+
+    def try_acquire(self, credential: str = None) -> bool:
+        """Take a token only if a request can be sent right away."""
+        return self.bucket(credential).take() == 0
+
+
+    async def aacquire(self, credential: str = None) -> None:
+        """The async mode version of `acquire()`."""
+        bucket = self.bucket(credential)
+        wait = bucket.take()
+        while wait > 0:
+            logger.debug("Rate limited: waiting %.3fs", wait)
+            await asyncio.sleep(wait)
+            wait = bucket.take()
+
+
+    def update(self, response: requests.Response, credential: str = None) -> None:
+        """Follow the rate limit headers of a response."""
+        headers = response.headers
+        retry_after = None
+        if response.status_code in (429, 503):
+            retry_after = PyLapiRetry.retry_after(response)
+        remaining, reset_in = None, None
+        try:
+            if self.remaining_header in headers and self.reset_header in headers:
+                remaining = int((int(headers[self.remaining_header]) - self.margin) * self.share)
+                reset_in = float(headers[self.reset_header])
+                if reset_in > 1e9:
+                    # Epoch seconds
+                    reset_in = max(reset_in - time.time(), 0.0)
+        except ValueError:
+            remaining, reset_in = None, None
+        if retry_after != None or remaining != None:
+            self.bucket(credential).update(remaining, reset_in, retry_after)
+
+
+############################################################
+#
+# Metrics
+#
+
+class PyLapiMetrics:
+    """Thread-safe counters of an API class.
+
+    Counters:
+        requests: HTTP requests sent, including retries.
+        retries: Requests retried.
+        cache_hits: Calls served from the response cache without a request.
+        cache_revalidated: Calls served from the response cache after a 304 Not Modified.
+        coalesced: Calls that shared the response of an identical concurrent call.
+        batched: Calls sent as actions of batch requests.
+        hedges: Hedge requests sent, see PyLapiHedge.
+        hedge_wins: Calls that used the response of their hedge.
+    """
+
+    def __init__(self) -> None:
+        self._counters = {}
+        self._lock = threading.Lock()
+        _pylapi_forkables.add(self)
+
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+
+    def __getitem__(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+
+    def __repr__(self) -> str:
+        return f"PyLapiMetrics({self.snapshot()})"
+
+
+    def increment(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + count
+
+
+    def snapshot(self) -> dict:
+        """A copy of all counters."""
+        with self._lock:
+            return dict(self._counters)
+
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+############################################################
+#
+# Request coalescing
+#
+
+class PyLapiSingleFlight:
+    """Coalesce identical concurrent calls into one in-flight call.
+
+    The first caller of a key runs the call. Callers of the same key that
+    arrive while it is in flight wait for it, and share its result, or raise
+    a copy of its error. If the first caller is interrupted or cancelled,
+    a waiting caller takes over the call.
+    Threads and event loop tasks are coalesced separately.
+    """
+
+    def __init__(self) -> None:
+        self._flights = {}
+        self._lock = threading.Lock()
+        _pylapi_forkables.add(self)
+
+
+    def _after_fork(self) -> None:
+        # The leaders of the flights are threads of the parent process
+        self._flights = {}
+        self._lock = threading.Lock()
+
+
+    def do(self, key: str, func: Callable) -> tuple:
+        """Call `func()`, or wait for the in-flight call of the same key.
+
+        Returns: The result, and whether it is shared from another call.
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight == None
+                if leader:
+                    flight = self._flights[key] = SimpleNamespace(done=threading.Event(), result=None, error=None, abandoned=False)
+            if leader:
+                break
+            flight.done.wait()
+            if flight.error != None:
+                raise _pylapi_shared_error(flight.error) from flight.error
+            if not flight.abandoned:
+                return flight.result, True
+        try:
+            flight.result = func()
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException:
+            # Interrupted, e.g., by KeyboardInterrupt: a waiting call takes over
+            flight.abandoned = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+
+    async def ado(self, key: str, func: Callable) -> tuple:
+        """The async mode version of `do()`, with `func()` returning an awaitable."""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        while True:
+            future = self._flights.get(flight_key)
+            if future == None:
+                break
+            try:
+                # Shielded, so that cancelling this call does not cancel the shared one
+                result = await asyncio.shield(future)
+            except Exception as e:
+                raise _pylapi_shared_error(e) from e
+            if result is not _pylapi_abandoned:
+                return result, True
+        future = self._flights[flight_key] = loop.create_future()
+        try:
+            result = await func()
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Retrieved, in case no other call is waiting
+            raise
+        except BaseException:
+            # Cancelled: a waiting call takes over, rather than being cancelled too
+            future.set_result(_pylapi_abandoned)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._flights[flight_key]
+        return result, False
+
+
+# The result of a coalesced call given up by its caller, see PyLapiSingleFlight
+_pylapi_abandoned = object()
+
+
+def _pylapi_shared_error(error: BaseException) -> BaseException:
+    # A copy for each call sharing an error, so that their tracebacks are not added to the same error
+    try:
+        return copy(error)
+    except Exception:
+        return PyLapiError({"error": f"Shared call failed: {error!r}"})
+
+
+############################################################
+#
+# Batching
+#
+
+class PyLapiBatch:
+    """A batching context of an API class, e.g., for the Asana Batch API.
+
+    Within `with MyAPI.batch() as batch:`, resource method calls of the API
+    class are queued instead of sent, and return a `concurrent.futures.Future`
+    of their result. Queued calls are sent as actions of one batch request
+    when the batch is full, `interval` seconds after the first call queued,
+    or when the context exits. The result of each action is then processed
+    like the response of its call (`give`, `load` and callbacks), and set to
+    its future, or raised by it as an error.
+
+    Results are processed, and response callbacks called, on the thread that
+    sends the batch request: the thread of the call that fills the batch or
+    of `flush()` and the context exit, or the timer thread when sent after
+    `interval` seconds. The done callbacks of the futures run there too.
+
+    Policies of the API class inside a batch:
+    - Response cache: a fresh cached GET is served without being queued;
+      the results of GETs are cached, and PUT, PATCH and DELETE actions
+      invalidate the cached responses of their URLs, as unbatched calls do.
+    - Rate limiter, timeout and deadline: applied to each batch request.
+    - Metrics: each batch request counts as a request, and its actions as batched calls.
+    - Retry: not applied, as a batch request is a POST which may hold writes.
+      A failed batch request fails the futures of all its calls, each with
+      its own copy of the error.
+    - Coalescing and hedging: not applied.
+
+    The default request and response formats are those of the Asana Batch API.
+    Subclass and override `action()`, `body()` and `results()` for other APIs.
+
+    Args:
+        api_class (type): The API class.
+        path (str): The path of the batch endpoint.
+        max_actions (int): Maximum number of actions per batch request.
+        interval (float): Seconds after which queued calls are sent, or None to wait until full or exit.
+    """
+
+    def __init__(self, api_class: type, path: str = None, max_actions: int = None, interval: float = None) -> None:
+        self.api_class = api_class
+        self.path = path if path != None else config.default_batch_path
+        self.max_actions = max_actions if max_actions != None else config.default_batch_max_actions
+        self.interval = interval
+        self._queue = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._token = None
+        _pylapi_forkables.add(self)
+
+
+    def _after_fork(self) -> None:
+        # The calls queued and the timer are those of threads of the parent process
+        self._queue = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+
+    def __enter__(self) -> PyLapiBatch:
+        self._token = _pylapi_batches.set({**_pylapi_batches.get(), self.api_class: self})
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        _pylapi_batches.reset(self._token)
+        if exc_type == None:
+            self.flush()
+        else:
+            self.cancel()
+
+
+    def add(self, resource: PyLapi, method: Callable, plan: PyLapiMethodPlan, _arg_values: dict) -> Future:
+        """Queue the current call of a resource.
+
+        Returns: The future of the call result.
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        call, _, _ = resource._cache_lookup(resource.call, plan)
+        if call.cache == "hit":
+            resource._local.call = call
+            try:
+                future.set_result(resource._method_response(method, plan.give, plan.load, _arg_values))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        queued = None
+        with self._lock:
+            self._queue.append((resource, method, plan, call, _arg_values, future))
+            if len(self._queue) >= self.max_actions:
+                queued, self._queue = self._queue, []
+            elif self.interval != None and self._timer == None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if queued:
+            self._send(queued)
+        return future
+
+
+    def flush(self) -> None:
+        """Send all queued calls."""
+        with self._lock:
+            queued, self._queue = self._queue, []
+            if self._timer != None:
+                self._timer.cancel()
+                self._timer = None
+        for start in range(0, len(queued), self.max_actions):
+            self._send(queued[start:start + self.max_actions])
+
+
+    def cancel(self) -> None:
+        """Drop all queued calls, and cancel their futures."""
+        with self._lock:
+            queued, self._queue = self._queue, []
+            if self._timer != None:
+                self._timer.cancel()
+                self._timer = None
+        for _, _, _, _, _, future in queued:
+            future.set_exception(PyLapiError({"errors": [{"message": "Batch cancelled"}]}))
+
+
+    def action(self, resource: PyLapi, call: PyLapiCall) -> dict:
+        """The batch action of a call.
+
+        Args:
+            resource (PyLapi): The resource object of the call.
+            call (PyLapiCall): The call context with the request.
+
+        Returns: The action in the batch request.
+        """
+        action = {
+            "relative_path": call.request["url"][len(resource._pylapi_url):],
+            "method": call.http_method.lower(),
+        }
+        params = dict(call.request.get("params") or {})
+        options = {_: params.pop(_) for _ in ("limit", "offset") if _ in params}
+        if "opt_fields" in params:
+            fields = params.pop("opt_fields")
+            options["fields"] = fields.split(",") if type(fields) == str else list(fields)
+        if options:
+            action["options"] = options
+        if "json" in call.request:
+            body = call.request["json"]
+            action["data"] = body["data"] if type(body) == dict and "data" in body else body
+        elif params:
+            action["data"] = params
+        return action
+
+
+    def body(self, actions: list) -> dict:
+        """The JSON body of a batch request."""
+        return {"data": {"actions": actions}}
+
+
+    def results(self, response_json: Any) -> list:
+        """The (status_code, headers, body) of each action in the batch response."""
+        return [(_.get("status_code"), _.get("headers") or {}, _.get("body")) for _ in response_json["data"]]
+
+
+    def _send(self, queued: list) -> None:
+        resource, _, _, call, _, _ = queued[0]
+        api_cls = self.api_class
+        url = resource._pylapi_url + self.path
+        try:
+            actions = [self.action(_resource, _call) for _resource, _, _, _call, _, _ in queued]
+            headers = {**call.request["headers"], "content-type": "application/json"}
+            limiter = api_cls.rate_limiter()
+            if limiter != None:
+                limiter.acquire(headers.get(config.default_api_auth_header_name))
+            api_cls.metrics().increment("requests")
+            api_cls.metrics().increment("batched", len(queued))
+            sent = time.perf_counter()
+            codec = api_cls.json_codec()
+            timeout = resource.timeout.attempt(call.remaining)
+            response = api_cls.session().request("POST", url, data=codec.encode(self.body(actions)), headers=headers, timeout=timeout)
+            received = time.perf_counter()
+            if limiter != None:
+                limiter.update(response, headers.get(config.default_api_auth_header_name))
+            if not response.ok:
+                raise PyLapiError(codec.loads(response.content) if response.content else {"status_code": response.status_code})
+            results = self.results(codec.loads(response.content))
+            if len(results) != len(queued):
+                raise PyLapiError({"errors": [{"message": f"{len(results)} results for {len(queued)} batch actions"}]})
+        except Exception as e:
+            # A copy of the error for each future, caused by the error of the batch request
+            for _, _, _, _, _, future in queued:
+                error = _pylapi_shared_error(e)
+                error.__cause__ = e
+                future.set_exception(error)
+            return
+
+        for (_resource, method, plan, _call, _arg_values, future), (status_code, _headers, body) in zip(queued, results):
+            action_response = requests.Response()
+            action_response.status_code = status_code
+            action_response.headers = requests.structures.CaseInsensitiveDict(_headers)
+            action_response.encoding = "utf-8"
+            action_response.url = _call.request["url"]
+            action_response._content = codec.encode(body)
+            try:
+                # Cached or invalidating as the unbatched call would
+                cache_key = _resource._request_key(_call) if _call.cache == "miss" else None
+                action_response, _call = _resource._cache_store(plan, cache_key, None, action_response, _call)
+                _resource._local.call = _call._replace(response=action_response, sent=sent, received=received, attempts=1)
+                future.set_result(_resource._method_response(method, plan.give, plan.load, _arg_values))
+            except Exception as e:
+                future.set_exception(e)
+
+
+# The batches in effect, by API class
+_pylapi_batches = contextvars.ContextVar("pylapi_batches", default={})
+
+
+############################################################
+#
+# Bulk operations
+#
+
+class PyLapiBulkResult(NamedTuple):
+    """The outcome of one work item of a bulk operation, see `PyLapi.bulk()`."""
+    index: int  # The position of the item in the input
+    item: tuple  # The work item (resource, method, args[, kwargs])
+    result: Any = None  # What the resource method returned
+    error: PyLapiError = None  # The error of the call, if it failed
+
+    @property
+    def ok(self) -> bool:
+        return self.error == None
+
+
+############################################################
+#
+# Streaming responses
+#
+
+class PyLapiJSONStream:
+    """An incremental JSON parser extracting one path from a stream of chunks.
+
+    Only the value at the path is built. Everything before it is skipped
+    without being parsed into objects, and nothing after it is read.
+    An array at the path can be iterated element by element as the
+    chunks arrive, so that only one element is held in memory at a time.
+
+    The parsing steps are generators that yield when they need the next chunk,
+    so that the same parser reads an iterator (`parse()`) or an async iterator (`aparse()`).
+
+    Args:
+        chunks (Union[Iterator[bytes], AsyncIterator[bytes]]): The chunks of a UTF-8 JSON document.
+        path (str): The path to extract, e.g., "$.data". Keys and list indexes only.
+    """
+
+    _skip_chars = re.compile(r'[^"{}\[\]]*')
+    _string_end = re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL)
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, chunks: Union[Iterator, AsyncIterator], path: str = "$") -> None:
+        self.keys = PyLapiRewrite._path_keys(path or "$")
+        if self.keys == None or any(type(_) == int and _ < 0 for _ in self.keys):
+            raise ValueError(f"Path cannot be streamed: {path}")
+        self._chunks = chunks if hasattr(chunks, "__anext__") else iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+
+    def _fill(self) -> Iterator:
+        # Read the next chunk into the buffer, or return False at the end
+        if self._eof:
+            return False
+        if self._pos > 65536:
+            # Drop what has been parsed
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        while True:
+            chunk = yield  # Sent by the driver: the next chunk, or None at the end
+            if chunk == None:
+                break
+            text = self._utf8.decode(chunk)
+            if text:
+                self._buf += text
+                return True
+        self._buf += self._utf8.decode(b"", final=True)
+        self._eof = True
+        return False
+
+
+    def _peek(self) -> Iterator:
+        # The next non-whitespace character, or "" at the end
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not (yield from self._fill()):
+                return ""
+
+
+    def _expect(self, chars: str) -> Iterator:
+        char = yield from self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"Invalid JSON: expecting {chars!r} but found {char!r}")
+        self._pos += 1
+        return char
+
+
+    def _value(self) -> Iterator:
+        # Parse the next value
+        buf, pos = self._buf, self._pos
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+            pos += 1
+        self._pos = pos
+        if pos == len(buf):
+            yield from self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self._buf) or self._eof or self._buf[end - 1] in '}]"el':
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            size = len(self._buf)
+            # Read at least as much again before retrying, so that a large value is not parsed over and over
+            while len(self._buf) - self._pos < 2 * (size - self._pos) and (yield from self._fill()):
+                pass
+
+
+    def _skip(self) -> Iterator:
+        # Skip the next value without building it
+        if (yield from self._peek()) not in "{[\"":
+            # A number or literal
+            yield from self._value()
+            return
+        depth = 0
+        while True:
+            match = self._skip_chars.match(self._buf, self._pos)
+            self._pos = match.end()
+            if self._pos >= len(self._buf):
+                if not (yield from self._fill()):
+                    raise ValueError("Invalid JSON: unexpected end")
+                continue
+            char = self._buf[self._pos]
+            if char == '"':
+                match = self._string_end.match(self._buf, self._pos + 1)
+                while match == None:
+                    if not (yield from self._fill()):
+                        raise ValueError("Invalid JSON: unterminated string")
+                    match = self._string_end.match(self._buf, self._pos + 1)
+                self._pos = match.end()
+            else:
+                self._pos += 1
+                depth += 1 if char in "{[" else -1
+            if depth == 0:
+                return
+
+
+    def _find(self) -> Iterator:
+        # Move to the value at the path, or return False if there is none
+        for key in self.keys:
+            if type(key) == str:
+                if (yield from self._peek()) != "{":
+                    return False
+                self._pos += 1
+                while True:
+                    if (yield from self._peek()) == "}":
+                        return False
+                    name = yield from self._value()
+                    yield from self._expect(":")
+                    if name == key:
+                        break
+                    yield from self._skip()
+                    if (yield from self._expect(",}")) == "}":
+                        return False
+            else:
+                if (yield from self._peek()) != "[":
+                    return False
+                self._pos += 1
+                for _ in range(key):
+                    if (yield from self._peek()) == "]":
+                        return False
+                    yield from self._skip()
+                    if (yield from self._expect(",]")) == "]":
+                        return False
+                if (yield from self._peek()) == "]":
+                    return False
+        return True
+
+
+    def _start(self) -> Iterator:
+        # Up to the value at the path: (True, None) before an array, or (False, the value)
+        if not (yield from self._find()):
+            return False, None
+        if (yield from self._peek()) == "[":
+            self._pos += 1
+            return True, None
+        return False, (yield from self._value())
+
+
+    def _element_steps(self) -> Iterator:
+        # Yields each element of the array as a 1-tuple, between the requests for chunks
+        if (yield from self._peek()) == "]":
+            return
+        while True:
+            yield (yield from self._value()),
+            # Without a generator step when the separator follows
+            char = self._buf[self._pos] if self._pos < len(self._buf) else ""
+            if char in (",", "]"):
+                self._pos += 1
+            else:
+                char = yield from self._expect(",]")
+            if char == "]":
+                return
+
+
+    def _run(self, step: Iterator) -> Any:
+        # Drive a parsing step with the chunks of the iterator
+        chunk = None
+        while True:
+            try:
+                step.send(chunk)
+            except StopIteration as e:
+                return e.value
+            chunk = next(self._chunks, None)
+
+
+    async def _arun(self, step: Iterator) -> Any:
+        # Drive a parsing step with the chunks of the async iterator
+        chunk = None
+        while True:
+            try:
+                step.send(chunk)
+            except StopIteration as e:
+                return e.value
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                chunk = None
+
+
+    def parse(self) -> tuple:
+        """Read up to the value at the path.
+
+        Returns: True and an iterator of the elements if the value is an array,
+            or False and the value (None if there is no value at the path).
+        """
+        is_array, value = self._run(self._start())
+        return is_array, self._elements() if is_array else value
+
+
+    async def aparse(self) -> tuple:
+        """The async version of `parse()`, reading an async iterator of chunks.
+
+        Returns: True and an async iterator of the elements if the value is an array,
+            or False and the value (None if there is no value at the path).
+        """
+        is_array, value = await self._arun(self._start())
+        return is_array, self._aelements() if is_array else value
+
+
+    def _elements(self) -> Iterator:
+        steps = self._element_steps()
+        chunk = None
+        while True:
+            try:
+                element = steps.send(chunk)
+            except StopIteration:
+                return
+            chunk = None
+            if element == None:
+                chunk = next(self._chunks, None)
+            else:
+                yield element[0]
+
+
+    async def _aelements(self) -> AsyncIterator:
+        steps = self._element_steps()
+        chunk = None
+        while True:
+            try:
+                element = steps.send(chunk)
+            except StopIteration:
+                return
+            chunk = None
+            if element == None:
+                try:
+                    chunk = await self._chunks.__anext__()
+                except StopAsyncIteration:
+                    pass
+            else:
+                yield element[0]
+
+
+class PyLapiEvent(NamedTuple):
+    """A server-sent event."""
+    event: str = "message"
+    data: str = ""  # The data lines joined by newlines
+    id: str = None
+    retry: int = None  # The reconnection time in milliseconds
+
+
+class PyLapiEventStream:
+    """An incremental parser of server-sent events (`text/event-stream`).
+
+    Chunks are fed as they arrive, and each event is returned as soon as
+    the blank line ending it has been received.
+    """
+
+    def __init__(self) -> None:
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._event = "message"
+        self._data = []
+        self._id = None
+        self._retry = None
+
+
+    def feed(self, chunk: bytes) -> list:
+        """Parse a chunk of the stream.
+
+        Args:
+            chunk (bytes): The next chunk, or b"" at the end of the stream.
+
+        Returns: The events completed by the chunk, in order.
+        """
+        self._buf += self._utf8.decode(chunk, final=not chunk)
+        lines = self._buf.splitlines(keepends=True)
+        # Keep a partial line, including a "\r" that may be followed by "\n"
+        self._buf = lines.pop() if lines and (lines[-1][-1] not in "\r\n" or lines[-1][-1] == "\r" and chunk) else ""
+        events = []
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if line == "":
+                if self._data:
+                    events.append(PyLapiEvent(self._event, "\n".join(self._data), self._id, self._retry))
+                self._event, self._data, self._retry = "message", [], None
+                continue
+            field, _, value = line.partition(":")
+            if value.startswith(" "):
+                value = value[1:]
+            if field == "data":
+                self._data.append(value)
+            elif field == "event":
+                self._event = value
+            elif field == "id":
+                self._id = value
+            elif field == "retry" and value.isdigit():
+                self._retry = int(value)
+            # Lines starting with ":" are comments, e.g., keep-alives
+        return events
+
+
+############################################################
+#
+# Uploads
+#
+
+class PyLapiUpload:
+    """A request body streamed from a file, a path or a buffer.
+
+    The body is read and sent a chunk at a time, so that large uploads,
+    and many of them at once, do not hold whole files in memory.
+    A memory-mapped file (`mmap.mmap`) is sent from the mapping.
+    The body can be sent again, e.g., when the request is retried.
+
+    Args:
+        source (Any): A path (str or os.PathLike), a seekable binary file object,
+            or a buffer (bytes, bytearray, memoryview or mmap.mmap).
+        filename (str): The file name to upload as (defaults to the name of the path or file).
+        content_type (str): The MIME type (defaults to a guess from the file name).
+        chunk_size (int): Bytes read and sent at a time (defaults to config.default_upload_chunk_size).
+        progress (Callable): Called with the bytes sent so far and the total bytes after each chunk.
+    """
+
+    def __init__(
+            self,
+            source: Any,
+            filename: str = None,
+            content_type: str = None,
+            chunk_size: int = None,
+            progress: Callable = None,
+        ) -> None:
+        self.source = source
+        self.chunk_size = chunk_size or config.default_upload_chunk_size
+        self.progress = progress
+        self._path = None
+        self._buffer = None
+        self._start = 0
+        name = None
+        if isinstance(source, (str, os.PathLike)):
+            self._path = os.path.expanduser(os.fspath(source))
+            self.size = os.path.getsize(self._path)
+            name = self._path
+        elif isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            self._buffer = source
+            # Viewed only while sent, so that an mmap can be closed after the call
+            with memoryview(source) as view:
+                self.size = view.nbytes
+        else:
+            if not (hasattr(source, "seekable") and source.seekable()):
+                raise ValueError(f"Upload file object is not seekable: {source!r}")
+            self._start = source.tell()
+            self.size = source.seek(0, os.SEEK_END) - self._start
+            source.seek(self._start)
+            name = getattr(source, "name", None)
+        if filename == None and type(name) == str:
+            filename = os.path.basename(name)
+        self.filename = filename
+        self.content_type = content_type or \
+            (mimetypes.guess_type(filename)[0] if filename else None) or \
+            "application/octet-stream"
+
+
+    @classmethod
+    def of(cls, value: Any) -> PyLapiUpload:
+        """An upload from a PyLapiUpload, a source, or a tuple (filename, source[, content_type])."""
+        if isinstance(value, PyLapiUpload):
+            return value
+        if type(value) == tuple:
+            return cls(value[1], filename=value[0], content_type=value[2] if len(value) > 2 else None)
+        return cls(value)
+
+
+    def __len__(self) -> int:
+        return self.size
+
+
+    def __repr__(self) -> str:
+        return f"PyLapiUpload({self.filename or type(self.source).__name__!r}, {self.size} bytes)"
+
+
+    def _chunks(self) -> Iterator[bytes]:
+        if self._buffer != None:
+            with memoryview(self._buffer) as buffer, buffer.cast("B") as view:
+                for offset in range(0, self.size, self.chunk_size):
+                    with view[offset:offset + self.chunk_size] as chunk:
+                        yield bytes(chunk)
+            return
+        # Paths are opened only when sent, and closed straight after
+        file = open(self._path, "rb") if self._path != None else self.source
+        try:
+            file.seek(self._start)
+            remaining = self.size
+            while remaining > 0:
+                chunk = file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    raise ValueError(f"Upload ended {remaining} bytes short: {self!r}")
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            if self._path != None:
+                file.close()
+
+
+    def __iter__(self) -> Iterator[bytes]:
+        sent = 0
+        for chunk in self._chunks():
+            yield chunk
+            sent += len(chunk)
+            if self.progress != None:
+                self.progress(sent, self.size)
+
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        # Async mode: files and memory-mapped files are read in the default executor,
+        # so that reading them does not block the event loop
+        loop = asyncio.get_running_loop()
+        chunks = self._chunks()
+        blocking = self._buffer == None or isinstance(self._buffer, mmap.mmap)
+        sent = 0
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None) if blocking else next(chunks, None)
+                if chunk == None:
+                    return
+                yield chunk
+                sent += len(chunk)
+                if self.progress != None:
+                    self.progress(sent, self.size)
+        finally:
+            chunks.close()
+
+
+class PyLapiMultipart:
+    """A multipart/form-data request body streaming its files.
+
+    Args:
+        fields (dict): The form fields. Dicts, lists and booleans are sent as JSON,
+            others as str. Fields of None are left out.
+        files (dict): The file fields, each a PyLapiUpload, a source, or a tuple
+            (filename, source[, content_type]) (see PyLapiUpload).
+        boundary (str): The part boundary (defaults to a random one).
+    """
+
+    def __init__(self, fields: dict = None, files: dict = None, boundary: str = None) -> None:
+        self.boundary = boundary or uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        # Parts are bytes sent as is, or uploads streamed
+        self._parts = []
+        for name, value in (fields or {}).items():
+            if value == None:
+                continue
+            if type(value) in (dict, list, bool):
+                value = json.dumps(value)
+            if type(value) != bytes:
+                value = str(value).encode()
+            self._parts.append(self._header(name) + value + b"\r\n")
+        for name, value in (files or {}).items():
+            upload = PyLapiUpload.of(value)
+            self._parts += [self._header(name, upload.filename or name, upload.content_type), upload, b"\r\n"]
+        self._parts.append(f"--{self.boundary}--\r\n".encode())
+        self.size = sum(len(_) for _ in self._parts)
+
+
+    def _header(self, name: str, filename: str = None, content_type: str = None) -> bytes:
+        def quote(string):
+            # As browsers do
+            return str(string).replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+        header = f'--{self.boundary}\r\nContent-Disposition: form-data; name="{quote(name)}"'
+        if filename != None:
+            header += f'; filename="{quote(filename)}"\r\nContent-Type: {content_type}'
+        return (header + "\r\n\r\n").encode()
+
+
+    @property
+    def uploads(self) -> list:
+        """The uploads of the file fields."""
+        return [_ for _ in self._parts if type(_) != bytes]
+
+
+    def __len__(self) -> int:
+        return self.size
+
+
+    def __repr__(self) -> str:
+        return f"PyLapiMultipart({self.uploads!r}, {self.size} bytes)"
+
+
+    def __iter__(self) -> Iterator[bytes]:
+        for part in self._parts:
+            if type(part) == bytes:
+                yield part
+            else:
+                yield from part
+
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for part in self._parts:
+            if type(part) == bytes:
+                yield part
+            else:
+                async for chunk in part:
+                    yield chunk
+
+
+############################################################
+#
+# Downloads
+#
+
+class PyLapiDownload:
+    """A response body streamed to a file, a file object or a callback.
+
+    Only a successful response that is not JSON is downloaded: the body is
+    written a chunk at a time as it arrives, and never held in memory.
+    Other responses are processed as usual.
+
+    Args:
+        sink (Any): A path (str or os.PathLike), a binary file object,
+            or a callable taking each chunk of bytes.
+        checksum (str): The `hashlib` algorithm of the digest of the body, e.g., "sha256".
+        resume (bool): Resume with Range requests, if the server accepts ranges: a broken
+            download is resumed where it stopped, and a partial file left at the path by
+            a download of the same URL is completed. Ranges are validated with If-Range,
+            so a body that has changed since is downloaded again from the start.
+            Default to False: an existing file at the path is overwritten.
+        chunk_size (int): Bytes read and written at a time (defaults to config.default_stream_chunk_size).
+        progress (Callable): Called with the bytes downloaded so far and the total bytes
+            (None if unknown) after each chunk.
+        max_resumes (int): Range requests made to resume a broken download
+            (defaults to config.default_download_max_resumes).
+
+    After the download, `size` is the bytes downloaded in total, `digest` the hex digest
+    of the body (if `checksum`), `content_type` its type, and `resumes` the Range
+    requests made to resume it.
+
+    Until a resumable download to a path is complete, the URL and the validator
+    (a strong ETag or Last-Modified) of the body are kept next to the file, in the
+    path with `config.default_download_state_suffix`. A partial file without them is not resumed.
+    """
+
+    def __init__(
+            self,
+            sink: Any,
+            checksum: str = None,
+            resume: bool = False,
+            chunk_size: int = None,
+            progress: Callable = None,
+            max_resumes: int = None,
+        ) -> None:
+        self.sink = sink
+        self.path = os.path.expanduser(os.fspath(sink)) if isinstance(sink, (str, os.PathLike)) else None
+        if self.path == None and not hasattr(sink, "write") and not callable(sink):
+            raise ValueError(f"Download sink is not a path, a file or a callable: {sink!r}")
+        if checksum != None:
+            hashlib.new(checksum)  # Raises ValueError if unsupported
+        self.checksum = checksum
+        self.resume = resume
+        self.chunk_size = chunk_size or config.default_stream_chunk_size
+        self.progress = progress
+        self.max_resumes = max_resumes if max_resumes != None else config.default_download_max_resumes
+        self.total = None
+        self.digest = None
+        self.content_type = None
+        self.resumes = 0
+        self._ranges = False  # Whether the server accepts ranges
+        self._file = None
+        self._hash = None
+        self._start = None  # The starting position in a file object
+        self.url = None  # The URL of the body
+        self.validator = None  # The If-Range validator of the body
+        self.size = 0
+        if resume and self.path != None and os.path.isfile(self.path):
+            # A partial file left by an earlier download is completed, if it can be validated
+            try:
+                with open(self._state_path, "r") as file:
+                    state = json.load(file)
+                self.url, self.validator = state["url"], state["validator"]
+                self.size = os.path.getsize(self.path)
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+
+    @classmethod
+    def of(cls, value: Any) -> PyLapiDownload:
+        """A download from a PyLapiDownload or a sink."""
+        return value if isinstance(value, PyLapiDownload) else cls(value)
+
+
+    def __repr__(self) -> str:
+        return f"PyLapiDownload({self.path or self.sink!r}, {self.size} bytes)"
+
+
+    @property
+    def _state_path(self) -> str:
+        return self.path + config.default_download_state_suffix
+
+
+    def headers(self, url: str = None) -> dict:
+        """The Range and If-Range headers to resume the download, if any bytes have been downloaded.
+
+        Args:
+            url (str): The URL of the request, to start a download: a partial file of another URL is not resumed.
+        """
+        if url != None:
+            if url != self.url:
+                self.size = 0
+            self.url = url
+        if self.resume and self.size > 0 and self.validator != None:
+            return {"Range": f"bytes={self.size}-", "If-Range": self.validator}
+        return {}
+
+
+    def accepts(self, response: requests.Response) -> bool:
+        """Whether the response is to be downloaded."""
+        if response.status_code == 416 and self.size > 0:
+            # A partial file that is already complete
+            return response.headers.get("Content-Range", "") == f"bytes */{self.size}"
+        return response.ok and not PyLapi._json_content(response)
+
+
+    def resumable(self) -> bool:
+        """Whether a broken download can be resumed with another Range request."""
+        return self.resume and self._ranges and self.size > 0 and self.validator != None and self.resumes < self.max_resumes
+
+
+    def open(self, response: requests.Response) -> None:
+        """Open the sink to write the body of the response to."""
+        self.content_type = response.headers.get("Content-Type")
+        self._ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes" or response.status_code in (206, 416)
+        offset = 0
+        # The length of the body as sent, unknown if encoded
+        length = response.headers.get("Content-Length")
+        if length == None or response.headers.get("Content-Encoding", "identity") != "identity":
+            length = None
+        self.total = int(length) if length != None else None
+        if response.status_code in (206, 416):
+            content_range = response.headers.get("Content-Range", "")
+            match = re.match(r"bytes (?:(\d+)-\d+|\*)/(\d+|\*)", content_range)
+            if match == None or (match[1] != None and int(match[1]) != self.size):
+                raise PyLapiError({"error": f"Unexpected Content-Range resuming at {self.size}", "Content-Range": content_range})
+            offset = self.size
+            if match[2] != "*":
+                self.total = int(match[2])
+            elif self.total != None:
+                self.total += offset
+        else:
+            # Downloaded from the start: also when a range is not valid any more (If-Range)
+            etag = response.headers.get("ETag")
+            self.validator = etag if etag and not etag.startswith("W/") else response.headers.get("Last-Modified")
+            if self.resume and self.path != None:
+                self._save_state()
+
+        if offset == 0 and self.size > 0 and self.path == None and not self._seekable():
+            raise PyLapiError({"error": "The download restarted but the sink cannot be rewound", "sink": repr(self.sink)})
+        if self.path != None:
+            self._file = open(self.path, "r+b" if offset > 0 else "wb")
+            self._file.seek(offset)
+        elif hasattr(self.sink, "write"):
+            if self._start == None:
+                self._start = self.sink.tell() if self._seekable() else 0
+            if self._seekable():
+                self.sink.seek(self._start + offset)
+                if offset == 0:
+                    self.sink.truncate()
+            self._file = self.sink
+
+        if self.checksum != None and (offset == 0 or self._hash == None):
+            self._hash = hashlib.new(self.checksum)
+            if offset > 0:
+                # Resumed from a partial file: its bytes are part of the digest
+                with open(self.path, "rb") as file:
+                    for chunk in iter(lambda: file.read(self.chunk_size), b""):
+                        self._hash.update(chunk)
+        self.size = offset
+
+
+    def _seekable(self) -> bool:
+        return hasattr(self.sink, "seekable") and self.sink.seekable()
+
+
+    def _save_state(self) -> None:
+        # Kept until the download is complete, so that a partial file can be resumed
+        if self.validator == None or self.url == None:
+            self._remove_state()
+            return
+        with open(self._state_path, "w") as file:
+            json.dump({"url": self.url, "validator": self.validator}, file)
+
+
+    def _remove_state(self) -> None:
+        try:
+            os.remove(self._state_path)
+        except FileNotFoundError:
+            pass
+
+
+    def write(self, chunk: bytes) -> None:
+        """Write a chunk of the body."""
+        if self._file != None:
+            self._file.write(chunk)
+        else:
+            self.sink(chunk)
+        if self._hash != None:
+            self._hash.update(chunk)
+        self.size += len(chunk)
+        if self.progress != None:
+            self.progress(self.size, self.total)
+
+
+    def close(self) -> None:
+        """Close the sink (a path only) and take the digest of what has been downloaded."""
+        if self.path != None and self._file != None:
+            self._file.close()
+        self._file = None
+        if self._hash != None:
+            self.digest = self._hash.hexdigest()
+
+
+    def receive(self, response: requests.Response) -> None:
+        """Write the body of the response, as it arrives, to the sink."""
+        self.open(response)
+        try:
+            if response.status_code != 416:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    self.write(chunk)
+        finally:
+            self.close()
+            response.close()
+        self._complete()
+
+
+    async def areceive(self, response: requests.Response, content: aiohttp.StreamReader) -> None:
+        """The async mode version of `receive()`, reading the body from the `aiohttp` response content."""
+        self.open(response)
+        try:
+            if response.status_code != 416:
+                async for chunk in content.iter_chunked(self.chunk_size):
+                    self.write(chunk)
+        finally:
+            self.close()
+        self._complete()
+
+
+    def _complete(self) -> None:
+        # The validator of a complete download is not needed any more
+        if self.resume and self.path != None and (self.total == None or self.size >= self.total):
+            self._remove_state()
+
+
+############################################################
+#
+# Method plans
+#
+
+class PyLapiMethodPlan(NamedTuple):
+    """The immutable binding plan of a resource method.
+
+    Compiled once by `resource_method` when a method is decorated, so that
+    each call only binds its arguments instead of inspecting the method
+    and parsing its path again.
+    """
+    method_path: str
+    http_method: Any
+    give: PyLapiRewrite
+    load: PyLapiRewrite
+    send: PyLapiRewrite
+    paginator: PyLapiPaginator
+    retry: PyLapiRetry
+    cache: bool
+    cache_ttl: float
+    stream: bool
+    timeout: PyLapiTimeout
+    hedge: PyLapiHedge
+    route_var_names: tuple  # API route variable names - those found in the api route
+    auto_res_attrs: dict  # Auto resource attributes based on route_var_names
+    arg_names: tuple  # Method arg names - those passed into the method (selfless)
+    arg_defaults: tuple
+    arg_defaults_start: int
+    varargs: bool
+    varkw: bool
+
+    @classmethod
+    def compile(
+            cls,
+            method,
+            method_path: str = "",
+            http_method: Any = None,
+            give="",
+            load=None,
+            send=None,
+            paginator: PyLapiPaginator = None,
+            retry: PyLapiRetry = None,
+            cache: bool = None,
+            cache_ttl: float = None,
+            stream: bool = False,
+            timeout: Union[float, tuple, PyLapiTimeout] = None,
+            hedge: PyLapiHedge = None,
+        ) -> PyLapiMethodPlan:
+        if stream:
+            # Only the `give` path is parsed from a streamed response
+            if type(give) != str and give != None:
+                raise ValueError(f"A streamed method can only give a path: {give}")
+            if load != None and load != give:
+                raise ValueError(f"A streamed method can only load what it gives: {load}")
+            if give != None:
+                PyLapiJSONStream((), give)  # Raises if the path cannot be streamed
+        method_inspected = inspect.getfullargspec(method)
+        route_var_names = tuple(_[0] for _ in re.findall(r"{([a-zA-Z_-]([0-9a-zA-Z_-])*)}", method_path))
+        arg_names = tuple(method_inspected.args[1:])  # Selfless
+        arg_defaults = tuple(method_inspected.defaults) if method_inspected.defaults else ()
+        return cls(
+            method_path=method_path,
+            http_method=http_method,
+            give=PyLapiRewrite(give) if give != None else None,
+            load=PyLapiRewrite(load) if load != None else None,
+            send=PyLapiRewrite(send) if send != None else None,
+            paginator=paginator,
+            retry=retry,
+            cache=cache,
+            cache_ttl=cache_ttl,
+            stream=stream,
+            timeout=PyLapiTimeout.of(timeout) if timeout != None else None,
+            hedge=hedge,
+            route_var_names=route_var_names,
+            auto_res_attrs={_: "$." + _ for _ in route_var_names},
+            arg_names=arg_names,
+            arg_defaults=arg_defaults,
+            arg_defaults_start=len(arg_names) - len(arg_defaults),
+            varargs=method_inspected.varargs != None,
+            varkw=method_inspected.varkw != None,
+        )
+
+
+    def bind(self, resource: PyLapi, args: tuple, kwargs: dict) -> tuple:
+        """Bind the call arguments to the method path and the request arguments.
+
+        Args:
+            resource (PyLapi): The resource object of the call.
+            args (tuple): The positional arguments of the call.
+            kwargs (dict): The keyword arguments of the call.
+
+        Returns: The method path with route variables replaced, and the arg values.
+        """
+        ##########
+        #
+        # Determine arg_values:
+        # - Fill last set of arg_values with arg_defaults
+        # - Fill arg_values with arg_name:arg
+        # - Reorder arg_values in the same order as arg_names
+        #   - For missing args
+        #     - Use kwargs if found, then remove
+        #     - Use res_ids if found, but don't remove
+        #     - Use None (as a place holder)
+        # - Remove both implicitly and explicitly defined _res_attrs
+        # - More args than in arg_names
+        #   - For each additional arg, use res_ids in order
+        #     - If res_ids run out, the remaining args will be ignored
+        # - kwargs override and remove from kwargs if used (to avoid excessive query)
+
+        # Internal variables
+        _kwargs = kwargs.copy()
+        _method_path = self.method_path
+        arg_names = self.arg_names
+
+        _res_attrs = resource._resource_attrs
+        if len(_res_attrs) == 0:
+            _res_attrs = self.auto_res_attrs
+        _res_attrs = _res_attrs.copy()
+
+        # Fill last set of arg_values with arg_defaults
+        arg_values = dict(zip(arg_names[self.arg_defaults_start:], self.arg_defaults))
+
+        # Fill arg_values with arg_name:arg
+        arg_values.update(zip(arg_names, args))
+
+        # Reorder arg_values in the same order as arg_names
+        # Each iteration must create _arg_values[arg_name] somehow
+        # So len(arg_names) == len(_arg_values) after the loop
+        # This will handle more arg_names than args
+        _arg_values = {}
+        for arg_name in arg_names:
+            if arg_name in arg_values:
+                # arg exists
+                _arg_values[arg_name] = arg_values[arg_name]
+            elif arg_name in _kwargs:
+                # Missing arg: use kwarg, then remove (from query)
+                _arg_values[arg_name] = _kwargs.pop(arg_name)
+            elif arg_name in _res_attrs:
+                # Missing arg: use _res_attrs, but don't remove (leave later)
+                _arg_values[arg_name] = resource[_res_attrs[arg_name]]
+            else:
+                # Missing arg: use None
+                _arg_values[arg_name] = None
+
+        # Remove both implicitly and explicitly defined _res_attrs
+        for arg_name in _arg_values:
+            _res_attrs.pop(arg_name, None)
+
+        # For excessive args, fill with remaining _res_attrs
+        if len(arg_names) < len(args):
+            # Extra positional args are assigned to the remaining resource IDs in order.
+            # If resource IDs run out, the remaining args are ignored.
+            for _res_attrs_name, arg in zip(list(_res_attrs.keys()), args[len(arg_names):]):
+                _arg_values[_res_attrs_name] = arg
+                del _res_attrs[_res_attrs_name]
+
+        # _kwargs have final say - override _arg_values if still found, then remove
+        for _kwargs_name in list(_kwargs.keys()):
+            if _kwargs_name in _arg_values:
+                _arg_values[_kwargs_name] = _kwargs.pop(_kwargs_name)
+
+        ##########
+        #
+        # Route variables
+        #
+        for route_var_name in self.route_var_names:
+            route_value = None
+            # Keyword args highest precedence
+            # followed by positional args
+            # Implicit ID attributes as last resort
+            if route_var_name in _kwargs:
+                # Explicitly specified in method kwargs (keyword)
+                route_value = _kwargs.pop(route_var_name)
+            elif route_var_name in _arg_values:
+                # Explicitly specified in method args (positional)
+                route_value = _arg_values[route_var_name]
+            elif route_var_name in _res_attrs:
+                # Implicitly specified in ID attributes
+                route_value = resource[_res_attrs[route_var_name]]
+                _arg_values[route_var_name] = route_value  # Add for callback
+
+            if route_value != None:
+                _method_path = _method_path.replace("{" + route_var_name + "}", route_value)
+
+        _arg_values.update(_kwargs)
+        return _method_path, _arg_values
+
+
+############################################################
+#
+# HTTP sessions
+#
+
+class PyLapiSession:
+    """A pooled HTTP session shared by all resources of a PyLapi API class.
+
+    Every thread gets its own `requests.Session` (cookies and settings are
+    not shared across threads), but all of them are mounted on the same
+    `HTTPAdapter`, so there is one keep-alive connection pool per API class.
+    """
+
+    def __init__(
+            self,
+            pool_size: int = None,
+            pool_block: bool = None,
+            keep_alive: bool = None,
+            pool_connections: int = None,
+        ) -> None:
+        self.pool_size = pool_size if pool_size != None else config.default_pool_size
+        self.pool_block = pool_block if pool_block != None else config.default_pool_block
+        self.keep_alive = keep_alive if keep_alive != None else config.default_keep_alive
+        self.pool_connections = pool_connections if pool_connections != None else config.default_pool_connections
+
+        # prefix: adapter, mounted on every thread session
+        self._adapters = {}
+        self.mount("https://", self._new_adapter())
+        self.mount("http://", self._new_adapter())
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Weak references: the session of a thread is dropped with the thread
+        self._sessions = weakref.WeakSet()
+        self._closed = False
+        self._refresh = None  # Set to stop refreshing warm connections
+        _pylapi_forkables.add(self)
+
+
+    def _new_adapter(self) -> requests.adapters.HTTPAdapter:
+        return requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_size,
+            pool_block=self.pool_block,
+        )
+
+
+    def mount(self, prefix: str, adapter: requests.adapters.BaseAdapter) -> None:
+        """Mount a transport adapter for all URLs starting with `prefix`.
+
+        Args:
+            prefix (str): The URL prefix, e.g., "https://".
+            adapter (requests.adapters.BaseAdapter): The transport adapter.
+        """
+        self._adapters[prefix] = adapter
+        for session in list(getattr(self, "_sessions", [])):
+            session.mount(prefix, adapter)
+
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+
+    @property
+    def session(self) -> requests.Session:
+        """The `requests.Session` of the calling thread."""
+        session = getattr(self._local, "session", None)
+        if session == None:
+            if self._closed:
+                raise PyLapiError({"error": "Session closed"})
+            session = requests.Session()
+            for prefix, adapter in self._adapters.items():
+                session.mount(prefix, adapter)
+            if not self.keep_alive:
+                session.headers["Connection"] = "close"
+            with self._lock:
+                self._sessions.add(session)
+            self._local.session = session
+        return session
+
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self.session.request(method, url, **kwargs)
+
+
+    def warmup(self, url: str, connections: int = None, timeout: float = None, refresh: float = None) -> int:
+        """Resolve the host of `url` and open keep-alive connections to it in the pool.
+
+        Args:
+            url (str): The API URL.
+            connections (int): The number of connections to open. Default to the pool size.
+            timeout (float): Seconds to connect.
+            refresh (float): Seconds between checks that reopen the connections the server has dropped,
+                until the session is closed. Default to None (no refresh).
+
+        Returns: The number of connections open in the pool.
+        """
+        connections = min(connections, self.pool_size) if connections != None else self.pool_size
+        opened = self._warm(url, connections, timeout)
+        if refresh != None:
+            with self._lock:
+                if self._refresh != None:
+                    self._refresh.set()
+                self._refresh = stop = threading.Event()
+
+            def refresh_connections():
+                while not stop.wait(refresh) and not self._closed:
+                    try:
+                        self._warm(url, connections, timeout)
+                    except Exception as e:
+                        logger.debug("Refreshing connections to %s failed: %s", url, e)
+
+            threading.Thread(target=refresh_connections, daemon=True).start()
+        return opened
+
+
+    def _warm(self, url: str, connections: int, timeout: float) -> int:
+        parts = urlsplit(url)
+        # Resolved up front so that resolver errors surface here
+        socket.getaddrinfo(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80), type=socket.SOCK_STREAM)
+        pool = self._pool(url)
+        # Only idle connections: more would be discarded when put back into a full pool
+        conns = []
+        try:
+            for _ in range(min(connections, pool.pool.qsize() if pool.pool != None else 0)):
+                conns.append(pool._get_conn(timeout=0))
+        except urllib3.exceptions.EmptyPoolError:
+            pass  # Taken by requests in flight
+        errors = []
+
+        def connect(conn):
+            try:
+                if urllib3.util.connection.is_connection_dropped(conn):
+                    conn.close()
+                    conn.timeout = timeout
+                    conn.connect()
+            except Exception as e:
+                conn.close()
+                errors.append(e)
+
+        # Connected (and TLS handshaked) in parallel
+        threads = [threading.Thread(target=connect, args=(_,), daemon=True) for _ in conns]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for conn in conns:
+            pool._put_conn(conn)
+        logger.debug("Warmed up %s of %s connections to %s", len(conns) - len(errors), len(conns), url)
+        if errors:
+            raise errors[0]
+        return len(conns)
+
+
+    def _pool(self, url: str) -> urllib3.HTTPConnectionPool:
+        # The connection pool that requests would send a request to `url` with
+        session = self.session
+        adapter = session.get_adapter(url)
+        settings = session.merge_environment_settings(url, {}, None, None, None)
+        if hasattr(adapter, "get_connection_with_tls_context"):
+            request = requests.Request("GET", url).prepare()
+            return adapter.get_connection_with_tls_context(request, settings["verify"], settings["proxies"], settings["cert"])
+        return adapter.get_connection(url, settings["proxies"])
+
+
+    def _after_fork(self) -> None:
+        # In a forked process, the connections belong to the parent process,
+        # and the lock may have been held: the session is abandoned, not closed
+        self._closed = True
+        self._refresh = None
+
+
+    def close(self) -> None:
+        """Close all thread sessions and the connections in the pool."""
+        with self._lock:
+            self._closed = True
+            sessions, self._sessions = list(self._sessions), weakref.WeakSet()
+            if self._refresh != None:
+                self._refresh.set()
+        for session in sessions:
+            session.close()
+        for adapter in self._adapters.values():
+            adapter.close()
+
+
+    def __enter__(self) -> PyLapiSession:
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class PyLapiAsyncSession:
+    """A pooled non-blocking HTTP session for the async mode of a PyLapi API class.
+
+    Requests are sent with `aiohttp` on the running event loop, so many requests
+    can be in flight without a thread each. Responses are returned as
+    `requests.Response` objects so that response processing and callbacks
+    work the same in both modes.
+    """
+
+    def __init__(self, pool_size: int = None, keep_alive: bool = None) -> None:
+        if aiohttp == None:
+            raise ImportError("PyLapi async mode requires aiohttp: pip install pylapi[async]")
+        self.pool_size = pool_size if pool_size != None else config.default_async_pool_size
+        self.keep_alive = keep_alive if keep_alive != None else config.default_keep_alive
+        self._session = None
+        self._loop = None
+        self._closer = None  # Closes the session when its event loop shuts down
+        self._refresh = None  # The task refreshing warm connections
+        _pylapi_forkables.add(self)
+
+
+    @property
+    def closed(self) -> bool:
+        return self._session == None or self._session.closed
+
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The `aiohttp.ClientSession` of the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self.closed or self._loop != loop:
+            # aiohttp sessions are bound to the event loop they are created in
+            connector = aiohttp.TCPConnector(limit=self.pool_size, force_close=not self.keep_alive)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._loop = loop
+            self._closer = self._close_at_shutdown(self._session)
+            # Started to its `yield`, so that the loop finalizes it
+            try:
+                self._closer.__anext__().send(None)
+            except StopIteration:
+                pass
+        return self._session
+
+
+    @staticmethod
+    async def _close_at_shutdown(session: aiohttp.ClientSession):
+        # An async generator of the event loop of the session, closed by the loop when it
+        # shuts down its async generators (as `asyncio.run()` does before closing the loop),
+        # or when it is dropped: a session left by a loop change or by `async_mode(pool_size=...)`
+        # is closed on its own loop, while it can still close its connections
+        try:
+            yield
+        finally:
+            if not session.closed:
+                await session.close()
+
+
+    @staticmethod
+    def _params(params: dict) -> list:
+        # Encode query params the way requests does:
+        # None values are dropped, lists are repeated keys, others are str()
+        _params = []
+        for key, value in (params or {}).items():
+            for _value in (value if type(value) in (list, tuple) else [value]):
+                if _value != None:
+                    _params.append((key, _value if type(_value) == str else str(_value)))
+        return _params
+
+
+    async def request(
+            self,
+            method: str,
+            url: str,
+            params: dict = None,
+            stream: bool = False,
+            download: PyLapiDownload = None,
+            timeout: tuple = None,
+            **kwargs,
+        ) -> requests.Response:
+        # Bodies are read in full, except for downloads, written to their sinks as they arrive,
+        # leaving the body empty, and for streamed responses, left to be read as they arrive.
+        if download != None:
+            # Resumed where the download is, also when retried
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **download.headers()}
+        if timeout != None:
+            # (connect, read) as requests takes it
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=None, sock_connect=timeout[0], sock_read=timeout[1])
+        resp = await self.session.request(method, url, params=self._params(params), **kwargs)
+        try:
+            response = requests.Response()
+            response.status_code = resp.status
+            response.reason = resp.reason
+            response.headers = requests.structures.CaseInsensitiveDict(resp.headers)
+            response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+            response.url = str(resp.url)
+            if stream and response.ok and download == None:
+                # Released when the stream is read, or closed with `response.close()`
+                response.raw = resp
+                resp = None
+                return response
+            if download != None and download.accepts(response):
+                await download.areceive(response, resp.content)
+                content = b""
+            else:
+                content = await resp.read()
+        finally:
+            if resp != None:
+                resp.release()
+        response._content = content
+        response._content_consumed = True
+        return response
+
+
+    async def warmup(self, url: str, connections: int = None, timeout: float = None, refresh: float = None) -> int:
+        """Resolve the host of `url` and open keep-alive connections to it in the pool.
+
+        aiohttp has no public way to open a connection without a request, so
+        each connection is opened with a HEAD request to `url`.
+
+        Args:
+            url (str): The API URL.
+            connections (int): The number of connections to open. Default to the pool size.
+            timeout (float): Seconds to connect.
+            refresh (float): Seconds between HEAD requests keeping the connections open,
+                until the session is closed. Default to None (no refresh).
+
+        Returns: The number of connections opened.
+        """
+        connections = min(connections, self.pool_size) if connections != None else self.pool_size
+        opened = await self._warm(url, connections, timeout)
+        if refresh != None:
+            if self._refresh != None:
+                self._refresh.cancel()
+
+            async def refresh_connections():
+                while True:
+                    await asyncio.sleep(refresh)
+                    try:
+                        await self._warm(url, connections, timeout)
+                    except Exception as e:
+                        logger.debug("Refreshing connections to %s failed: %s", url, e)
+
+            self._refresh = asyncio.ensure_future(refresh_connections())
+        return opened
+
+
+    async def _warm(self, url: str, connections: int, timeout: float) -> int:
+        session = self.session
+        client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout)
+
+        async def head():
+            # Any response will do: the connection goes back to the pool once read
+            async with session.head(url, allow_redirects=False, timeout=client_timeout) as resp:
+                await resp.read()
+
+        # Sent at the same time so that each takes its own connection
+        results = await asyncio.gather(*[head() for _ in range(connections)], return_exceptions=True)
+        errors = [_ for _ in results if isinstance(_, Exception)]
+        logger.debug("Warmed up %s of %s connections to %s", connections - len(errors), connections, url)
+        if errors:
+            raise errors[0]
+        return connections
+
+
+    def _after_fork(self) -> None:
+        # In a forked process, the connections belong to the parent process
+        self._session = None
+        self._loop = None
+        self._refresh = None
+
+
+    async def close(self) -> None:
+        """Close the session and the connections in the pool."""
+        if self._refresh != None:
+            self._refresh.cancel()
+            self._refresh = None
+        if not self.closed:
+            await self._session.close()
+        self._session = None
+
+
+    async def __aenter__(self) -> PyLapiAsyncSession:
+        return self
+
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+_pylapi_session_lock = threading.Lock()
+_pylapi_callback_lock = threading.RLock()
+
+# All objects with locks or threads, reset in forked processes: the parent is usually
+# multi-threaded, and a lock held by another thread when it forks is never released in the child.
+# Sessions are abandoned, so that each process makes its own.
+_pylapi_forkables = weakref.WeakSet()
+
+
+def _pylapi_after_fork() -> None:
+    global _pylapi_session_lock, _pylapi_callback_lock
+    _pylapi_session_lock = threading.Lock()
+    _pylapi_callback_lock = threading.RLock()
+    for forkable in list(_pylapi_forkables):
+        forkable._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_pylapi_after_fork)
+
+
+class PyLapi(ABC):
+    # PyLapi class variables with prefix: _pylapi_
+
+    # User configurables
+    _pylapi_auth = ""
+    _pylapi_url = ""
+
+    # API Requests
+    _pylapi_auth_header_name = ""
+    _pylapi_auth_type = ""
+    _pylapi_base_headers = {}
+
+    # API Classes and Routes
+    _pylapi_resource_classes = {}
+    _pylapi_resource_base_paths = {}
+
+    # The API class of a resource class (set by resource_class)
+    _pylapi_api_class = None
+
+    # Pagination (see iterate())
+    _pylapi_paginator = PyLapiPaginator()
+
+    # Timeouts (see PyLapiTimeout)
+    _pylapi_timeout = PyLapiTimeout()
+
+    # Hedging (None for no hedging, see PyLapiHedge)
+    _pylapi_hedge = None
+
+    # Retries (None for no retries, see PyLapiRetry)
+    _pylapi_retry = None
+
+    # Rate limiting (None for no rate limiting, see configure_rate_limit())
+    _pylapi_rate_limiter = None
+
+    # Response cache (None for no caching, see configure_cache())
+    _pylapi_cache = None
+    _pylapi_cache_ttl = None
+
+    # Request coalescing (None for no coalescing, see configure_coalescing())
+    _pylapi_single_flight = None
+
+    # Metrics (one per API class)
+    _pylapi_metrics = None
+
+    # JSON codec (set on PyLapi for all API classes, or per API class, see configure_json())
+    _pylapi_json_codec = PyLapiJSONCodec.named(config.default_json_codec)
+
+    # Callbacks
+    _pylapi_callbacks = {}
+    _pylapi_callbacks_registered = set()
+
+    # HTTP sessions (one per API class)
+    _pylapi_session = None
+    _pylapi_pool_size = config.default_pool_size
+    _pylapi_pool_block = config.default_pool_block
+    _pylapi_keep_alive = config.default_keep_alive
+
+    # Async mode (one async session per API class)
+    _pylapi_async = False
+    _pylapi_async_session = None
+    _pylapi_async_pool_size = config.default_async_pool_size
+
+    # Log
+    _pylapi_log_level = config.log_level
+    _pylapi_deep_log_level = config.deep_log_level
+
+    def __init__(self, resource_data: dict = None, allow_api_raise=False) -> None:
+        super().__init__()
+        logger.debug("PyLapi.__init__(resource_data=%s)", resource_data)
+
+        # Error handling
+        self._allow_api_raise = allow_api_raise
+
+        # Object attributes
+        self._resource_data = resource_data if resource_data else {}
+
+        # The per-thread context of the current (or last) call, see `call`
+        self._local = threading.local()
+
+
+    ############################################################
+    #
+    # Protected methods - for subclasses and internal functions only
+    #
+
+    def _slash(self, string: str = "") -> str:
+        return "/" + string if string else ""
+
+
+    def _rewrite_data(self, rewrite: Union[str, dict, PyLapiRewrite], data: dict=None) -> dict:
+        # `rewrite` is the "template" of what to return (compiled or not)
+        # `data` is where path attributes "$" is sourced from
+        # `data` defaults to self._resource_data
+        _data = data if data else self._resource_data
+        if type(rewrite) != PyLapiRewrite:
+            rewrite = PyLapiRewrite(rewrite)
+        return rewrite(_data)
+
+
+    def _obtain_request_args(
+            self,
+            method_path: str = "",
+            data: dict = None,
+            headers: dict = None,
+            query: dict = None,
+            files: dict = None,
+            body: Any = None,
+        ) -> dict:
+
+        # _obtain_request_args(): GET resource route (with no query params)
+        # _obtain_request_args(method_path): GET resource_base_path/method_path
+        # _obtain_request_args(method_path,query=...): GET resource_base_path/method_path with query
+        # _obtain_request_args(method_path,data=...,[query=...]): POST with data, with or without query
+        # _obtain_request_args(method_path,data={},[query=...]): POST with data, with or without query
+        # _obtain_request_args(method_path,files=...,[data=...]): POST multipart with files, and data as form fields
+        # _obtain_request_args(method_path,body=...): POST a binary body
+
+        # GET/POST above is indicative. The caller will determine if they get or post the request.
+
+        # logger.debug(f"self._pylapi_url={self._pylapi_url}")
+        # logger.debug(f"self._pylapi_resource_base_paths={self._pylapi_resource_base_paths}")
+        # logger.debug(f"self._resource_name={self._resource_name}")
+        # logger.debug(f"self._pylapi_base_headers={self.wash_secrets(self._pylapi_base_headers)}")
+        logger.debug("_obtain_request_args: method_path=%s", method_path)
+        api_url = f"{self._pylapi_url}{self._slash(self._pylapi_resource_base_paths[self._resource_name])}{self._slash(method_path)}"
+        request = {
+            "url": api_url,
+            # A copy, as the base headers are shared by all calls of the API class
+            "headers": dict(self._pylapi_base_headers),
+        }
+        # Append the auth header
+        request["headers"][config.default_api_auth_header_name] = \
+            (self._pylapi_auth_type + " " if self._pylapi_auth_type else "") + \
+            self._pylapi_auth
+
+        # Query params
+        if query:
+            request["params"] = query
+
+        # Json payload data
+        logger.debug("_obtain_request_args: data=%s", data)
+        _data = data
+        if _data != None:
+            if type(_data) == MagicO:
+                _data = _data.to_data()
+            # Substitute any "$" attributes found with self._resource_data ones
+            _data = self._rewrite_data(_data)
+
+        # Streamed upload, or json payload data
+        upload = None
+        if files != None:
+            upload = PyLapiMultipart(_data, files)
+        elif body != None:
+            upload = PyLapiUpload.of(body)
+        if upload != None:
+            request["headers"]["content-type"] = upload.content_type
+            request["headers"]["content-length"] = str(len(upload))
+            request["data"] = upload
+            logger.debug("_obtain_request_args: request['data']=%s", upload)
+        elif _data != None:
+            request["headers"]["content-type"] = "application/json"
+            request["json"] = _data
+            logger.debug("_obtain_request_args: request['json']=%s", request["json"])
+
+        if headers != None:
+            request["headers"].update(headers)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("_obtain_request_args: request=%s", self.wash_secrets(request))
+        return request
+
+
+    # Argument names `data`, `headers`, `files`, `body` and `download` are directly referenced in resource_method(). Do not rename them.
+    # Set these in the call context
+    # self._request_http_method
+    # self._request
+    # Initialise these in the call context
+    # self._response = None
+    # self._response_data = {}
+    def _obtain_request_function(
+            self,
+            method_path: str,
+            http_method: Union[HTTPMethod, str] = None,
+            data: dict = None,
+            headers: dict = None,
+            files: dict = None,
+            body: Any = None,
+            download: Any = None,
+            **query,
+        ) -> function:
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "_obtain_request_function(method_path=%s, http_method=%s, data=%s, headers=%s, files=%s, body=%s, download=%s, query=%s)",
+                method_path, http_method, data, self.wash_secrets(headers), files, body, download, query,
+            )
+
+        request_index = len(requests_http)  # Would raise an IndexError unless set
+        _data = data
+        _http_method = http_method
+        if not _http_method:
+            _http_method = HTTPMethod.GET if _data == None and files == None and body == None else HTTPMethod.POST
+            request_index = int(_http_method)
+            logger.debug("HTTPMethod auto assigned: %s", request_index)
+        elif type(_http_method) == str:
+            _http_method = _http_method.upper()
+            try:
+                request_index = int(HTTPMethod[_http_method])
+            except:
+                raise Exception(f"{_http_method} is not a valid HTTPMethod")
+            logger.debug("HTTPMethod derived from string \"%s\": %s", http_method, request_index)
+        else:
+            request_index = int(_http_method)
+            logger.debug("HTTPMethod native: %s", request_index)
+
+        try:
+            self._request_http_method = requests_http_name[request_index]
+        except:
+            raise Exception(f"HTTPMethod {http_method} cannot be determined")
+        logger.debug("Request Method to Use: %s", self._request_http_method)
+
+        # Send through the pooled session of the API class
+        session = self.async_session() if self.is_async() else self.session()
+        request_func = functools.partial(session.request, self._request_http_method)
+
+        self._request = self._obtain_request_args(method_path, data=_data, headers=headers, query=query, files=files, body=body)
+
+        if download != None:
+            # The body is streamed to the sink: requests streams the response,
+            # and the async session writes it as it arrives
+            download = PyLapiDownload.of(download)
+            url = self._request["url"]
+            if self._request.get("params"):
+                url += "?" + urlencode(PyLapiAsyncSession._params(self._request["params"]))
+            self._request["headers"].update(download.headers(url))
+            if self.is_async():
+                self._request["download"] = download
+            else:
+                self._request["stream"] = True
+            self._local.call = self.call._replace(download=download)
+
+        # Now that _request_http_method and _request are set,
+        # need to nullify _response and _response_data
+        self._response = None
+        self._response_data = {}
+
+        return request_func
+
+
+    # Process the response of a resource method call:
+    # - `load` the response data into the resource object
+    # - `give` the response data to return
+    # - Call back the response callback
+    def _method_response(self, method, give, load, _arg_values: dict) -> Any:
+        download = self.call.download
+        downloaded = download != None and download.accepts(self._response)
+        is_json = not downloaded and self._json_content(self._response) and len(self._response.content) > 0
+        if downloaded:
+            response_json = download
+        elif is_json:
+            response_json = self.json_codec().loads(self._response.content)
+        elif (self._response.headers.get("Content-Type") or "").startswith("text/"):
+            response_json = self._response.text
+        else:
+            response_json = self._response.content or None
+        self._local.call = self.call._replace(response_json=response_json, response_data=response_json)
+        # Only select the give path and load path if no error
+
+        if not downloaded and not self.response_ok():
+            if self._allow_api_raise:
+                raise PyLapiError(self._response_data)
+            # else skip the load and give, then let response callback to handle the error
+        elif not is_json:
+            # Non-JSON bodies (text, bytes, a download or None if empty) are given as is
+            logger.debug("Non-JSON response: %s", self._response.headers.get("Content-Type"))
+        else:
+            logger.debug("self._response_data=%s", self._response_data)
+            # Process `load` first as `give` processing will alter `response_json`
+
+            # Load `load` element into the object
+            # load==None (default) means NOT to load anything
+            # load=="" means to load the whole object
+            # load=="..." means to load the path
+            if load != None:
+                logger.debug("load=%s", load)
+                self[""] = self._rewrite_data(load, self._response_data)
+                # if load == "":
+                #     self[""] = self._response_data
+                # elif load in self._response_data:
+                #     self[""] = self._response_data[load]
+                # else:
+                #     raise Exception(f"Load path {load} cannot be found in the API response: {self._response_data}")
+
+            # Function returns only the `give` element
+            # give==None means to return nothing
+            # give=="" means to return the whole object
+            # load=="..." means to return the path
+            if give == None:
+                self._response_data = None
+            else:
+                logger.debug("give=%s", give)
+                self._response_data = self._rewrite_data(give, self._response_data)
+                # self._response_data = self._response_data[give] if give in self._response_data else {}
+                # logger.debug(f"self._response_data={self._response_data}")
+
+        if "response" in self._pylapi_callbacks[method.__qualname__]:
+            logger.debug("Calling response callback %s.response", method.__qualname__)
+            self._pylapi_callbacks[method.__qualname__]["response"](self, **_arg_values)
+
+        self._local.call = self.call._replace(finished=time.perf_counter())
+
+        if self._response_data != None:
+            return self._response_data
+        else:
+            return
+
+
+    # When a call times out: the deadline in effect or the total timeout, whichever is sooner
+    def _call_deadline(self, plan: PyLapiMethodPlan, started: float) -> float:
+        timeout = plan.timeout if plan.timeout != None else self.timeout
+        deadlines = [_pylapi_deadline.get(), started + timeout.total if timeout.total != None else None]
+        return min((_ for _ in deadlines if _ != None), default=None)
+
+
+    # The seconds left to the call (None if no deadline), or raise if none is left
+    def _check_deadline(self, call: PyLapiCall) -> float:
+        remaining = call.remaining
+        if remaining != None and remaining <= 0:
+            raise PyLapiTimeoutError({"error": "Deadline exceeded", "method": call.method, "elapsed": time.perf_counter() - call.started})
+        return remaining
+
+
+    # Read the body of a response sent with `stream=True` by the deadline of its call:
+    # the read timeout bounds each read, not the whole body, so the deadline is checked
+    # after each read of whatever has arrived
+    @staticmethod
+    def _read_by_deadline(response: requests.Response, call: PyLapiCall) -> None:
+        raw = response.raw
+        chunks = []
+        try:
+            while True:
+                if hasattr(raw, "read1"):
+                    chunk = raw.read1(config.default_stream_chunk_size, decode_content=True)
+                else:
+                    chunk = raw.read(config.default_stream_chunk_size, decode_content=True)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                if time.perf_counter() >= call.deadline:
+                    raise PyLapiTimeoutError({"error": "Deadline exceeded while reading the response", "method": call.method, "elapsed": time.perf_counter() - call.started})
+        except urllib3.exceptions.ReadTimeoutError as e:
+            # As requests raises them when it reads the body
+            response.close()
+            raise requests.ConnectionError(e)
+        except urllib3.exceptions.ProtocolError as e:
+            response.close()
+            raise requests.exceptions.ChunkedEncodingError(e)
+        except BaseException:
+            response.close()
+            raise
+        response._content = b"".join(chunks)
+        raw.release_conn()
+
+
+    # Raise the error of the last attempt, timeouts as PyLapiTimeoutError
+    @staticmethod
+    def _raise_error(call: PyLapiCall, error: Exception) -> None:
+        if isinstance(error, _pylapi_timeout_errors):
+            message = f"Timed out: {error}" if str(error) else "Deadline exceeded"
+            raise PyLapiTimeoutError({"error": message, "method": call.method, "elapsed": time.perf_counter() - call.started}) from error
+        raise error
+
+
+    # The request args as sent: a json payload is serialised with the JSON codec of the API class
+    def _wire_request(self, request: dict) -> dict:
+        if "json" not in request:
+            return request
+        wire = dict(request)
+        payload = wire.pop("json")
+        if payload != None:
+            wire["data"] = self.json_codec().encode(payload)
+        return wire
+
+
+    # Whether a response is a stream of server-sent events
+    @staticmethod
+    def _event_stream(response: requests.Response) -> bool:
+        return (response.headers.get("Content-Type") or "").split(";")[0].strip().lower() == "text/event-stream"
+
+
+    # Whether a response is JSON (or says nothing of its type)
+    @staticmethod
+    def _json_content(response: requests.Response) -> bool:
+        content_type = (response.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        return content_type == "" or "json" in content_type
+
+
+    # The key of a request: its URL, query, API class and credential
+    def _request_key(self, call: PyLapiCall) -> str:
+        credential = call.request["headers"].get(config.default_api_auth_header_name) or ""
+        query = urlencode(sorted(PyLapiAsyncSession._params(call.request.get("params"))))
+        # The credential is hashed so that no secrets are kept in the cache
+        credential_hash = hashlib.sha256(credential.encode()).hexdigest()[:16]
+        return f"{call.request['url']}?{query}#{self._api_class().__name__}:{credential_hash}"
+
+
+    # The cache key and entry of a GET request, if cached,
+    # and the call with the conditional headers to revalidate the entry
+    def _cache_lookup(self, call: PyLapiCall, plan: PyLapiMethodPlan) -> tuple:
+        cache = self.response_cache()
+        if cache == None or plan.cache == False or plan.stream or call.download != None or call.http_method != "GET":
+            return call, None, None
+        key = self._request_key(call)
+        entry = cache.get(key)
+        if entry == None:
+            return call._replace(cache="miss"), key, None
+        if entry.fresh():
+            self.metrics().increment("cache_hits")
+            now = time.perf_counter()
+            return call._replace(cache="hit", response=entry.response(), sent=now, received=now), key, entry
+        request = {**call.request, "headers": {**call.request["headers"], **entry.validators()}}
+        return call._replace(request=request, cache="miss"), key, entry
+
+
+    # Serve a 304 Not Modified from the cache entry, cache a cacheable response,
+    # or invalidate the cached responses of the resource path a write goes to
+    def _cache_store(self, plan: PyLapiMethodPlan, key: str, entry: PyLapiCacheEntry, response: requests.Response, call: PyLapiCall) -> tuple:
+        cache = self.response_cache()
+        if cache == None:
+            return response, call
+        if call.http_method in ("PUT", "PATCH", "DELETE"):
+            cache.invalidate(call.request["url"])
+            return response, call
+        if key == None:
+            return response, call
+        ttl = plan.cache_ttl if plan.cache_ttl != None else self._api_class()._pylapi_cache_ttl
+        if response.status_code == 304 and entry != None:
+            entry = entry.revalidated(response, ttl)
+            cache.set(key, entry)
+            self.metrics().increment("cache_revalidated")
+            logger.debug("Response cache revalidated: %s", entry.url)
+            return entry.response(), call._replace(cache="revalidated")
+        if response.status_code == 200 and "no-store" not in response.headers.get("Cache-Control", "") \
+                and (ttl or response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            cache.set(key, PyLapiCacheEntry.from_response(response, ttl))
+        return response, call
+
+
+    # The call context of a call that shares the response of an identical call
+    @staticmethod
+    def _coalesced_call(call: PyLapiCall, shared: PyLapiCall) -> PyLapiCall:
+        return call._replace(
+            response=copy(shared.response),
+            sent=shared.sent,
+            received=shared.received,
+            attempts=shared.attempts,
+            cache=shared.cache,
+            coalesced=True,
+        )
+
+
+    # Send the request of a call, paced by the rate limiter,
+    # retrying transient failures as the retry policy allows,
+    # and return the call with the final response
+    def _send_attempts(self, request_func, plan: PyLapiMethodPlan, call: PyLapiCall, cache_key: str, cache_entry: PyLapiCacheEntry) -> PyLapiCall:
+        retry = plan.retry if plan.retry != None else self.retry
+        if retry != None and not retry.allows(call.http_method, call.request):
+            retry = None
+        limiter = self.rate_limiter()
+        credential = call.request["headers"].get(config.default_api_auth_header_name) if limiter != None else None
+        metrics = self.metrics()
+        timeout = plan.timeout if plan.timeout != None else self.timeout
+        hedge = self._call_hedge(plan, call)
+        # Serialised once for all attempts
+        request = self._wire_request(call.request)
+        # With a deadline, the body is read here, so that a body trickling in cannot run past it
+        read_by_deadline = call.deadline != None and hedge == None and not request.get("stream")
+        if read_by_deadline:
+            request = {**request, "stream": True}
+        attempt = 0
+        while True:
+            attempt += 1
+            response, error = None, None
+            if limiter != None:
+                limiter.acquire(credential)
+            remaining = self._check_deadline(call)
+            sent = time.perf_counter()
+            metrics.increment("requests")
+            try:
+                if hedge != None:
+                    response = self._send_hedged(hedge, request_func, request, timeout.attempt(remaining), limiter, credential)
+                else:
+                    response = request_func(**request, timeout=timeout.attempt(remaining))
+                    if read_by_deadline:
+                        self._read_by_deadline(response, call)
+            except _pylapi_transient_errors as e:
+                error = e
+            if limiter != None and response != None:
+                limiter.update(response, credential)
+            delay = retry.next_delay(attempt, call.started, response, error) if retry != None else None
+            if delay != None and call.deadline != None and time.perf_counter() + delay >= call.deadline:
+                # No time left for another attempt
+                delay = None
+            if delay == None:
+                if error != None:
+                    self._raise_error(call, error)
+                break
+            logger.debug("Retrying %s in %.3fs after attempt %s: %s", call.method, delay, attempt, error or response.status_code)
+            metrics.increment("retries")
+            if response != None:
+                response.close()
+            time.sleep(delay)
+        response, call = self._cache_store(plan, cache_key, cache_entry, response, call)
+        return call._replace(response=response, sent=sent, received=time.perf_counter(), attempts=attempt)
+
+
+    async def _asend_attempts(self, request_func, plan: PyLapiMethodPlan, call: PyLapiCall, cache_key: str, cache_entry: PyLapiCacheEntry) -> PyLapiCall:
+        # The async mode version of `_send_attempts()`
+        retry = plan.retry if plan.retry != None else self.retry
+        if retry != None and not retry.allows(call.http_method, call.request):
+            retry = None
+        limiter = self.rate_limiter()
+        credential = call.request["headers"].get(config.default_api_auth_header_name) if limiter != None else None
+        metrics = self.metrics()
+        timeout = plan.timeout if plan.timeout != None else self.timeout
+        hedge = self._call_hedge(plan, call)
+        # Serialised once for all attempts
+        request = self._wire_request(call.request)
+        attempt = 0
+        while True:
+            attempt += 1
+            response, error = None, None
+            if limiter != None:
+                await limiter.aacquire(credential)
+            remaining = self._check_deadline(call)
+            sent = time.perf_counter()
+            metrics.increment("requests")
+            try:
+                if hedge != None:
+                    sending = self._asend_hedged(hedge, request_func, request, timeout.attempt(remaining), limiter, credential)
+                else:
+                    sending = request_func(**request, timeout=timeout.attempt(remaining))
+                # Cancelled when the deadline runs out
+                response = await asyncio.wait_for(sending, remaining)
+            except _pylapi_transient_errors as e:
+                error = e
+            if limiter != None and response != None:
+                limiter.update(response, credential)
+            delay = retry.next_delay(attempt, call.started, response, error) if retry != None else None
+            if delay != None and call.deadline != None and time.perf_counter() + delay >= call.deadline:
+                # No time left for another attempt
+                delay = None
+            if delay == None:
+                if error != None:
+                    self._raise_error(call, error)
+                break
+            logger.debug("Retrying %s in %.3fs after attempt %s: %s", call.method, delay, attempt, error or response.status_code)
+            metrics.increment("retries")
+            await asyncio.sleep(delay)
+        response, call = self._cache_store(plan, cache_key, cache_entry, response, call)
+        return call._replace(response=response, sent=sent, received=time.perf_counter(), attempts=attempt)
+
+
+    # The hedging policy of a call, or None if it is not hedged:
+    # streamed and download responses are read as they arrive, so they cannot be sent twice
+    def _call_hedge(self, plan: PyLapiMethodPlan, call: PyLapiCall) -> PyLapiHedge:
+        hedge = plan.hedge if plan.hedge != None else self.hedge
+        if hedge == None or plan.stream or call.download != None or not hedge.allows(call.http_method):
+            return None
+        return hedge
+
+
+    # Send a request, and a hedge if no response comes within the hedge delay of its sending;
+    # the first response is used, and the other is discarded when it comes
+    def _send_hedged(self, hedge: PyLapiHedge, request_func, request: dict, timeout: tuple, limiter: PyLapiRateLimiter, credential: str) -> requests.Response:
+        sent_at, started = [], threading.Event()
+
+        def send(reserved: bool = False):
+            try:
+                sent = time.perf_counter()
+                sent_at.append(sent)
+                started.set()
+                response = request_func(**request, timeout=timeout)
+                hedge.observe(time.perf_counter() - sent)
+                return response
+            finally:
+                if reserved:
+                    hedge.release()
+
+        hedge.earn()
+        if not hedge.reserve():
+            # All threads of the pool are busy
+            return send()
+        executor = hedge.executor()
+        # Each request runs in its own copy of the caller's context
+        futures = [executor.submit(contextvars.copy_context().run, send, True)]
+        delay = hedge.hedge_delay()
+        if delay != None:
+            # From the sending of the request, not from its submission to the pool
+            started.wait()
+            remaining = sent_at[0] + delay - time.perf_counter()
+            if not wait_futures(futures, timeout=max(remaining, 0)).done and hedge.reserve():
+                if hedge.spend() and (limiter == None or limiter.try_acquire(credential)):
+                    self.metrics().increment("requests")
+                    self.metrics().increment("hedges")
+                    futures.append(executor.submit(contextvars.copy_context().run, send, True))
+                else:
+                    hedge.release()
+        winner, pending = None, set(futures)
+        while pending and winner == None:
+            done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+            winner = next((_ for _ in futures if _ in done and _.exception() == None), None)
+        for future in futures:
+            if future is not winner:
+                future.add_done_callback(self._discard_response)
+        if winner == None:
+            # Both failed
+            raise futures[0].exception()
+        if winner is not futures[0]:
+            self.metrics().increment("hedge_wins")
+        return winner.result()
+
+
+    @staticmethod
+    def _discard_response(future: Future) -> None:
+        if future.exception() == None:
+            future.result().close()
+
+
+    async def _asend_hedged(self, hedge: PyLapiHedge, request_func, request: dict, timeout: tuple, limiter: PyLapiRateLimiter, credential: str) -> requests.Response:
+        # The async mode version of `_send_hedged()`: the other request is cancelled
+        async def send():
+            sent = time.perf_counter()
+            response = await request_func(**request, timeout=timeout)
+            hedge.observe(time.perf_counter() - sent)
+            return response
+
+        hedge.earn()
+        tasks = [asyncio.ensure_future(send())]
+        try:
+            delay = hedge.hedge_delay()
+            if delay != None and not (await asyncio.wait(tasks, timeout=delay))[0]:
+                if hedge.spend() and (limiter == None or limiter.try_acquire(credential)):
+                    self.metrics().increment("requests")
+                    self.metrics().increment("hedges")
+                    tasks.append(asyncio.ensure_future(send()))
+            winner, pending = None, set(tasks)
+            while pending and winner == None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((_ for _ in tasks if _ in done and _.exception() == None), None)
+            if winner == None:
+                # Both failed
+                return tasks[0].result()
+            if winner is not tasks[0]:
+                self.metrics().increment("hedge_wins")
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # Retrieved, so that a failed loser is not reported
+
+
+    # Send the request of a download call and write the body to the sink,
+    # resuming a broken download with Range requests
+    def _send_download(self, request_func, plan: PyLapiMethodPlan, call: PyLapiCall) -> PyLapiCall:
+        download = call.download
+        while True:
+            sent_call = self._send_attempts(request_func, plan, call, None, None)
+            if not download.accepts(sent_call.response):
+                return sent_call
+            try:
+                download.receive(sent_call.response)
+                return sent_call._replace(attempts=sent_call.attempts + download.resumes)
+            except _pylapi_download_errors as e:
+                if not download.resumable():
+                    raise
+                download.resumes += 1
+                logger.debug("Resuming %s at %s bytes after: %s", call.method, download.size, e)
+                call = call._replace(request={**call.request, "headers": {**call.request["headers"], **download.headers()}})
+
+
+    async def _asend_download(self, request_func, plan: PyLapiMethodPlan, call: PyLapiCall) -> PyLapiCall:
+        # The async mode version of `_send_download()`: the session writes the body
+        download = call.download
+        while True:
+            try:
+                sent_call = await self._asend_attempts(request_func, plan, call, None, None)
+                return sent_call._replace(attempts=sent_call.attempts + download.resumes)
+            except _pylapi_download_errors as e:
+                if not download.resumable():
+                    raise
+                download.resumes += 1
+                logger.debug("Resuming %s at %s bytes after: %s", call.method, download.size, e)
+                call = call._replace(request={**call.request, "headers": {**call.request["headers"], **download.headers()}})
+
+
+    # Send the request of the current call, from the response cache,
+    # or shared with identical concurrent GETs, and keep the response in the call context
+    def _send_request(self, request_func, plan: PyLapiMethodPlan) -> None:
+        call, cache_key, cache_entry = self._cache_lookup(self.call, plan)
+        if call.cache == "hit":
+            self._local.call = call
+            return
+        if call.download != None:
+            self._local.call = self._send_download(request_func, plan, call)
+            return
+        flights = self._api_class()._pylapi_single_flight
+        if flights == None or plan.stream or call.http_method != "GET":
+            self._local.call = self._send_attempts(request_func, plan, call, cache_key, cache_entry)
+            return
+        sent_call, shared = flights.do(
+            cache_key or self._request_key(call),
+            lambda: self._send_attempts(request_func, plan, call, cache_key, cache_entry),
+        )
+        if shared:
+            self.metrics().increment("coalesced")
+            sent_call = self._coalesced_call(call, sent_call)
+        self._local.call = sent_call
+
+
+    # Process the streamed response of a resource method call:
+    # only the `give` path is parsed, and an array there is given element by element
+    def _method_stream(self, method, plan: PyLapiMethodPlan, _arg_values: dict, call: PyLapiCall = None, parsed: tuple = None) -> Any:
+        # `call` and `parsed`, the (is_array, data) parsed, are given by `_amethod_stream()` in async mode
+        response = call.response if call != None else self._response
+        if not response.ok:
+            # Error responses are processed as usual
+            return self._method_response(method, plan.give, plan.load, _arg_values)
+        if plan.give == None:
+            response.close()
+            self._response_data = None
+        elif self._event_stream(response):
+            # Server-sent events: the data of each event is given as it arrives
+            if self.is_async():
+                self._response_data = self._astream_events(response, plan.give)
+            else:
+                self._response_data = self._stream_events(response, plan.give)
+        else:
+            if parsed != None:
+                is_array, data = parsed
+            else:
+                chunks = response.iter_content(chunk_size=config.default_stream_chunk_size)
+                is_array, data = PyLapiJSONStream(chunks, plan.give.template).parse()
+            if is_array:
+                data = self._astream_elements(data, response) if parsed != None else self._stream_elements(data, response)
+            else:
+                response.close()
+                if plan.load != None:
+                    self[""] = data
+            self._response_data = data
+
+        # The response callback can work over the stream, e.g., by replacing `_response_data` with a generator over it
+        if "response" in self._pylapi_callbacks[method.__qualname__]:
+            logger.debug("Calling response callback %s.response", method.__qualname__)
+            self._pylapi_callbacks[method.__qualname__]["response"](self, **_arg_values)
+
+        self._local.call = self.call._replace(finished=time.perf_counter())
+        return self._response_data
+
+
+    async def _amethod_stream(self, method, plan: PyLapiMethodPlan, call: PyLapiCall, _arg_values: dict) -> Any:
+        # The async mode version of `_method_stream()`: a JSON body is parsed
+        # as it arrives from the aiohttp response kept open by the session.
+        # `call` is the sent call, as other calls on this object may run while parsing.
+        response = call.response
+        if not response.ok or plan.give == None or self._event_stream(response):
+            self._local.call = call
+            return self._method_stream(method, plan, _arg_values, call)
+        chunks = response.raw.content.iter_chunked(config.default_stream_chunk_size)
+        try:
+            parsed = await PyLapiJSONStream(chunks, plan.give.template).aparse()
+        except BaseException:
+            response.close()
+            raise
+        # Set after the last await, and read by the response processing before any other call can run
+        self._local.call = call
+        return self._method_stream(method, plan, _arg_values, call, parsed)
+
+
+    @staticmethod
+    def _stream_elements(elements: Iterator, response: requests.Response) -> Iterator:
+        try:
+            yield from elements
+        finally:
+            response.close()
+
+
+    @staticmethod
+    async def _astream_elements(elements: AsyncIterator, response: requests.Response) -> AsyncIterator:
+        try:
+            async for element in elements:
+                yield element
+        finally:
+            response.raw.release()
+
+
+    # The data of an event: JSON parsed with `give` applied, or the text as is
+    def _event_data(self, event: PyLapiEvent, give: PyLapiRewrite) -> Any:
+        try:
+            data = self.json_codec().loads(event.data)
+        except ValueError:
+            return event.data
+        return give(data) if type(data) in (dict, list) else data
+
+
+    # The data of the server-sent events of a response as they arrive,
+    # until the end of the stream or a "[DONE]" event
+    def _stream_events(self, response: requests.Response, give: PyLapiRewrite) -> Iterator:
+        parser = PyLapiEventStream()
+        raw = response.raw
+        if hasattr(raw, "read1"):
+            # Whatever has arrived, rather than waiting for a chunk to fill up
+            chunks = iter(lambda: raw.read1(config.default_stream_chunk_size, decode_content=True), b"")
+        else:
+            chunks = response.iter_content(chunk_size=None)
+        try:
+            for chunk in itertools.chain(chunks, [b""]):
+                for event in parser.feed(chunk):
+                    if event.data == "[DONE]":
+                        return
+                    yield self._event_data(event, give)
+        finally:
+            response.close()
+
+
+    async def _astream_events(self, response: requests.Response, give: PyLapiRewrite) -> AsyncIterator:
+        # The async mode version of `_stream_events()`, over the aiohttp response kept open by the session
+        parser = PyLapiEventStream()
+        try:
+            async for chunk in response.raw.content.iter_any():
+                for event in parser.feed(chunk):
+                    if event.data == "[DONE]":
+                        return
+                    yield self._event_data(event, give)
+            for event in parser.feed(b""):
+                if event.data != "[DONE]":
+                    yield self._event_data(event, give)
+        finally:
+            response.raw.release()
+
+
+    async def _async_method_call(self, request_func, method, plan: PyLapiMethodPlan, call: PyLapiCall, _arg_values: dict) -> Any:
+        # `call` is bound by the method call, as other calls on this object may run in this thread
+        # while awaiting. The call context is only set after the last await, and read by the
+        # response processing before any other call can run.
+        call, cache_key, cache_entry = self._cache_lookup(call, plan)
+        flights = self._api_class()._pylapi_single_flight
+        if call.cache == "hit":
+            sent_call = call
+        elif call.download != None:
+            sent_call = await self._asend_download(request_func, plan, call)
+        elif flights == None or plan.stream or call.http_method != "GET":
+            sent_call = await self._asend_attempts(request_func, plan, call, cache_key, cache_entry)
+        else:
+            sent_call, shared = await flights.ado(
+                cache_key or self._request_key(call),
+                lambda: self._asend_attempts(request_func, plan, call, cache_key, cache_entry),
+            )
+            if shared:
+                self.metrics().increment("coalesced")
+                sent_call = self._coalesced_call(call, sent_call)
+        if plan.stream and call.download == None:
+            return await self._amethod_stream(method, plan, sent_call, _arg_values)
+        self._local.call = sent_call
+        return self._method_response(method, plan.give, plan.load, _arg_values)
+
+
+    ############################################################
+    #
+    # Class methods
+    #
+
+    # @classmethod
+    # def auth(
+    #     cls,
+    #     auth: str = "",
+    #     url: str = "",
+    # ) -> None:
+    #     # logger.debug(f"auth")
+    #     if auth:
+    #         cls._pylapi_auth = auth
+    #     if url:
+    #         cls._pylapi_url = url
+
+    @classmethod
+    def auth(cls, auth: str) -> None:
+        # logger.debug(f"auth")
+        if auth:
+            cls._pylapi_auth = auth
+
+
+    @classmethod
+    def _api_class(cls) -> type:
+        # Resource classes share the session and settings of their API class
+        return cls._pylapi_api_class if cls._pylapi_api_class else cls
+
+
+    @classmethod
+    def session(cls) -> PyLapiSession:
+        """Get the pooled HTTP session of the API class, creating it on first use.
+
+        Returns: The `PyLapiSession` shared by all resources of the API class.
+        """
+        api_cls = cls._api_class()
+        session = api_cls.__dict__.get("_pylapi_session")
+        if session == None or session.closed:
+            with _pylapi_session_lock:
+                session = api_cls.__dict__.get("_pylapi_session")
+                if session == None or session.closed:
+                    session = PyLapiSession(
+                        pool_size=api_cls._pylapi_pool_size,
+                        pool_block=api_cls._pylapi_pool_block,
+                        keep_alive=api_cls._pylapi_keep_alive,
+                    )
+                    api_cls._pylapi_session = session
+        return session
+
+
+    @classmethod
+    def configure_session(cls, pool_size: int = None, pool_block: bool = None, keep_alive: bool = None) -> None:
+        """Configure the pooled HTTP session of the API class.
+
+        The current session, if any, is closed so that the next request
+        starts a new session with the new settings.
+
+        Args:
+            pool_size (int): Maximum number of keep-alive connections per host.
+            pool_block (bool): Block when no connection is free instead of opening a throwaway one.
+            keep_alive (bool): Keep connections open between requests.
+        """
+        api_cls = cls._api_class()
+        if pool_size != None:
+            api_cls._pylapi_pool_size = pool_size
+        if pool_block != None:
+            api_cls._pylapi_pool_block = pool_block
+        if keep_alive != None:
+            api_cls._pylapi_keep_alive = keep_alive
+        api_cls.close()
+
+
+    @classmethod
+    def close(cls) -> None:
+        """Close the pooled HTTP session of the API class, if any."""
+        session = cls._api_class().__dict__.get("_pylapi_session")
+        if session != None:
+            session.close()
+
+
+    @classmethod
+    def warmup(cls, connections: int = None, refresh: float = None) -> int:
+        """Open keep-alive connections to the API host before the first calls.
+
+        The host is resolved, and the connections are opened (with their TLS handshakes)
+        in parallel in the pooled session of the API class, so the first calls do not
+        pay for them. With `refresh`, dropped connections are reopened every `refresh`
+        seconds until the session is closed (see `close()`).
+
+        Example:
+            aAPI.warmup(connections=8, refresh=30)
+
+        Args:
+            connections (int): The number of connections to open. Default to the pool size.
+            refresh (float): Seconds between refreshes. Default to None (no refresh).
+
+        Returns: The number of connections open in the pool.
+        """
+        if cls.is_async():
+            raise Exception(f"warmup() is not available in async mode, use awarmup()")
+        api = cls._any_resource()
+        return cls.session().warmup(api.api_url, connections, api.timeout.connect, refresh)
+
+
+    @classmethod
+    async def awarmup(cls, connections: int = None, refresh: float = None) -> int:
+        """The async mode version of `warmup()`.
+
+        Each connection is opened with a HEAD request to the API URL, and kept open
+        with one every `refresh` seconds until the session is closed (see `aclose()`).
+        """
+        api = cls._any_resource()
+        return await cls.async_session().warmup(api.api_url, connections, api.timeout.connect, refresh)
+
+
+    @classmethod
+    def _any_resource(cls) -> PyLapi:
+        # A resource object, for the API URL and timeouts set in the API class constructor;
+        # the resource classes of all API classes are registered together
+        api_cls = cls._api_class()
+        for resource_cls in api_cls._pylapi_resource_classes.values():
+            if resource_cls._pylapi_api_class is api_cls:
+                return resource_cls()
+        raise Exception(f"No resource classes in {api_cls.__name__}")
+
+
+    @classmethod
+    def async_mode(cls, enabled: bool = True, pool_size: int = None) -> None:
+        """Switch the API class into (or out of) async mode.
+
+        In async mode, resource methods return awaitables and send requests
+        on a non-blocking transport, e.g., `await MyAPI.resource("task").getTask(gid)`.
+
+        Args:
+            enabled (bool): True for async mode; False for the default blocking mode.
+            pool_size (int): Maximum number of connections (in-flight requests) of the API class.
+        """
+        api_cls = cls._api_class()
+        api_cls._pylapi_async = enabled
+        if pool_size != None:
+            api_cls._pylapi_async_pool_size = pool_size
+            api_cls._pylapi_async_session = None
+
+
+    @classmethod
+    def is_async(cls) -> bool:
+        return cls._api_class()._pylapi_async
+
+
+    @classmethod
+    def async_session(cls) -> PyLapiAsyncSession:
+        """Get the pooled async HTTP session of the API class, creating it on first use.
+
+        Returns: The `PyLapiAsyncSession` shared by all resources of the API class.
+        """
+        api_cls = cls._api_class()
+        session = api_cls.__dict__.get("_pylapi_async_session")
+        if session == None:
+            with _pylapi_session_lock:
+                session = api_cls.__dict__.get("_pylapi_async_session")
+                if session == None:
+                    session = PyLapiAsyncSession(
+                        pool_size=api_cls._pylapi_async_pool_size,
+                        keep_alive=api_cls._pylapi_keep_alive,
+                    )
+                    api_cls._pylapi_async_session = session
+        return session
+
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close the pooled async HTTP session of the API class, if any."""
+        session = cls._api_class().__dict__.get("_pylapi_async_session")
+        if session != None:
+            await session.close()
+
+
+    @classmethod
+    def configure_rate_limit(
+            cls,
+            rate: float = None,
+            burst: int = None,
+            per_credential: bool = False,
+            margin: int = None,
+            enabled: bool = True,
+        ) -> None:
+        """Pace the requests of the API class with a client-side rate limiter.
+
+        The limiter follows the rate limit and `Retry-After` headers of the
+        responses, so that requests stay just under the API quota.
+        See `PyLapiRateLimiter`.
+
+        Args:
+            rate (float): Maximum requests per second, or None to follow the API headers only.
+            burst (int): Maximum requests that can be sent at once.
+            per_credential (bool): Keep a separate quota for each auth credential.
+            margin (int): Requests of the quota left unused, e.g., for other clients.
+            enabled (bool): False to remove the rate limiter.
+        """
+        api_cls = cls._api_class()
+        api_cls._pylapi_rate_limiter = PyLapiRateLimiter(
+            rate=rate,
+            burst=burst,
+            per_credential=per_credential,
+            margin=margin,
+        ) if enabled else None
+
+
+    @classmethod
+    def rate_limiter(cls) -> PyLapiRateLimiter:
+        """Get the rate limiter of the API class, or None if requests are not rate limited."""
+        return cls._api_class()._pylapi_rate_limiter
+
+
+    @classmethod
+    def configure_cache(cls, cache: PyLapiCache = None, ttl: float = None, enabled: bool = True) -> None:
+        """Cache the GET responses of the API class.
+
+        Cached responses are served without a request for `ttl` seconds.
+        After that, they are revalidated with `If-None-Match` and `If-Modified-Since`,
+        and served from the cache when the API answers 304 Not Modified.
+        PUT, PATCH and DELETE requests invalidate the cached responses of their URL and its sub-paths.
+        A resource method can have its own TTL with `@MyAPI.resource_method(..., cache_ttl=...)`,
+        or opt out with `@MyAPI.resource_method(..., cache=False)`.
+
+        Args:
+            cache (PyLapiCache): The cache backend. Default to a new `PyLapiMemoryCache`.
+            ttl (float): Seconds a response is served without revalidation. Default to None (always revalidate).
+            enabled (bool): False to stop caching.
+        """
+        api_cls = cls._api_class()
+        api_cls._pylapi_cache = (cache if cache != None else PyLapiMemoryCache()) if enabled else None
+        api_cls._pylapi_cache_ttl = ttl
+
+
+    @classmethod
+    def response_cache(cls) -> PyLapiCache:
+        """Get the response cache of the API class, or None if responses are not cached."""
+        return cls._api_class()._pylapi_cache
 
 
-class PyLapiError(Exception):
-    def __init__(self, api_response: dict):
-        self.api_response = api_response
-        self.message = "API response: " + str(self.api_response)
-        super().__init__(self.message)
+    @classmethod
+    def configure_coalescing(cls, enabled: bool = True) -> None:
+        """Coalesce identical concurrent GET requests of the API class.
 
+        Identical GETs (same URL, query and credential) made while one is
+        in flight share its response instead of sending another request.
+        Each call still parses the response into its own result.
 
-class PyLapi(ABC):
-    # PyLapi class variables with prefix: _pylapi_
+        Args:
+            enabled (bool): False to stop coalescing.
+        """
+        api_cls = cls._api_class()
+        api_cls._pylapi_single_flight = PyLapiSingleFlight() if enabled else None
 
-    # User configurables
-    _pylapi_auth = ""
-    _pylapi_url = ""
 
-    # API Requests
-    _pylapi_auth_header_name = ""
-    _pylapi_auth_type = ""
-    _pylapi_base_headers = {}
+    @classmethod
+    def configure_json(cls, codec: Union[str, PyLapiJSONCodec] = None) -> None:
+        """Set the JSON codec of the API class, or of all API classes if called on PyLapi.
 
-    # API Classes and Routes
-    _pylapi_resource_classes = {}
-    _pylapi_resource_base_paths = {}
+        The codec parses responses (straight from bytes) and serialises request bodies.
+        orjson is opt-in, as it changes the text of `str()` of resources: non-ASCII
+        characters are not escaped, and compact output has no spaces.
 
-    # Callbacks
-    _pylapi_callbacks = {}
+        Args:
+            codec (Union[str, PyLapiJSONCodec]): A codec, or its name: "json", "orjson",
+                or "auto" for orjson if installed (defaults to config.default_json_codec).
+        """
+        if type(codec) != str and codec != None and not isinstance(codec, PyLapiJSONCodec):
+            raise ValueError(f"Not a PyLapiJSONCodec: {codec!r}")
+        api_cls = cls._api_class()
+        api_cls._pylapi_json_codec = PyLapiJSONCodec.named(codec or config.default_json_codec) \
+            if type(codec) == str or codec == None else codec
 
-    # Log
-    _pylapi_log_level = config.log_level
-    _pylapi_deep_log_level = config.deep_log_level
 
-    def __init__(self, resource_data: dict = None, allow_api_raise=False) -> None:
-        super().__init__()
-        logger.debug(f"PyLapi.__init__(")
-        logger.debug(f"    resource_data={resource_data},")
-        logger.debug(f")")
+    @classmethod
+    def json_codec(cls) -> PyLapiJSONCodec:
+        """Get the JSON codec of the API class."""
+        return cls._api_class()._pylapi_json_codec
 
-        # Error handling
-        self._allow_api_raise = allow_api_raise
 
-        # Object attributes
-        self._resource_data = resource_data if resource_data else {}
+    @classmethod
+    def metrics(cls) -> PyLapiMetrics:
+        """Get the metrics of the API class, e.g., `MyAPI.metrics()["requests"]`."""
+        api_cls = cls._api_class()
+        metrics = api_cls.__dict__.get("_pylapi_metrics")
+        if metrics == None:
+            with _pylapi_session_lock:
+                metrics = api_cls.__dict__.get("_pylapi_metrics")
+                if metrics == None:
+                    metrics = api_cls._pylapi_metrics = PyLapiMetrics()
+        return metrics
 
-        self._request = None
-        self._request_http_method = ""
-        self._response = None
-        self._response_data = {}
 
+    @classmethod
+    def batch(cls, path: str = None, max_actions: int = None, interval: float = None) -> PyLapiBatch:
+        """A context in which resource method calls of the API class are batched.
 
-    ############################################################
-    #
-    # Protected methods - for subclasses and internal functions only
-    #
+        Example:
+            with aAPI.batch() as batch:
+                futures = [aAPI.resource("task", gid=gid).update(data={"completed": True}) for gid in gids]
+            tasks = [_.result() for _ in futures]
 
-    def _slash(self, string: str = "") -> str:
-        return "/" + string if string else ""
+        Args:
+            path (str): The path of the batch endpoint. Default to "/batch".
+            max_actions (int): Maximum number of actions per batch request. Default to 10.
+            interval (float): Seconds after which queued calls are sent, or None to wait until full or exit.
 
+        Returns: The `PyLapiBatch` context.
+        """
+        if cls.is_async():
+            raise Exception(f"batch() is not available in async mode")
+        return PyLapiBatch(cls._api_class(), path=path, max_actions=max_actions, interval=interval)
 
-    def _rewrite_data(self, rewrite: Union[str, dict], data: dict=None) -> dict:
-        # `rewrite` is the "template" of what to return
-        # `data` is where path attributes "$" is sourced from
-        # `data` defaults to self._resource_data
-        _data = data if data else self._resource_data
-        if type(rewrite) == str:
-            # A path to data, e.g., $.data.owner.login
-            return MagicO(_data)[rewrite]
-
-        rewrite_str = json.dumps(rewrite)
-        rewrite_var_names = re.findall(r'"(\$[^"]*)"', rewrite_str)
-        logger.debug(f"rewrite_var_names={rewrite_var_names}")
-        for rewrite_var_name in rewrite_var_names:
-            logger.debug(f"rewrite_var_name={rewrite_var_name}")
-            rewrite_var_value = MagicO(_data)[rewrite_var_name]
-            if type(rewrite_var_value) == str:
-                rewrite_var_value = f'"{rewrite_var_value}"'
-            elif type(rewrite_var_value) in (dict, list):
-                rewrite_var_value = json.dumps(rewrite_var_value)
-            else:
-                rewrite_var_value = str(rewrite_var_value)
-            rewrite_str = rewrite_str.replace(f'"{rewrite_var_name}"', rewrite_var_value)
-        return json.loads(rewrite_str)
 
+    @staticmethod
+    def deadline(seconds: float) -> PyLapiDeadline:
+        """A context in which all calls, with their retries, pages and callbacks, must finish within `seconds`.
 
-    def _obtain_request_args(
-            self,
-            method_path: str = "",
-            data: dict = None,
-            headers: dict = None,
-            query: dict = None,
-        ) -> dict:
+        Example:
+            with aAPI.deadline(5):
+                tasks = list(aAPI.resource("task").iterate())
 
-        # _obtain_request_args(): GET resource route (with no query params)
-        # _obtain_request_args(method_path): GET resource_base_path/method_path
-        # _obtain_request_args(method_path,query=...): GET resource_base_path/method_path with query
-        # _obtain_request_args(method_path,data=...,[query=...]): POST with data, with or without query
-        # _obtain_request_args(method_path,data={},[query=...]): POST with data, with or without query
+        A call past the deadline raises `PyLapiTimeoutError`, which is also a `TimeoutError`.
 
-        # GET/POST above is indicative. The caller will determine if they get or post the request.
+        Args:
+            seconds (float): Seconds from now.
 
-        # logger.debug(f"self._pylapi_url={self._pylapi_url}")
-        # logger.debug(f"self._pylapi_resource_base_paths={self._pylapi_resource_base_paths}")
-        # logger.debug(f"self._resource_name={self._resource_name}")
-        # logger.debug(f"self._pylapi_base_headers={self.wash_secrets(self._pylapi_base_headers)}")
-        logger.debug(f"_obtain_request_args: method_path={method_path}")
-        api_url = f"{self._pylapi_url}{self._slash(self._pylapi_resource_base_paths[self._resource_name])}{self._slash(method_path)}"
-        request = {
-            "url": api_url,
-            "headers": self._pylapi_base_headers,
-        }
-        # Append the auth header
-        request["headers"][config.default_api_auth_header_name] = \
-            (self._pylapi_auth_type + " " if self._pylapi_auth_type else "") + \
-            self._pylapi_auth
+        Returns: The `PyLapiDeadline` context (sync and async).
+        """
+        return PyLapiDeadline(seconds)
 
-        # Query params
-        if query:
-            request["params"] = query
 
-        # Json payload data
-        logger.debug(f"_obtain_request_args: data={data}")
-        _data = data
-        if _data != None:
-            if type(_data) == MagicO:
-                _data = _data.to_data()
-            # Substitute any "$" attributes found with self._resource_data ones
-            _data = self._rewrite_data(_data)
+    @classmethod
+    def bulk(cls, items: Iterable, concurrency: int = None, ordered: bool = True, processes: int = None) -> Iterator:
+        """Run resource method calls with bounded concurrency.
 
-            request["headers"]["content-type"] = "application/json"
-            request["json"] = _data
-            logger.debug(f"_obtain_request_args: request['json']={request['json']}")
+        Items are taken from `items` only as calls finish, so a long or endless
+        iterator is never read ahead of the calls, and only the results in
+        flight are held in memory.
 
-        if headers != None:
-            request["headers"].update(headers)
+        Example:
+            items = ((aAPI.resource("task"), "update", (), {"gid": gid, "data": {"completed": True}}) for gid in gids)
+            for outcome in aAPI.bulk(items, concurrency=8):
+                if not outcome.ok:
+                    print(outcome.item, outcome.error)
 
-        logger.debug(f"_obtain_request_args: request={self.wash_secrets(request)}")
-        return request
+        Args:
+            items (Iterable): Work items (resource, method, args[, kwargs]), where method is a resource method or its name.
+            concurrency (int): Maximum number of calls in flight (per process). Default to 10.
+            ordered (bool): Yield the results in input order; False to yield them as they complete.
+            processes (int): Shard the items across this many worker processes, e.g., `os.cpu_count()`,
+                when processing the responses takes more CPU than one process has. Default to None (threads only).
+                The rate limit (see `configure_rate_limit()`) is divided across the processes:
+                each paces 1/N of the rate, the burst and the quota the API reports.
+
+        Yields: A `PyLapiBulkResult` for each item, with its result or its `PyLapiError`.
+        """
+        if cls.is_async():
+            raise Exception(f"bulk() is not available in async mode, use abulk()")
+        concurrency = concurrency if concurrency != None else config.default_bulk_concurrency
+        if processes != None:
+            return cls._process_bulk(items, concurrency, ordered, processes)
+        return cls._thread_bulk(items, concurrency, ordered)
 
 
-    # Argument names `data` and `headers` are directly referenced in resource_method(). Do not rename them.
-    # Set these self variables
-    # self._request_http_method
-    # self._request
-    # Initialise these self variables
-    # self._response = None
-    # self._response_data = {}
-    def _obtain_request_function(
-            self,
-            method_path: str,
-            http_method: Union[HTTPMethod, str] = None,
-            data: dict = None,
-            headers: dict = None,
-            **query,
-        ) -> function:
+    @classmethod
+    def _thread_bulk(cls, items: Iterable, concurrency: int, ordered: bool) -> Iterator:
+        items = enumerate(items)
+        pending = deque() if ordered else set()
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="pylapi-bulk")
+        try:
+            while True:
+                # Only as many items as there are free workers
+                for index, item in itertools.islice(items, concurrency - len(pending)):
+                    # Calls run in the caller's context, e.g., its deadline
+                    future = executor.submit(contextvars.copy_context().run, cls._bulk_call, index, item)
+                    pending.append(future) if ordered else pending.add(future)
+                if not pending:
+                    return
+                if ordered:
+                    yield pending.popleft().result()
+                else:
+                    done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+        finally:
+            # Calls in flight when stopped early are left to finish
+            executor.shutdown(wait=True)
 
-        logger.debug(f"_obtain_request_function(")
-        logger.debug(f"    method_path={method_path},")
-        logger.debug(f"    http_method={http_method},")
-        logger.debug(f"    data={data},")
-        logger.debug(f"    headers={self.wash_secrets(headers)},")
-        logger.debug(f"    query={query},")
-        logger.debug(f")")
 
-        request_index = len(requests_http)  # Would raise an IndexError unless set
-        _data = data
-        _http_method = http_method
-        if not _http_method:
-            _http_method = HTTPMethod.GET if _data == None else HTTPMethod.POST
-            request_index = int(_http_method)
-            logger.debug(f"HTTPMethod auto assigned: {request_index}")
-        elif type(_http_method) == str:
-            _http_method = _http_method.upper()
+    @classmethod
+    async def abulk(cls, items: Union[Iterable, AsyncIterator], concurrency: int = None, ordered: bool = True) -> AsyncIterator:
+        """The async mode version of `bulk()`, for `async for` loops.
+
+        `items` can also be an async iterator. Calls in flight when the loop stops early are cancelled.
+        """
+        concurrency = concurrency if concurrency != None else config.default_bulk_concurrency
+        is_async_items = hasattr(items, "__aiter__")
+        items = items.__aiter__() if is_async_items else iter(items)
+        pending = deque() if ordered else set()
+        index, exhausted = 0, False
+        try:
+            while True:
+                # Only as many items as there are free slots
+                while not exhausted and len(pending) < concurrency:
+                    try:
+                        item = await items.__anext__() if is_async_items else next(items)
+                    except (StopIteration, StopAsyncIteration):
+                        exhausted = True
+                        break
+                    task = asyncio.ensure_future(cls._abulk_call(index, item))
+                    pending.append(task) if ordered else pending.add(task)
+                    index += 1
+                if not pending:
+                    return
+                if ordered:
+                    yield await pending.popleft()
+                else:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+    @classmethod
+    def _process_bulk(cls, items: Iterable, concurrency: int, ordered: bool, processes: int) -> Iterator:
+        # Items and results are pickled here and in the workers,
+        # so that pickling errors are per item instead of lost in a queue thread
+        api_cls = cls._api_class()
+        # Each worker paces its share of the quota, so that together they keep to the rate limit
+        limiter = api_cls.rate_limiter()
+        limiter = limiter.divided(processes) if limiter != None else None
+        context = multiprocessing.get_context()
+        tasks, results = context.Queue(), context.Queue()
+        workers = [
+            context.Process(
+                target=_pylapi_bulk_worker,
+                args=(api_cls, api_cls._pylapi_auth, limiter, tasks, results, concurrency),
+                daemon=True,
+            )
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        # Enough items to keep all workers busy, and no more
+        max_pending = processes * concurrency * 2
+        items = enumerate(items)
+        failed = deque()  # Items that could not be pickled
+        held = {}  # Results held back for input order
+        pending, next_index, exhausted = 0, 0, False
+        try:
+            while True:
+                while not exhausted and pending < max_pending:
+                    try:
+                        index, item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        for _ in workers:
+                            tasks.put(None)
+                        break
+                    pending += 1
+                    try:
+                        tasks.put((index, pickle.dumps(item)))
+                    except Exception as e:
+                        failed.append(PyLapiBulkResult(index, item, error=cls._bulk_error(e)))
+                if not pending:
+                    return
+                outcome = failed.popleft() if failed else cls._bulk_receive(results, workers)
+                pending -= 1
+                if not ordered:
+                    yield outcome
+                    continue
+                held[outcome.index] = outcome
+                while next_index in held:
+                    yield held.pop(next_index)
+                    next_index += 1
+        finally:
+            for worker in workers:
+                if pending:
+                    # Stopped early
+                    worker.terminate()
+                worker.join()
+            for _queue in (tasks, results):
+                _queue.close()
+                _queue.cancel_join_thread()
+
+
+    @staticmethod
+    def _bulk_receive(results: multiprocessing.Queue, workers: list) -> PyLapiBulkResult:
+        while True:
             try:
-                request_index = int(eval(f"HTTPMethod.{_http_method}"))
-            except:
-                raise Exception(f"{_http_method} is not a valid HTTPMethod")
-            logger.debug(f"HTTPMethod derived from string \"{http_method}\": {request_index}")
-        else:
-            request_index = int(_http_method)
-            logger.debug(f"HTTPMethod native: {request_index}")
+                return pickle.loads(results.get(timeout=1))
+            except queue.Empty:
+                for worker in workers:
+                    if worker.exitcode not in (None, 0):
+                        raise PyLapiError({"error": f"Bulk worker process {worker.pid} exited with code {worker.exitcode}"})
 
+
+    @staticmethod
+    def _bulk_call(index: int, item: tuple) -> PyLapiBulkResult:
         try:
-            request_func = requests_http[request_index]
-        except:
-            raise Exception(f"HTTPMethod {http_method} cannot be determined")
+            resource, method, args, kwargs = PyLapi._bulk_item(item)
+            return PyLapi._bulk_result(index, item, resource, method(*args, **kwargs))
+        except Exception as e:
+            return PyLapiBulkResult(index, item, error=PyLapi._bulk_error(e))
 
-        self._request_http_method = requests_http_name[request_index]
-        logger.debug(f"Request Method to Use: {self._request_http_method}")
 
-        self._request = self._obtain_request_args(method_path, data=_data, headers=headers, query=query)
+    @staticmethod
+    async def _abulk_call(index: int, item: tuple) -> PyLapiBulkResult:
+        try:
+            resource, method, args, kwargs = PyLapi._bulk_item(item)
+            return PyLapi._bulk_result(index, item, resource, await method(*args, **kwargs))
+        except Exception as e:
+            return PyLapiBulkResult(index, item, error=PyLapi._bulk_error(e))
 
-        # Now that _request_http_method and _request are set,
-        # need to nullify _response and _response_data
-        self._response = None
-        self._response_data = {}
 
-        return request_func
+    @staticmethod
+    def _bulk_item(item: tuple) -> tuple:
+        # (resource, method, args[, kwargs]) -> (resource, bound method, args, kwargs)
+        resource, method, args = item[:3]
+        kwargs = item[3] if len(item) > 3 and item[3] != None else {}
+        _method = getattr(resource, method) if type(method) == str else method
+        if not callable(_method):
+            raise ValueError(f"{method} is not a method of {type(resource).__name__}")
+        return resource, _method, args if args != None else (), kwargs
 
 
-    ############################################################
-    #
-    # Class methods
-    #
+    @staticmethod
+    def _bulk_result(index: int, item: tuple, resource: PyLapi, result: Any) -> PyLapiBulkResult:
+        # Read right after the call returns, before this thread or task makes another call
+        call = resource.call
+        if call.response != None and not call.response.ok:
+            return PyLapiBulkResult(index, item, error=PyLapiError(call.response_data))
+        return PyLapiBulkResult(index, item, result=result)
 
-    # @classmethod
-    # def auth(
-    #     cls,
-    #     auth: str = "",
-    #     url: str = "",
-    # ) -> None:
-    #     # logger.debug(f"auth")
-    #     if auth:
-    #         cls._pylapi_auth = auth
-    #     if url:
-    #         cls._pylapi_url = url
 
-    @classmethod
-    def auth(cls, auth: str) -> None:
-        # logger.debug(f"auth")
-        if auth:
-            cls._pylapi_auth = auth
+    @staticmethod
+    def _bulk_error(error: Exception) -> PyLapiError:
+        if isinstance(error, PyLapiError):
+            return error
+        _error = PyLapiError({"error": f"{type(error).__name__}: {error}"})
+        _error.__cause__ = error
+        return _error
 
 
     @classmethod
@@ -288,14 +4226,16 @@ class PyLapi(ABC):
         if _val != None:
             if cls._pylapi_auth:
                 # No effect unless val is str, dict or list
-                if type(val) in (dict, list):
-                    _val = json.dumps(_val)
-                # _val should be a str
-                if type(_val) == str:  # Instead of val, check _val in case json failed
-                    _val = _val.replace(cls._pylapi_auth, "<api_auth>")
-                if type(val) in (dict, list):
-                    # Convert back to original type
-                    _val = json.loads(_val)
+                # Walked rather than round-tripped through JSON
+                def wash(value):
+                    if type(value) == str:
+                        return value.replace(cls._pylapi_auth, "<api_auth>")
+                    if type(value) == dict:
+                        return {wash(_key): wash(_value) for _key, _value in value.items()}
+                    if type(value) in (list, tuple):
+                        return [wash(_) for _ in value]
+                    return value
+                _val = wash(_val)
             else:
                 _val = "<not_authed>"
                 if type(val) == dict:
@@ -331,6 +4271,145 @@ class PyLapi(ABC):
         return cls._resource_class(resource_name)(resource_data=_data)
 
 
+    ############################################################
+    #
+    # Pagination
+    #
+
+    def _paginated_method(self, method: Union[str, Callable]) -> tuple:
+        _method = getattr(self, method) if type(method) == str else method
+        plan = getattr(_method, "_pylapi_plan", None)
+        if plan == None:
+            raise ValueError(f"{method} is not a resource method")
+        paginator = plan.paginator if plan.paginator != None else self.paginator
+        return _method, paginator
+
+
+    def _page_items(self, paginator: PyLapiPaginator, page_data: Any) -> tuple:
+        # Take the call context now, as the caller may use this object between pages
+        call = self.call
+        if call.response != None and not self.response_ok():
+            raise PyLapiError(call.response_data)
+        items = paginator.items(page_data, call)
+        return items, paginator.next_query(call, items)
+
+
+    def _pages(self, _method: Callable, paginator: PyLapiPaginator, args: tuple, kwargs: dict) -> Iterator:
+        query = {**paginator.first_query(), **kwargs}
+        while query != None:
+            items, next_query = self._page_items(paginator, _method(*args, **query))
+            yield items
+            query = {**query, **next_query} if next_query else None
+
+
+    async def _apages(self, _method: Callable, paginator: PyLapiPaginator, args: tuple, kwargs: dict) -> AsyncIterator:
+        query = {**paginator.first_query(), **kwargs}
+        while query != None:
+            items, next_query = self._page_items(paginator, await _method(*args, **query))
+            yield items
+            query = {**query, **next_query} if next_query else None
+
+
+    @staticmethod
+    def _prefetched(pages: Iterator, prefetch: int) -> Iterator:
+        # Fetch up to `prefetch` pages ahead in a background thread
+        # while the caller consumes the current page
+        page_queue = queue.Queue(maxsize=prefetch)
+        cancelled = threading.Event()
+        last_page = object()
+
+        def fetch():
+            try:
+                for page in pages:
+                    page_queue.put((page, None))
+                    if cancelled.is_set():
+                        return
+                page_queue.put((last_page, None))
+            except Exception as e:
+                page_queue.put((None, e))
+            finally:
+                pages.close()
+
+        # Fetch in the caller's context so that its deadline applies to the pages fetched ahead
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(fetch,), daemon=True).start()
+        try:
+            while True:
+                page, error = page_queue.get()
+                if error != None:
+                    raise error
+                if page is last_page:
+                    return
+                yield page
+        finally:
+            # The caller stops early (or fails): stop fetching, and unblock the fetcher
+            cancelled.set()
+            while not page_queue.empty():
+                page_queue.get_nowait()
+
+
+    @staticmethod
+    async def _aprefetched(pages: AsyncIterator, prefetch: int) -> AsyncIterator:
+        # The async mode version of `_prefetched()` with a fetching task
+        page_queue = asyncio.Queue(maxsize=prefetch)
+        last_page = object()
+
+        async def fetch():
+            try:
+                async for page in pages:
+                    await page_queue.put((page, None))
+                await page_queue.put((last_page, None))
+            except Exception as e:
+                await page_queue.put((None, e))
+
+        fetcher = asyncio.ensure_future(fetch())
+        try:
+            while True:
+                page, error = await page_queue.get()
+                if error != None:
+                    raise error
+                if page is last_page:
+                    return
+                yield page
+        finally:
+            fetcher.cancel()
+
+
+    def iterate(self, method: Union[str, Callable], *args, prefetch: int = 0, **kwargs) -> Iterator:
+        """Call a resource method page by page, and yield the items one at a time.
+
+        Pages are fetched lazily as the items are consumed, following the
+        paginator of the method, or of the API class.
+
+        Args:
+            method (Union[str, Callable]): The resource method, or its name.
+            prefetch (int): The number of pages to fetch ahead in the background
+                while the current page is consumed. Default to 0 (no read-ahead).
+            args, kwargs: The arguments of the resource method.
+
+        Yields: The items of all pages.
+        """
+        if self.is_async():
+            raise Exception(f"Use aiterate() in async mode")
+        _method, paginator = self._paginated_method(method)
+        pages = self._pages(_method, paginator, args, kwargs)
+        if prefetch > 0:
+            pages = self._prefetched(pages, prefetch)
+        for items in pages:
+            yield from items
+
+
+    async def aiterate(self, method: Union[str, Callable], *args, prefetch: int = 0, **kwargs) -> AsyncIterator:
+        """The async mode version of `iterate()`, for `async for` loops."""
+        _method, paginator = self._paginated_method(method)
+        pages = self._apages(_method, paginator, args, kwargs)
+        if prefetch > 0:
+            pages = self._aprefetched(pages, prefetch)
+        async for items in pages:
+            for item in items:
+                yield item
+
+
     ############################################################
     #
     # Path variable indexing
@@ -338,7 +4417,10 @@ class PyLapi(ABC):
 
     def __getitem__(self, path) -> Any:
         # logger.debug(f"__getitem__: {path}")
-        item = MagicO(self._resource_data)[path]
+        if type(path) == str:
+            item = PyLapiRewrite._compile_path(path)(self._resource_data)
+        else:
+            item = MagicO(self._resource_data)[path]
         if type(item) == dict:
             item = deepcopy(item)
         return item
@@ -370,7 +4452,7 @@ class PyLapi(ABC):
     def __getattr__(self, attr: str) -> Any:
         # logger.debug(f"__getattr__: {attr}")
         # logger.debug(f"self._resource_attrs: {self._resource_attrs}")
-        if "_resource_attrs" not in dir(self):
+        if not hasattr(type(self), "_resource_attrs"):
             raise Exception(f"Only subclasses of {self.__class__.__name__} decorated by @{self.__class__.__name__}.resource_class can be instantiated")
         if attr in self._resource_attrs:
             value = self[self._resource_attrs[attr]]
@@ -386,7 +4468,7 @@ class PyLapi(ABC):
 
     def __setattr__(self, attr: str, value: Any) -> None:
         # logger.debug(f"__setattr__: {attr} to <value>")
-        if "_resource_attrs" not in dir(self):
+        if not hasattr(type(self), "_resource_attrs"):
             raise Exception(f"Only subclasses of {self.__class__.__name__} decorated by @{self.__class__.__name__}.resource_class can be instantiated")
         if attr in self._resource_attrs:
             self[self._resource_attrs[attr]] = value
@@ -399,7 +4481,7 @@ class PyLapi(ABC):
 
     def __delattr__(self, attr: str) -> None:
         # logger.debug(f"__delattr__: {attr}")
-        if "_resource_attrs" not in dir(self):
+        if not hasattr(type(self), "_resource_attrs"):
             raise Exception(f"Only subclasses of {self.__class__.__name__} decorated by @{self.__class__.__name__}.resource_class can be instantiated")
         if attr in self._resource_attrs:
             del self[self._resource_attrs[attr]]
@@ -414,7 +4496,7 @@ class PyLapi(ABC):
     #
 
     def __str__(self) -> str:
-        return json.dumps(self._resource_data, indent=config.pylapi_json_indent)
+        return self.json_codec().dumps(self._resource_data, indent=config.pylapi_json_indent)
 
 
     def __repr__(self) -> str:
@@ -425,6 +4507,12 @@ class PyLapi(ABC):
         return self._resource_data != {}
 
 
+    def __reduce__(self) -> tuple:
+        # Pickled as its resource name and data, e.g., for worker processes,
+        # and rebuilt with `resource()` of its API class (without the call context)
+        return (_pylapi_resource, (self._api_class(), self._resource_name, self._resource_data, self._allow_api_raise))
+
+
     def __len__(self) -> int:
         return len(self._resource_data)
 
@@ -461,6 +4549,57 @@ class PyLapi(ABC):
             raise ValueError(f"Invalid resource_attrs: {_resource_attrs}")
 
 
+    ############################################################
+    #
+    # Call context
+    #
+
+    @property
+    def call(self) -> PyLapiCall:
+        """The context of the current call, or the last call, made in this thread."""
+        call = getattr(self._local, "call", None)
+        if call == None:
+            call = self._local.call = PyLapiCall(response_data={})
+        return call
+
+
+    # For internal use and callbacks, backed by the call context
+    @property
+    def _request_http_method(self) -> str:
+        return self.call.http_method
+
+    @_request_http_method.setter
+    def _request_http_method(self, http_method: str):
+        self._local.call = self.call._replace(http_method=http_method)
+
+
+    @property
+    def _request(self) -> dict:
+        return self.call.request
+
+    @_request.setter
+    def _request(self, request: dict):
+        self._local.call = self.call._replace(request=request)
+
+
+    @property
+    def _response(self) -> requests.Response:
+        return self.call.response
+
+    @_response.setter
+    def _response(self, response: requests.Response):
+        self._local.call = self.call._replace(response=response)
+
+
+    @property
+    def _response_data(self) -> Any:
+        return self.call.response_data
+
+    @_response_data.setter
+    def _response_data(self, response_data: Any):
+        self._local.call = self.call._replace(response_data=response_data)
+
+
     ############################################################
     #
     # Object property getters (with no setters)
@@ -519,7 +4658,7 @@ class PyLapi(ABC):
         # logger.debug(f"get request: {type(self._request)})")
         resp = None
         try:
-            resp = json.loads(self._response.text)
+            resp = self.json_codec().loads(self._response.content)
         except:
             resp = self._response.text
         return resp
@@ -574,6 +4713,54 @@ class PyLapi(ABC):
             raise ValueError(f"Invalid api_url: {_api_url}")
 
 
+    @property
+    def paginator(self) -> PyLapiPaginator:
+        return self._pylapi_paginator
+
+    @paginator.setter
+    def paginator(self, _paginator: PyLapiPaginator):
+        if isinstance(_paginator, PyLapiPaginator):
+            self._pylapi_paginator = _paginator
+        else:
+            raise ValueError(f"Invalid paginator: {_paginator}")
+
+
+    @property
+    def retry(self) -> PyLapiRetry:
+        return self._pylapi_retry
+
+    @retry.setter
+    def retry(self, _retry: PyLapiRetry):
+        if _retry == None or isinstance(_retry, PyLapiRetry):
+            self._pylapi_retry = _retry
+        else:
+            raise ValueError(f"Invalid retry: {_retry}")
+
+
+    @property
+    def hedge(self) -> PyLapiHedge:
+        return self._pylapi_hedge
+
+    @hedge.setter
+    def hedge(self, _hedge: PyLapiHedge):
+        if _hedge == None or isinstance(_hedge, PyLapiHedge):
+            self._pylapi_hedge = _hedge
+        else:
+            raise ValueError(f"Invalid hedge: {_hedge}")
+
+
+    @property
+    def timeout(self) -> PyLapiTimeout:
+        return self._pylapi_timeout
+
+    @timeout.setter
+    def timeout(self, _timeout: Union[float, tuple, PyLapiTimeout]):
+        if _timeout == None:
+            self._pylapi_timeout = PyLapiTimeout(None, None, None)
+        else:
+            self._pylapi_timeout = PyLapiTimeout.of(_timeout)
+
+
     # @classproperty
     @property
     def api_base_headers(self) -> dict:
@@ -621,7 +4808,7 @@ class PyLapi(ABC):
 
     # No content check. Child classes can provide their own check
     def response_ok(self) -> bool:
-        logger.debug(f"Response status: {self._response.status_code}")
+        logger.debug("Response status: %s", self._response.status_code)
         return self._response.ok
         # _ok = False
         # if self._response:
@@ -647,7 +4834,7 @@ class PyLapi(ABC):
 
 
     @classmethod
-    def getLogger(cls) -> logging.RootLogger:
+    def getLogger(cls) -> logging.Logger:
         return logger
 
 
@@ -668,11 +4855,13 @@ class PyLapi(ABC):
         return cls._pylapi_deep_log_level
 
 
+    # The deep log level applies to the HTTP libraries used by PyLapi
     @classmethod
     def setDeepLogLevel(cls, deep_log_level=None):
         if deep_log_level != None:
             cls._pylapi_deep_log_level = deep_log_level
-        logger.setLevel(cls._pylapi_deep_log_level)
+        for deep_logger in deep_loggers:
+            deep_logger.setLevel(cls._pylapi_deep_log_level)
 
 
     ############################################################
@@ -682,21 +4871,16 @@ class PyLapi(ABC):
 
     @classmethod
     def resource_class(cls, resource_name, resource_base_path="", **kwargs):
-        logger.debug(f"resource_class(")
-        logger.debug(f"    cls={cls},")
-        logger.debug(f"    resource_name={resource_name},")
-        logger.debug(f"    resource_base_path={resource_base_path},")
-        logger.debug(f"    kwargs={kwargs}")
-        logger.debug(f")")
+        logger.debug("resource_class(cls=%s, resource_name=%s, resource_base_path=%s, kwargs=%s)", cls, resource_name, resource_base_path, kwargs)
         # @functools.wraps(cls)
         def class_wrapper(resource_cls):
-            logger.debug(f"class_wrapper({resource_cls})")
+            logger.debug("class_wrapper(%s)", resource_cls)
 
             # Register with parent
             cls._pylapi_resource_classes[resource_name] = resource_cls
-            logger.debug(f"_pylapi_classes={cls._pylapi_resource_classes}")
+            logger.debug("_pylapi_classes=%s", cls._pylapi_resource_classes)
             cls._pylapi_resource_base_paths[resource_name] = resource_base_path
-            logger.debug(f"_pylapi_routes={cls._pylapi_resource_base_paths}")
+            logger.debug("_pylapi_routes=%s", cls._pylapi_resource_base_paths)
 
             # Defaults
             cls._pylapi_auth_header_name = config.default_api_auth_header_name
@@ -704,14 +4888,15 @@ class PyLapi(ABC):
             cls._pylapi_base_headers = config.default_api_base_headers
 
             # Register with itself
+            resource_cls._pylapi_api_class = cls
             resource_cls._resource_name = resource_name
-            logger.debug(f"resource_cls._resource_name={resource_cls._resource_name}")
+            logger.debug("resource_cls._resource_name=%s", resource_cls._resource_name)
             resource_cls._resource_attrs = kwargs
-            logger.debug(f"_resource_attrs={resource_cls._resource_attrs}")
+            logger.debug("_resource_attrs=%s", resource_cls._resource_attrs)
 
             @functools.wraps(resource_cls)
             def init_wrapper(*args, **kwargs):
-                logger.debug(f"init_wrapper({args}, {kwargs})")
+                logger.debug("init_wrapper(%s, %s)", args, kwargs)
                 resource_obj = resource_cls.__init__(*args, **kwargs)
                 return resource_obj
 
@@ -721,286 +4906,108 @@ class PyLapi(ABC):
 
 
     @classmethod
-    def resource_method(cls, method_path: str="", http_method: Any=None, give="", load=None, send=None):
-        logger.debug(f"resource_method(")
-        logger.debug(f"    cls={cls},")
-        logger.debug(f"    method_path={method_path},")
-        logger.debug(f"    http_method={http_method},")
-        logger.debug(f"    give={give},")
-        logger.debug(f"    load={load},")
-        logger.debug(f"    send={send},")
-        logger.debug(f")")
+    def resource_method(
+            cls,
+            method_path: str="",
+            http_method: Any=None,
+            give="",
+            load=None,
+            send=None,
+            paginator: PyLapiPaginator=None,
+            retry: PyLapiRetry=None,
+            cache: bool=None,
+            cache_ttl: float=None,
+            stream: bool=False,
+            timeout: Union[float, tuple, PyLapiTimeout]=None,
+            hedge: PyLapiHedge=None,
+        ):
+        logger.debug(
+            "resource_method(cls=%s, method_path=%s, http_method=%s, give=%s, load=%s, send=%s)",
+            cls, method_path, http_method, give, load, send,
+        )
         def method_deco(method):
+            # Everything about the method that does not change from call to call
+            plan = PyLapiMethodPlan.compile(method, method_path, http_method, give, load, send, paginator, retry, cache, cache_ttl, stream, timeout, hedge)
+
             @functools.wraps(method)
             def method_wrapper(self, *args, **kwargs):
-                logger.debug(f"method={method.__qualname__} {method}")
-                logger.debug(f"method_wrapper(")
-                logger.debug(f"    self=<self>,")
-                logger.debug(f"    args={args} {type(args)},")
-                logger.debug(f"    kwargs={kwargs} {type(kwargs)},")
-                logger.debug(f")")
-
-                # Method arg names - those passed into the method
-                method_inspected = inspect.getfullargspec(method)
-                logger.debug(f"method_inspected={method_inspected}")
-
-                ##########
-                #
-                # Determine arg_values:
-                # - Fill last set of arg_values with arg_defaults
-                # - Fill arg_values with arg_name:arg
-                # - Reorder arg_values in the same order as arg_names
-                #   - For missing args
-                #     - Use kwargs if found, then remove
-                #     - Use res_ids if found, but don't remove
-                #     - Use None (as a place holder)
-                # - Remove both implicitly and explicitly defined _res_attrs
-                # - More args than in arg_names
-                #   - For each additional arg, use res_ids in order
-                #     - If res_ids run out, the remaining args will be ignored
-                # - kwargs override and remove from kwargs if used (to avoid excessive query)
-
-                logger.debug(f"---------- {method.__qualname__}: arg_values processing")
-
-                # Internal variables
-                _kwargs = kwargs.copy()
-                logger.debug(f"_kwargs={_kwargs} (initially)")
-
-                _method_path = method_path
-                # API route variable names - those found in the api route
-                route_var_names = re.findall(r"{([a-zA-Z_-]([0-9a-zA-Z_-])*)}", _method_path)
-                route_var_names = [_[0] for _ in route_var_names]
-                logger.debug(f"route_var_names={route_var_names}")
-
-                _res_attrs = self._resource_attrs.copy()
-                logger.debug(f"_res_attrs={_res_attrs} (initially)")
-
-                if len(_res_attrs) == 0 and len(route_var_names) > 0:
-                    # Auto resource attributes
-                    _res_attrs = {_: "$." + _ for _ in route_var_names}
-                    logger.debug(f"_res_attrs={_res_attrs} (auto based on route_var_names={route_var_names})")
-
-                arg_values = {}
-                arg_names = method_inspected.args
-                del arg_names[0]  # Selfless
-                logger.debug(f"arg_names={arg_names}")
-                logger.debug(f"{len(arg_names)} positional args in def (arg_names)")
-
-                arg_defaults = method_inspected.defaults if method_inspected.defaults else {}
-                logger.debug(f"Last {len(arg_defaults)} has defaults: {arg_defaults}")
-
-                # Fill last set of arg_values with arg_defaults
-                arg_defaults_start = len(arg_names) - len(arg_defaults)
-                for ii in range(arg_defaults_start, len(arg_names)):
-                    logger.debug(f"arg_names[{ii}]={arg_names[ii]}; arg_defaults[{ii - arg_defaults_start}]={arg_defaults[ii - arg_defaults_start]}")
-                    arg_values[arg_names[ii]] = arg_defaults[ii - arg_defaults_start]
-                logger.debug(f"arg_values={arg_values} (with defaults from def)")
-
-                # Fill arg_values with arg_name:arg
-                logger.debug("--- Fill arg_values with arg_name:arg")
-                for ii in range(min(len(arg_names), len(args))):
-                    arg_values[arg_names[ii]] = args[ii]
-                logger.debug(f"arg_values={arg_values} (with args in call)")
-
-                # Reorder arg_values in the same order as arg_names
-                logger.debug("--- Reorder arg_values in the same order as arg_names")
-                # After that, len(arg_values) == len(arg_names)
-                _arg_values = {}
-                # Each iteration must create _arg_values[arg_name] somehow
-                # So len(arg_names) == len(_arg_values) after the loop
-                # This will handle more arg_names than args
-                for arg_name in arg_names:
-                    if arg_name in arg_values:
-                        # arg exists
-                        logger.debug(f"{arg_name} in arg_values")
-                        _arg_values[arg_name] = arg_values[arg_name]
-                    else:
-                        logger.debug(f"{arg_name} not in arg_values")
-                        # Missing args
-                        if arg_name in _kwargs:
-                            # Use kwarg, then remove
-                            logger.debug(f"  but in _kwargs[{arg_name}]={_kwargs[arg_name]}")
-                            _arg_values[arg_name] = _kwargs[arg_name]
-                            del _kwargs[arg_name]  # To remove from query
-                        elif arg_name in _res_attrs:
-                            # Use _res_attrs, but don't remove (leave later)
-                            logger.debug(f"  but in _res_attrs[{arg_name}]={_res_attrs[arg_name]}->{self[_res_attrs[arg_name]]}")
-                            _arg_values[arg_name] = self[_res_attrs[arg_name]]
-                        else:
-                            # Use None
-                            logger.debug(f"  and None found")
-                            _arg_values[arg_name] = None
-                logger.debug(f"_arg_values={_arg_values} (in the order in call)")
-                logger.debug(f"_kwargs={_kwargs} (after filling missing)")
-
-                # Remove both implicitly and explicitly defined _res_attrs
-                logger.debug("--- Remove both implicitly and explicitly defined _res_attrs")
-                for arg_name in _arg_values:
-                    if arg_name in _res_attrs:
-                        del _res_attrs[arg_name]
-                logger.debug(f"_res_attrs={_res_attrs} (after in-arg_values trimmed)")
-
-                # For excessive args, fill with remaining _res_attrs
-                _res_attrs_names = list(_res_attrs.keys())
-                if len(arg_names) < len(args):
-                    # Not to use arg_names except as a marker
-                    logger.debug(f"There are {len(args) - len(arg_names)} more positional arguments in call than in def")
-                    logger.debug(f"Going to assign to the {len(_res_attrs_names)} remain resource IDs: {_res_attrs_names}")
-                    for ii in range(len(arg_names), min(len(args), len(arg_names) + len(_res_attrs_names))):
-                        _res_attrs_name = _res_attrs_names[ii - len(arg_names)]  # The above range guarantee existance
-                        _arg_values[_res_attrs_name] = args[ii]
-                        logger.debug(f"_arg_values[{_res_attrs_name}] <- {args[ii]}")
-                        del _res_attrs[_res_attrs_name]
-                    logger.debug(f"arg_values={_arg_values} (extended with resource IDs)")
-                    logger.debug(f"_res_attrs={_res_attrs} (after excessive args trimmed)")
-
-                # _kwargs have final say - override _arg_values if still found, then remove
-                _kwargs_names = list(_kwargs.keys())
-                for _kwargs_name in _kwargs_names:
-                    if _kwargs_name in _arg_values:
-                        _arg_values[_kwargs_name] = _kwargs[_kwargs_name]
-                        del _kwargs[_kwargs_name]
-                logger.debug(f"_kwargs={_kwargs} (after in-arg_values trimmed)")
-
-                ##########
-                #
-                # Route variables
-                #
-                logger.debug(f"Finding route variables: {route_var_names}")
-                for route_var_name in route_var_names:
-                    route_value = None
-                    # Keyword args highest precedence
-                    # followed by positional args
-                    # Implicit ID attributes as last resort
-                    if route_var_name in _kwargs:
-                        # Explicitly specified in method kwargs (keyword)
-                        route_value = _kwargs[route_var_name]
-                        logger.debug(f"{route_var_name} <- _kwargs[{route_var_name}]={_kwargs[route_var_name]}")
-                        del _kwargs[route_var_name]
-                    elif route_var_name in _arg_values:
-                        # Explicitly specified in method args (positional)
-                        route_value = _arg_values[route_var_name]
-                        logger.debug(f"{route_var_name} <- _arg_values[{route_var_name}]={_arg_values[route_var_name]}")
-                    elif route_var_name in _res_attrs:
-                        # Implicitly specified in ID attributes
-                        # logger.debug(f"{route_var_name} is in _res_attrs: {_res_attrs}")
-                        route_value = self[_res_attrs[route_var_name]]
-                        logger.debug(f"{route_var_name} <- _res_attrs[{route_var_name}]={_res_attrs[route_var_name]}->{self[_res_attrs[route_var_name]]}")
-                        _arg_values[route_var_name] = route_value  # Add for callback
-
-                    # logger.debug(f"route_value={route_value}")
-                    if route_value != None:
-                        logger.debug(f"Replace route variable {route_var_name} with {route_value}")
-                        _method_path = _method_path.replace("{" + route_var_name + "}", route_value)
-
-                logger.debug(f"_kwargs={_kwargs} (after route_value trimmed)")
-
-                logger.debug(f"_method_path={_method_path}")
-
-                logger.debug(f"_arg_values.update(kwargs): _kwargs={_kwargs}")
-                _arg_values.update(_kwargs)
-
-                logger.debug(f"---------- {method.__qualname__}: arg_values={_arg_values}")
+                started = time.perf_counter()
+                self._local.call = PyLapiCall(
+                    method=method.__qualname__, response_data={}, started=started, deadline=self._call_deadline(plan, started),
+                )
+                logger.debug("method_wrapper: %s(<self>, %s, %s)", method.__qualname__, args, kwargs)
+
+                _method_path, _arg_values = plan.bind(self, args, kwargs)
+                logger.debug("---------- %s: _method_path=%s, arg_values=%s", method.__qualname__, _method_path, _arg_values)
 
                 # Now _kwargs contains only unassigned kwargs
                 request_func = self._obtain_request_function(_method_path, http_method=http_method, **_arg_values)
 
                 # To ensure `method()` is called only once upon its first use
-                # an entry in `cls._pylapi_callbacks` prevent `method()` is checked.
-                if method.__qualname__ not in cls._pylapi_callbacks:
-                    # Call the function to register the callbacks
-                    # To avoid argument errors, faithfully pass in
-                    # what the function can accept.
-                    if method_inspected.varargs:
-                        if method_inspected.varkw:
-                            method(self, *args, **kwargs)
-                        else:
-                            method(self, *args)
-                    elif method_inspected.varkw:
-                        method(self, **kwargs)
-                    else:
-                        def_args = {_: _arg_values[_] for _ in list(_arg_values.keys())[0:len(arg_names)]}
-                        method(self, *def_args)
-                if method.__qualname__ not in cls._pylapi_callbacks:
-                    # The method does not register any callbacks,
-                    # Assign a {} to stop further checking.
-                    cls._pylapi_callbacks[method.__qualname__] = {}
+                # an entry in `cls._pylapi_callbacks_registered` prevent `method()` is checked.
+                # Registering under the lock so that no thread sees half-registered callbacks.
+                if method.__qualname__ not in cls._pylapi_callbacks_registered:
+                    with _pylapi_callback_lock:
+                        if method.__qualname__ not in cls._pylapi_callbacks_registered:
+                            # Call the function to register the callbacks
+                            # To avoid argument errors, faithfully pass in
+                            # what the function can accept.
+                            if plan.varargs:
+                                if plan.varkw:
+                                    method(self, *args, **kwargs)
+                                else:
+                                    method(self, *args)
+                            elif plan.varkw:
+                                method(self, **kwargs)
+                            else:
+                                def_args = {_: _arg_values[_] for _ in list(_arg_values.keys())[0:len(plan.arg_names)]}
+                                method(self, *def_args)
+                            if method.__qualname__ not in cls._pylapi_callbacks:
+                                # The method does not register any callbacks,
+                                # Assign a {} to stop further checking.
+                                cls._pylapi_callbacks[method.__qualname__] = {}
+                            cls._pylapi_callbacks_registered.add(method.__qualname__)
 
                 # Rewrite the request data with "send" first before callback (so it has final say)
-                if send != None and "json" in self._request:
-                    logger.debug(f"Request json to be rewritten with {send}")
-                    logger.debug(f"Before: {self._request['json']}")
-                    self._request["json"] = self._rewrite_data(send, self._request["json"])
-                    logger.debug(f"After:  {self._request['json']}")
-
-                logger.debug(f"Check request callback {method.__qualname__}.request")
-                logger.debug(f"cls._pylapi_callbacks={cls._pylapi_callbacks}")
+                if plan.send != None and "json" in self._request:
+                    logger.debug("Request json to be rewritten with %s: %s", plan.send, self._request["json"])
+                    self._request["json"] = self._rewrite_data(plan.send, self._request["json"])
+                    logger.debug("Request json rewritten: %s", self._request["json"])
 
                 if "request" in cls._pylapi_callbacks[method.__qualname__]:
-                    logger.debug(f"Calling request")
+                    logger.debug("Calling request callback %s.request", method.__qualname__)
                     cls._pylapi_callbacks[method.__qualname__]["request"](self, **_arg_values)
 
-                self.setDeepLogLevel()
-                self._response = request_func(**self._request)
-                self.setLogLevel()
+                if plan.stream:
+                    self._request = {**self._request, "stream": True}
 
-                self._response_data = json.loads(self._response.text)
-                # Only select the give path and load path if no error
+                batch = _pylapi_batches.get().get(self._api_class())
+                if batch != None and "data" not in self._request and self.call.download == None:
+                    # Queued in a batch request: returns a future (uploads and downloads are sent on their own)
+                    return batch.add(self, method, plan, _arg_values)
 
-                if not self.response_ok():
-                    if self._allow_api_raise:
-                        raise PyLapiError(self._response_data)
-                    # else skip the load and give, then let response callback to handle the error
-                else:
-                    logger.debug(f"self._response_data={self._response_data}")
-                    # Process `load` first as `give` processing will alter `response_json`
-
-                    # Load `load` element into the object
-                    # load==None (default) means NOT to load anything
-                    # load=="" means to load the whole object
-                    # load=="..." means to load the path
-                    if load != None:
-                        logger.debug(f"load={load}")
-                        self[""] = self._rewrite_data(load, self._response_data)
-                        # if load == "":
-                        #     self[""] = self._response_data
-                        # elif load in self._response_data:
-                        #     self[""] = self._response_data[load]
-                        # else:
-                        #     raise Exception(f"Load path {load} cannot be found in the API response: {self._response_data}")
-
-                    # Function returns only the `give` element
-                    # give==None means to return nothing
-                    # give=="" means to return the whole object
-                    # load=="..." means to return the path
-                    if give == None:
-                        self._response_data = None
-                    else:
-                        logger.debug(f"give={give}")
-                        self._response_data = self._rewrite_data(give, self._response_data)
-                        # self._response_data = self._response_data[give] if give in self._response_data else {}
-                        # logger.debug(f"self._response_data={self._response_data}")
-
-                logger.debug(f"Check response callback {method.__qualname__}.response")
-                if "response" in cls._pylapi_callbacks[method.__qualname__]:
-                    logger.debug(f"Calling response")
-                    cls._pylapi_callbacks[method.__qualname__]["response"](self, **_arg_values)
-
-                if self._response_data != None:
-                    return self._response_data
-                else:
-                    return
+                if self.is_async():
+                    # Awaitable in async mode: the request is sent when awaited, but bound now,
+                    # as other calls on this object may be made before then
+                    return self._async_method_call(request_func, method, plan, self.call, _arg_values)
+
+                self._send_request(request_func, plan)
+
+                if plan.stream and self.call.download == None:
+                    return self._method_stream(method, plan, _arg_values)
+                return self._method_response(method, plan.give, plan.load, _arg_values)
 
+            method_wrapper._pylapi_plan = plan
             return method_wrapper
 
         # Allow @resource_method instead of requiring @resource_method("")
         if (type(method_path) == str):
             # _method_path is in the argument
-            logger.debug(f"method_path arg explicitly specified: \"{method_path}\"")
+            logger.debug("method_path arg explicitly specified: \"%s\"", method_path)
             return method_deco
         else:
             # method_path is not specified, and it's in fact the method now
-            logger.debug(f"method_path arg not specified, taken as {method_path}")
+            logger.debug("method_path arg not specified, taken as %s", method_path)
             _method = method_path
             method_path = ""  # Default to ""
             return method_deco(_method)
@@ -1008,11 +5015,11 @@ class PyLapi(ABC):
 
     @classmethod
     def callback(cls, cb_method):
-        logger.debug(f"callback: cb_method={cb_method.__qualname__} {cb_method})")
+        logger.debug("callback: cb_method=%s %s", cb_method.__qualname__, cb_method)
         cb_path = re.sub(r"\.<locals>.*", "", cb_method.__qualname__)
-        logger.debug(f"cb_path={cb_path}")
+        logger.debug("cb_path=%s", cb_path)
         cb_name = re.sub(r".*\.<locals>.", "", cb_method.__qualname__)
-        logger.debug(f"cb_name={cb_name}")
+        logger.debug("cb_name=%s", cb_name)
         if cb_path not in cls._pylapi_callbacks:
             cls._pylapi_callbacks[cb_path] = {}
         cls._pylapi_callbacks[cb_path][cb_name] = cb_method
@@ -1021,3 +5028,51 @@ class PyLapi(ABC):
         #     logger.debug(f"cb_wrapper: {cb_method.__qualname__}(<self>, {args}, {kwargs})")
         #     return cb_method(*args, **kwargs)
         return cb_method
+
+
+def _pylapi_resource(api_class: type, resource_name: str, resource_data: dict, allow_api_raise: bool) -> PyLapi:
+    # Rebuild a pickled resource, see `PyLapi.__reduce__()`
+    resource = api_class.resource(resource_name, resource_data)
+    resource.allow_api_raise = allow_api_raise
+    return resource
+
+
+def _pylapi_bulk_worker(
+        api_class: type,
+        auth: str,
+        limiter: PyLapiRateLimiter,
+        tasks: multiprocessing.Queue,
+        results: multiprocessing.Queue,
+        concurrency: int,
+    ) -> None:
+    # A worker process of `PyLapi.bulk(..., processes=N)`, with its own session and credential,
+    # and its share of the rate limit
+    api_class.auth(auth)
+    api_class.async_mode(False)
+    api_class._pylapi_rate_limiter = limiter
+    indexes = {}  # Index in the worker -> index in the input
+    counter = itertools.count()
+
+    def put(outcome: PyLapiBulkResult) -> None:
+        try:
+            payload = pickle.dumps(outcome)
+        except Exception as e:
+            payload = pickle.dumps(PyLapiBulkResult(outcome.index, None, error=PyLapi._bulk_error(e)))
+        results.put(payload)
+
+    def work_items():
+        while True:
+            task = tasks.get()
+            if task == None:
+                return
+            index, payload = task
+            try:
+                item = pickle.loads(payload)
+            except Exception as e:
+                put(PyLapiBulkResult(index, None, error=PyLapi._bulk_error(e)))
+                continue
+            indexes[next(counter)] = index
+            yield item
+
+    for outcome in api_class.bulk(work_items(), concurrency, ordered=False):
+        put(outcome._replace(index=indexes.pop(outcome.index)))
@@ -0,0 +1,125 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+import pytest
+
+from pylapi import PyLapi
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+    def respond(self, status: int = 200, body=None, headers: dict = None, content_type: str = "application/json") -> None:
+        """Send a response: a dict or list body is sent as JSON, bytes as is."""
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        body = body if body != None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+    def dispatch(self) -> None:
+        url = urlsplit(self.path)
+        self.query = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path, dict(self.headers)))
+        # The longest matching path prefix
+        for path in sorted(self.server.routes, key=len, reverse=True):
+            if url.path.startswith(path):
+                result = self.server.routes[path](self)
+                if result != None:
+                    self.respond(*result) if type(result) == tuple else self.respond(200, result)
+                return
+        self.respond(404, {"errors": [{"message": f"Not found: {url.path}"}]})
+
+    do_GET = do_HEAD = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = dispatch
+
+
+class ApiServer(ThreadingHTTPServer):
+    """A local API server whose routes are set by each test.
+
+    A route is a path prefix and a function taking the request handler, returning
+    a JSON body, a (status, body[, headers[, content_type]]) tuple, or None if it responded itself.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), ApiHandler)
+        self.url = f"http://127.0.0.1:{self.server_port}/api"
+        self.routes = {}
+        self.requests = []
+        self.lock = threading.Lock()
+
+
+    def route(self, path: str):
+        """Decorator setting the route of a path prefix, e.g., "/api/items/"."""
+        def decorator(func):
+            self.routes[path] = func
+            return func
+        return decorator
+
+
+    def reset(self) -> None:
+        self.routes = {"/api/items/": default_item}
+        self.requests = []
+
+
+def default_item(handler: ApiHandler):
+    gid = handler.path.split("?")[0].rsplit("/", 1)[-1]
+    if handler.command in ("PUT", "PATCH", "POST"):
+        return {"data": dict(json.loads(handler.body or b"{}").get("data") or {}, gid=gid)}
+    return {"data": {"gid": gid, "query": handler.query}}
+
+
+@pytest.fixture(scope="session")
+def http_server():
+    server = ApiServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def server(http_server):
+    http_server.reset()
+    return http_server
+
+
+@pytest.fixture
+def api(server):
+    """A new API class for each test, so that no settings are shared between tests."""
+    class tAPI(PyLapi):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            self.api_url = server.url
+
+    @tAPI.resource_class("item", "items")
+    class ItemResource(tAPI):
+        @tAPI.resource_method("{gid}", http_method="GET", give="$.data")
+        def get(self, gid): pass
+
+        @tAPI.resource_method("{gid}", http_method="PUT", send={"data": "$"}, give="$.data")
+        def update(self, gid): pass
+
+        @tAPI.resource_method("{gid}", http_method="DELETE", give="$.data")
+        def delete(self, gid): pass
+
+    tAPI.auth("test-token")
+    yield tAPI
+    tAPI.close()
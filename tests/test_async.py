@@ -0,0 +1,70 @@
+import asyncio
+import gc
+import warnings
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+
+def run(api, coroutine):
+    async def main():
+        try:
+            return await coroutine()
+        finally:
+            await api.aclose()
+    api.async_mode()
+    return asyncio.run(main())
+
+
+def test_awaitable_call(api):
+    async def call():
+        return await api.resource("item").get("1")
+    assert run(api, call)["gid"] == "1"
+
+
+def test_gather_on_one_resource_object(api):
+    async def gather():
+        item = api.resource("item")
+        return await asyncio.gather(item.get("a"), item.get("b"), item.get("c"))
+    assert [_["gid"] for _ in run(api, gather)] == ["a", "b", "c"]
+
+
+def test_gather_many_calls(api):
+    async def gather():
+        item = api.resource("item")
+        return await asyncio.gather(*[item.get(str(_)) for _ in range(50)])
+    assert [_["gid"] for _ in run(api, gather)] == [str(_) for _ in range(50)]
+
+
+def test_call_context_after_await(api):
+    async def calls():
+        item = api.resource("item")
+        first, second = item.get("x"), item.get("y")
+        await second
+        assert item.call.request["url"].endswith("/items/y")
+        await first
+        assert item.call.request["url"].endswith("/items/x")
+    run(api, calls)
+
+
+def test_sessions_closed_across_event_loops(api, caplog):
+    async def get():
+        return await api.resource("item").get("1")
+
+    async def get_and_close():
+        try:
+            return await get()
+        finally:
+            await api.aclose()
+
+    api.async_mode()
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        assert asyncio.run(get())["gid"] == "1"
+        api.async_mode(pool_size=4)
+        assert asyncio.run(get())["gid"] == "1"
+        assert asyncio.run(get_and_close())["gid"] == "1"
+        gc.collect()
+    assert [_ for _ in caught if issubclass(_.category, ResourceWarning)] == []
+    assert "Unclosed" not in caplog.text
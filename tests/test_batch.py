@@ -0,0 +1,63 @@
+import threading
+
+from pylapi import PyLapi
+from test_cache import batch_route
+
+
+# Callbacks are registered by the qualified name of their method, so not in a function
+threads = []
+
+
+class cAPI(PyLapi):
+    url = None
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.api_url = cAPI.url
+
+
+@cAPI.resource_class("batch_item", "items")
+class BatchItemResource(cAPI):
+    @cAPI.resource_method("{gid}", http_method="GET", give="$.data")
+    def get(self, gid):
+        @cAPI.callback
+        def response(self, **kwargs):
+            threads.append(threading.current_thread())
+
+
+def test_batch_error_for_each_future(api, server):
+    server.route("/api/batch")(lambda handler: (500, {"errors": [{"message": "Batch failed"}]}))
+    item = api.resource("item")
+    with api.batch():
+        futures = [item.update(str(_), data={"name": "New"}) for _ in range(3)]
+    errors = [_.exception() for _ in futures]
+    assert len({id(_) for _ in errors}) == 3
+    assert all(_.args == errors[0].args for _ in errors)
+    assert all(_.__cause__ is errors[0].__cause__ and _.__cause__ != None for _ in errors)
+    # Raising the error of one future leaves the tracebacks of the others alone
+    for _ in range(5):
+        try:
+            futures[0].result()
+        except Exception:
+            pass
+    assert errors[1].__traceback__ == None and errors[2].__traceback__ == None
+
+
+def test_batch_callback_threads(server):
+    server.route("/api/batch")(batch_route)
+    cAPI.url = server.url
+    cAPI.auth("test-token")
+    threads.clear()
+    item = cAPI.resource("batch_item")
+    try:
+        with cAPI.batch():
+            item.get("1")
+        # On exit, on the caller's thread
+        assert threads == [threading.current_thread()]
+        with cAPI.batch(interval=0.05):
+            future = item.get("2")
+            assert future.result(timeout=5)["gid"] == "2"
+    finally:
+        cAPI.close()
+    # After the interval, on the timer thread
+    assert len(threads) == 2 and threads[1] != threading.current_thread()
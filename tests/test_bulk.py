@@ -0,0 +1,149 @@
+import asyncio
+import pickle
+import threading
+import time
+
+import pytest
+import requests
+
+from pylapi import PyLapi, PyLapiRateLimiter
+
+
+class bAPI(PyLapi):
+    # Worker processes need an API class they can import
+    url = None
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.api_url = bAPI.url
+
+
+@bAPI.resource_class("bulk_item", "items")
+class BulkItemResource(bAPI):
+    @bAPI.resource_method("{gid}", http_method="GET", give="$.data")
+    def get(self, gid): pass
+
+
+def test_bulk_results_in_order(api):
+    item = api.resource("item")
+    results = list(api.bulk([(item, "get", (str(_),)) for _ in range(20)], concurrency=4))
+    assert [_.result["gid"] for _ in results] == [str(_) for _ in range(20)]
+
+
+def test_bulk_results_as_completed(api, server):
+    @server.route("/api/items/")
+    def slow_first(handler):
+        gid = handler.path.split("?")[0].rsplit("/", 1)[-1]
+        time.sleep(0.3 if gid == "0" else 0.01)
+        return {"data": {"gid": gid}}
+
+    item = api.resource("item")
+    results = list(api.bulk([(item, "get", (str(_),)) for _ in range(6)], concurrency=6, ordered=False))
+    assert sorted(_.index for _ in results) == list(range(6))
+    assert results[-1].index == 0
+
+
+def counted(items, taken):
+    # Counts the items taken from the input
+    for item in items:
+        taken.append(item)
+        yield item
+
+
+def test_bulk_backpressure(api):
+    item = api.resource("item")
+    taken = []
+    items = counted(((item, "get", (str(_),)) for _ in range(1000)), taken)
+    results = api.bulk(items, concurrency=4)
+    for consumed in range(1, 6):
+        next(results)
+        time.sleep(0.05)  # A slow consumer
+        # Only the items of the calls in flight are taken ahead
+        assert len(taken) <= consumed + 4
+    results.close()
+    assert len(taken) <= 9
+
+
+def test_abulk_backpressure(api):
+    pytest.importorskip("aiohttp")
+    taken = []
+
+    async def main():
+        item = api.resource("item")
+        items = counted(((item, "get", (str(_),)) for _ in range(1000)), taken)
+        consumed = 0
+        try:
+            async for outcome in api.abulk(items, concurrency=4, ordered=False):
+                assert outcome.ok
+                consumed += 1
+                await asyncio.sleep(0.05)
+                assert len(taken) <= consumed + 4
+                if consumed == 5:
+                    break
+        finally:
+            await api.aclose()
+
+    api.async_mode()
+    asyncio.run(main())
+    assert len(taken) <= 9
+
+
+def test_divided_rate_limiter():
+    limiter = PyLapiRateLimiter(rate=10, burst=4, margin=2).divided(2)
+    bucket = limiter.bucket()
+    assert (limiter.share, bucket.rate, bucket.burst) == (0.5, 5, 2)
+    response = requests.Response()
+    response.status_code = 200
+    response.headers.update({"X-RateLimit-Remaining": "42", "X-RateLimit-Reset": "10"})
+    limiter.update(response)
+    assert bucket.quota == 20  # Half of the 40 requests left
+    copied = pickle.loads(pickle.dumps(limiter))
+    assert (copied.rate, copied.burst, copied.margin, copied.share) == (10, 4, 2, 0.5)
+
+
+def test_process_bulk_keeps_to_rate_limit(server):
+    bAPI.url = server.url
+    bAPI.auth("test-token")
+    bAPI.configure_rate_limit(rate=20, burst=1)
+    item = bAPI.resource("bulk_item")
+    items = [(item, "get", (str(_),)) for _ in range(20)]
+    try:
+        start = time.perf_counter()
+        results = list(bAPI.bulk(items, concurrency=4, processes=2))
+        elapsed = time.perf_counter() - start
+    finally:
+        bAPI.configure_rate_limit(enabled=False)
+        bAPI.close()
+    assert [_.error for _ in results if not _.ok] == []
+    # 20 requests at 20 per second in all, rather than 20 per second in each process
+    assert elapsed >= 0.85
+    assert len(server.requests) == 20
+
+
+def test_process_bulk_with_locks_held(server):
+    # Locks held by other threads of the parent when it forks are not held in the workers
+    bAPI.url = server.url
+    bAPI.auth("test-token")
+    item = bAPI.resource("bulk_item")
+    held, release = threading.Event(), threading.Event()
+
+    def hold(lock):
+        with lock:
+            held.set()
+            release.wait()
+
+    threading.Thread(target=hold, args=(bAPI.metrics()._lock,), daemon=True).start()
+    held.wait()
+    outcome = []
+    runner = threading.Thread(
+        target=lambda: outcome.extend(bAPI.bulk([(item, "get", (str(_),)) for _ in range(4)], processes=2)),
+        daemon=True,
+    )
+    try:
+        runner.start()
+        runner.join(20)
+    finally:
+        release.set()
+        bAPI.close()
+    assert not runner.is_alive()
+    assert [_.result["gid"] for _ in outcome] == ["0", "1", "2", "3"]
@@ -0,0 +1,147 @@
+import json
+import time
+
+import pytest
+
+from pylapi import PyLapiCache, PyLapiCacheEntry, PyLapiMemoryCache, PyLapiSQLiteCache
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    class GetOnlyCache(PyLapiCache):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyCache()
+
+
+def test_get_served_from_cache(api, server):
+    api.configure_cache(PyLapiMemoryCache(), ttl=60)
+    item = api.resource("item")
+    assert item.get("1")["gid"] == "1"
+    assert item.call.cache == "miss"
+    assert item.get("1")["gid"] == "1"
+    assert item.call.cache == "hit"
+    assert len(server.requests) == 1
+
+
+def test_update_invalidates_cache(api, server):
+    api.configure_cache(PyLapiMemoryCache(), ttl=60)
+    item = api.resource("item")
+    item.get("1")
+    item.update("1", data={"name": "New"})
+    item.get("1")
+    assert item.call.cache == "miss"
+    assert len(server.requests) == 3
+
+
+def validated_route(handler):
+    # A body with an ETag and a Last-Modified date, and 304 Not Modified when either still matches
+    gid = handler.path.split("?")[0].rsplit("/", 1)[-1]
+    headers = {"ETag": f'"{gid}-v1"', "Last-Modified": "Sat, 17 Oct 2026 10:00:00 GMT"}
+    if handler.headers.get("If-None-Match") == headers["ETag"] or handler.headers.get("If-Modified-Since") == headers["Last-Modified"]:
+        return 304, None, headers
+    return 200, {"data": {"gid": gid, "version": 1}}, headers
+
+
+@pytest.mark.parametrize("cache", [PyLapiMemoryCache, PyLapiSQLiteCache])
+def test_revalidated_with_etag(api, server, tmp_path, cache):
+    server.route("/api/items/")(validated_route)
+    api.configure_cache(cache() if cache == PyLapiMemoryCache else cache(str(tmp_path / "cache.db")))
+    item = api.resource("item")
+    assert item.get("1") == {"gid": "1", "version": 1}
+    assert item.call.cache == "miss"
+    # No TTL: revalidated, and the cached body is given for the 304
+    assert item.get("1") == {"gid": "1", "version": 1}
+    assert item.call.cache == "revalidated"
+    assert item.call.response.status_code == 200
+    assert api.metrics()["cache_revalidated"] == 1
+    (_, _, first), (_, _, second) = server.requests
+    assert "If-None-Match" not in first
+    assert second["If-None-Match"] == '"1-v1"'
+    assert second["If-Modified-Since"] == "Sat, 17 Oct 2026 10:00:00 GMT"
+
+
+def sqlite_entry(url: str) -> PyLapiCacheEntry:
+    return PyLapiCacheEntry(url=url, status_code=200, headers={}, content=b'{"data": {}}', etag='"1"', stored=time.time())
+
+
+def test_sqlite_counters(tmp_path):
+    cache = PyLapiSQLiteCache(str(tmp_path / "cache.db"), max_entries=100)
+    for _ in range(10):
+        cache.set(f"https://api/items/{_}", sqlite_entry(f"https://api/items/{_}"))
+    cache.set("https://api/items/0", sqlite_entry("https://api/items/0"))  # Replaced
+    db = cache._connection()
+    assert (len(cache), cache.bytes) == db.execute("SELECT COUNT(*), SUM(size) FROM pylapi_cache").fetchone()
+    assert len(cache) == 10
+    cache.invalidate("https://api/items/1")
+    cache.delete("https://api/items/2")
+    assert len(cache) == 8
+    cache.clear()
+    assert (len(cache), cache.bytes) == (0, 0)
+
+
+def test_sqlite_evicts_to_low_water_mark(tmp_path, monkeypatch):
+    cache = PyLapiSQLiteCache(str(tmp_path / "cache.db"), max_entries=20)
+    evictions = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: (evictions.append(len(cache)), evict()))
+    for _ in range(40):
+        cache.set(f"https://api/items/{_}", sqlite_entry(f"https://api/items/{_}"))
+        assert len(cache) <= 20
+    # Trimmed to 18 (90%) entries each time, so once every 3 writes beyond the cap, not on every one
+    assert evictions == [21] * 7
+    assert cache.get("https://api/items/39") != None
+    assert cache.get("https://api/items/0") == None
+
+
+def test_sqlite_counts_existing_cache(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = PyLapiSQLiteCache(path)
+    for _ in range(3):
+        cache.set(f"https://api/items/{_}", sqlite_entry(f"https://api/items/{_}"))
+    db = cache._connection()
+    db.execute("DROP TABLE pylapi_cache_stats")
+    cache.close()
+    assert len(PyLapiSQLiteCache(path)) == 3
+
+
+def batch_route(handler):
+    # The Asana Batch API, with the actions answered as the item route does
+    results = []
+    for action in json.loads(handler.body)["data"]["actions"]:
+        gid = action["relative_path"].rsplit("/", 1)[-1]
+        data = dict(action.get("data") or {}, gid=gid) if action["method"] != "get" else {"gid": gid}
+        results.append({"status_code": 200, "headers": {}, "body": {"data": data}})
+    return {"data": results}
+
+
+def test_batch_update_invalidates_cache(api, server):
+    server.route("/api/batch")(batch_route)
+    api.configure_cache(PyLapiMemoryCache(), ttl=60)
+    item = api.resource("item")
+    item.get("1")
+    with api.batch() as batch:
+        future = item.update("1", data={"name": "New"})
+    assert future.result()["name"] == "New"
+    item.get("1")
+    assert item.call.cache == "miss"
+    assert [(_[0], _[1].split("?")[0]) for _ in server.requests] == [
+        ("GET", "/api/items/1"), ("POST", "/api/batch"), ("GET", "/api/items/1"),
+    ]
+
+
+def test_batch_get_served_from_and_stored_in_cache(api, server):
+    server.route("/api/batch")(batch_route)
+    api.configure_cache(PyLapiMemoryCache(), ttl=60)
+    item = api.resource("item")
+    item.get("1")
+    with api.batch() as batch:
+        cached = item.get("1")
+        batched = item.get("2")
+    assert cached.result()["gid"] == "1"
+    assert batched.result()["gid"] == "2"
+    assert len(server.requests) == 2
+    item.get("2")
+    assert item.call.cache == "hit"
+    assert len(server.requests) == 2
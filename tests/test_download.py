@@ -0,0 +1,137 @@
+import asyncio
+import os
+
+import pytest
+
+from pylapi import PyLapiDownload
+
+
+BODY = bytes(range(256)) * 400
+
+
+def file_route(server, body: bytes = BODY, etag: str = '"v1"', break_at: int = None):
+    # A file accepting ranges, validated with If-Range; the first response breaks off at `break_at` bytes
+    state = {"broken": False}
+
+    def route(handler):
+        headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+        start = 0
+        range_header = handler.headers.get("Range")
+        if range_header and handler.headers.get("If-Range") in (None, etag):
+            start = int(range_header[len("bytes="):].rstrip("-"))
+            headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+        handler.send_response(206 if start else 200)
+        handler.send_header("Content-Type", "application/octet-stream")
+        handler.send_header("Content-Length", str(len(body) - start))
+        for key, value in headers.items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        if break_at != None and not state["broken"]:
+            state["broken"] = True
+            handler.wfile.write(body[start:break_at])
+            handler.wfile.flush()
+            handler.close_connection = True
+            return
+        handler.wfile.write(body[start:])
+
+    server.route("/api/files/")(route)
+
+
+def file_resource(api):
+    @api.resource_class("file", "files")
+    class FileResource(api):
+        @api.resource_method("{name}", http_method="GET")
+        def download(self, name): pass
+
+    return api.resource("file")
+
+
+def ranges(server) -> list:
+    return [(_[2].get("Range"), _[2].get("If-Range")) for _ in server.requests]
+
+
+def download_partial(api, server, path, name: str = "file.bin") -> None:
+    # A broken download leaving a partial file at the path, with its validator
+    file_route(server, break_at=1000)
+    with pytest.raises(Exception):
+        file_resource(api).download(name, download=PyLapiDownload(str(path), resume=True, chunk_size=1000, max_resumes=0))
+    assert path.read_bytes() == BODY[:1000]
+    assert os.path.exists(str(path) + ".pylapi-resume")
+    server.requests.clear()
+
+
+def test_download_overwrites_existing_file(api, server, tmp_path):
+    file_route(server)
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"stale content " * 10000)
+    download = file_resource(api).download("file.bin", download=str(path))
+    assert path.read_bytes() == BODY
+    assert download.size == len(BODY)
+    assert ranges(server) == [(None, None)]
+
+
+def test_resume_without_state_starts_again(api, server, tmp_path):
+    file_route(server)
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"stale")
+    file_resource(api).download("file.bin", download=PyLapiDownload(str(path), resume=True))
+    assert path.read_bytes() == BODY
+    assert ranges(server) == [(None, None)]
+    assert not os.path.exists(str(path) + ".pylapi-resume")
+
+
+def test_resume_partial_file(api, server, tmp_path):
+    path = tmp_path / "file.bin"
+    download_partial(api, server, path)
+    file_route(server)
+    download = file_resource(api).download("file.bin", download=PyLapiDownload(str(path), resume=True, checksum="sha256"))
+    assert path.read_bytes() == BODY
+    assert ranges(server) == [("bytes=1000-", '"v1"')]
+    assert download.size == len(BODY)
+    assert not os.path.exists(str(path) + ".pylapi-resume")
+
+
+def test_resume_changed_file_starts_again(api, server, tmp_path):
+    body = b"new content " * 1000
+    path = tmp_path / "file.bin"
+    download_partial(api, server, path)
+    file_route(server, body=body, etag='"v2"')
+    file_resource(api).download("file.bin", download=PyLapiDownload(str(path), resume=True))
+    assert path.read_bytes() == body
+    assert ranges(server) == [("bytes=1000-", '"v1"')]
+
+
+def test_resume_partial_file_of_other_url_starts_again(api, server, tmp_path):
+    path = tmp_path / "file.bin"
+    download_partial(api, server, path, "other.bin")
+    file_route(server)
+    file_resource(api).download("file.bin", download=PyLapiDownload(str(path), resume=True))
+    assert path.read_bytes() == BODY
+    assert ranges(server) == [(None, None)]
+
+
+def test_resume_broken_download(api, server, tmp_path):
+    file_route(server, break_at=50000)
+    path = tmp_path / "file.bin"
+    download = file_resource(api).download("file.bin", download=PyLapiDownload(str(path), resume=True, chunk_size=10000))
+    assert path.read_bytes() == BODY
+    assert download.resumes == 1
+    assert ranges(server) == [(None, None), ("bytes=50000-", '"v1"')]
+
+
+def test_async_download_overwrites_existing_file(api, server, tmp_path):
+    pytest.importorskip("aiohttp")
+    file_route(server)
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"stale content " * 10000)
+
+    async def main():
+        try:
+            return await file_resource(api).download("file.bin", download=str(path))
+        finally:
+            await api.aclose()
+
+    api.async_mode()
+    asyncio.run(main())
+    assert path.read_bytes() == BODY
+    assert ranges(server) == [(None, None)]
@@ -0,0 +1,60 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pylapi import PyLapiHedge
+
+
+def slow_route(seconds):
+    # Items answer after `seconds`, or at once for a gid ending with "fast" on a second request
+    seen = set()
+    lock = threading.Lock()
+
+    def route(handler):
+        gid = handler.path.split("?")[0].rsplit("/", 1)[-1]
+        with lock:
+            repeated = gid in seen
+            seen.add(gid)
+        if not (repeated and gid.endswith("fast")):
+            time.sleep(seconds)
+        return {"data": {"gid": gid, "hedge": repeated}}
+    return route
+
+
+def test_hedge_wins(api, server):
+    server.route("/api/items/")(slow_route(1.0))
+    item = api.resource("item")
+    item.hedge = PyLapiHedge(delay=0.05)
+    start = time.perf_counter()
+    result = item.get("1-fast")
+    assert time.perf_counter() - start < 0.8
+    assert result["hedge"] == True
+    assert (api.metrics()["hedges"], api.metrics()["hedge_wins"]) == (1, 1)
+
+
+def test_no_hedges_under_load(api, server):
+    # Calls waiting for a thread of the pool are not hedged for the time they wait
+    server.route("/api/items/")(slow_route(0.1))
+    hedge = PyLapiHedge(delay=0.15, workers=2, budget=1)
+
+    def get(gid):
+        item = api.resource("item")
+        item.hedge = hedge
+        return item.get(gid)
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(get, [str(_) for _ in range(8)]))
+    assert [_["gid"] for _ in results] == [str(_) for _ in range(8)]
+    assert api.metrics()["hedges"] == 0
+    assert len(server.requests) == 8
+
+
+def test_hedge_budget(api, server):
+    server.route("/api/items/")(slow_route(0.1))
+    item = api.resource("item")
+    item.hedge = PyLapiHedge(delay=0.02, budget=0.25)
+    for gid in range(8):
+        item.get(str(gid))
+    # The first call, then one in four
+    assert api.metrics()["hedges"] == 2
+    assert len(server.requests) == 10
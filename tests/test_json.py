@@ -0,0 +1,25 @@
+import json
+
+import pytest
+
+from pylapi import PyLapi, PyLapiJSONCodec, config
+
+
+def test_default_codec_is_json(api):
+    assert type(PyLapi.json_codec()) == PyLapiJSONCodec
+    assert type(api.json_codec()) == PyLapiJSONCodec
+
+
+def test_str_unchanged_by_default(api):
+    item = api.resource("item")
+    item[""] = {"gid": "1", "name": "Ünïcode"}
+    assert str(item) == json.dumps({"gid": "1", "name": "Ünïcode"}, indent=config.pylapi_json_indent)
+    assert "\\u00dc" in str(item)
+
+
+def test_orjson_opt_in(api, server):
+    pytest.importorskip("orjson")
+    api.configure_json("orjson")
+    assert api.json_codec().name == "orjson"
+    assert PyLapi.json_codec().name == "json"
+    assert api.resource("item").update("1", data={"name": "Ünïcode"}) == {"name": "Ünïcode", "gid": "1"}
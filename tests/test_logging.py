@@ -0,0 +1,47 @@
+import logging
+
+import pytest
+
+
+@pytest.fixture
+def log_levels(api):
+    """Restore the PyLapi log levels after a test."""
+    yield
+    api.setLogLevel(logging.ERROR)
+    api.setDeepLogLevel(logging.ERROR)
+
+
+def test_dedicated_logger(api, log_levels):
+    assert api.getLogger() is logging.getLogger("pylapi")
+    root_level = logging.getLogger().level
+    api.setLogLevel(logging.DEBUG)
+    assert api.getLogLevel() == logging.DEBUG
+    assert logging.getLogger("pylapi").level == logging.DEBUG
+    assert logging.getLogger().level == root_level
+    api.setDeepLogLevel(logging.INFO)
+    assert logging.getLogger("urllib3").level == logging.INFO
+    assert logging.getLogger("pylapi").level == logging.DEBUG
+
+
+def test_debug_records(api, log_levels, caplog):
+    caplog.set_level(logging.DEBUG)
+    api.setLogLevel(logging.DEBUG)
+    api.setDeepLogLevel(logging.DEBUG)
+    assert api.resource("item").update("1", data={"name": "New"}) == {"name": "New", "gid": "1"}
+    records = [_ for _ in caplog.records if _.name == "pylapi"]
+    assert records and all(_.levelno == logging.DEBUG for _ in records)
+    assert any("_obtain_request_args: request=" in _.getMessage() for _ in records)
+    # The auth token is washed out of all records, including those of the HTTP libraries
+    assert "<api_auth>" in caplog.text
+    assert "test-token" not in caplog.text
+
+
+def test_no_debug_records(api, log_levels, caplog, monkeypatch):
+    caplog.set_level(logging.DEBUG)
+    api.setLogLevel(logging.WARNING)
+    washed = []
+    monkeypatch.setattr(api, "wash_secrets", classmethod(lambda cls, val: washed.append(val) or val))
+    assert api.resource("item").get("1")["gid"] == "1"
+    assert [_ for _ in caplog.records if _.name == "pylapi"] == []
+    # Debug records are not even formatted
+    assert washed == []
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+from pylapi import PyLapiOffsetPaginator
+
+
+def page_resource(api, server, total=5, seconds=0.0):
+    # `total` items in pages of 2, each page answered after `seconds`
+    @server.route("/api/pages")
+    def pages(handler):
+        time.sleep(seconds)
+        offset = int(handler.query.get("offset") or 0)
+        limit = int(handler.query["limit"])
+        next_page = {"offset": str(offset + limit)} if offset + limit < total else None
+        return {"data": [{"n": _} for _ in range(offset, min(offset + limit, total))], "next_page": next_page}
+
+    @api.resource_class("page", "pages")
+    class PageResource(api):
+        @api.resource_method("", http_method="GET", give="$.data", paginator=PyLapiOffsetPaginator(page_size=2))
+        def getAll(self): pass
+
+    return api.resource("page")
+
+
+def test_offset_pages(api, server):
+    assert [_["n"] for _ in page_resource(api, server).iterate("getAll")] == [0, 1, 2, 3, 4]
+    assert len(server.requests) == 3
+
+
+def test_prefetch_overlaps_pages(api, server):
+    page = page_resource(api, server, total=10, seconds=0.1)
+    start = time.perf_counter()
+    items = []
+    for item in page.iterate("getAll", prefetch=2):
+        items.append(item["n"])
+        time.sleep(0.05)  # 0.1 second per page
+    # Fetching and consuming 5 pages one after the other takes 1 second
+    assert time.perf_counter() - start < 0.8
+    assert items == list(range(10))
+
+
+def test_prefetch_stops_when_closed(api, server):
+    page = page_resource(api, server, total=40, seconds=0.02)
+    items = page.iterate("getAll", prefetch=1)
+    assert [next(items)["n"] for _ in range(3)] == [0, 1, 2]
+    items.close()
+    time.sleep(0.3)
+    # The 2 pages consumed, 1 page fetched ahead, and at most 1 more being fetched when closed
+    assert len(server.requests) <= 4
+
+
+def test_async_prefetch(api, server):
+    pytest.importorskip("aiohttp")
+    page = page_resource(api, server, total=10, seconds=0.1)
+
+    async def main():
+        items = []
+        try:
+            async for item in page.aiterate("getAll", prefetch=2):
+                items.append(item["n"])
+                await asyncio.sleep(0.05)
+        finally:
+            await api.aclose()
+        return items
+
+    api.async_mode()
+    start = time.perf_counter()
+    assert asyncio.run(main()) == list(range(10))
+    assert time.perf_counter() - start < 0.8
@@ -0,0 +1,49 @@
+import time
+
+from pylapi import PyLapiTokenBucket
+
+
+def test_rate_limit(api, server):
+    api.configure_rate_limit(rate=20, burst=1)
+    item = api.resource("item")
+    start = time.perf_counter()
+    for gid in range(5):
+        item.get(str(gid))
+    # The first request at once, then one every 50 ms
+    assert time.perf_counter() - start >= 0.19
+
+
+def quota_route(remaining, reset):
+    def route(handler):
+        return 200, {"data": {}}, {"X-RateLimit-Remaining": str(remaining), "X-RateLimit-Reset": str(reset())}
+    return route
+
+
+def test_rate_limit_headers_large_quota(api, server):
+    # A short job is not slowed down by a large quota, e.g., 4999 requests left for an hour
+    server.route("/api/items/")(quota_route(4999, lambda: time.time() + 3600))
+    api.configure_rate_limit()
+    item = api.resource("item")
+    start = time.perf_counter()
+    for gid in range(30):
+        item.get(str(gid))
+    assert time.perf_counter() - start < 1.0
+
+
+def test_rate_limit_headers_quota_spent(api, server):
+    # 1 request left, which is the margin: the next one waits for the window to reset
+    server.route("/api/items/")(quota_route(1, lambda: time.time() + 0.5))
+    api.configure_rate_limit()
+    item = api.resource("item")
+    item.get("1")
+    start = time.perf_counter()
+    item.get("2")
+    assert time.perf_counter() - start >= 0.3
+
+
+def test_token_bucket_paces_reserve():
+    bucket = PyLapiTokenBucket()
+    bucket.update(remaining=100, reset_in=10)
+    # 90 at once, then the reserve of 10 over the 10 seconds left
+    assert all(bucket.take() == 0 for _ in range(91))
+    assert bucket.take() > 0.5
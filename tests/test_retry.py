@@ -0,0 +1,32 @@
+import time
+
+from pylapi import PyLapiRetry
+
+
+def flaky_route(failures, status=503, headers=None):
+    # Items fail `failures` times before they answer
+    calls = []
+
+    def route(handler):
+        calls.append(handler.path)
+        if len(calls) <= failures:
+            return status, {"errors": [{"message": "Try again"}]}, headers
+        return {"data": {"gid": "1"}}
+    return route
+
+
+def test_retry_transient_status(api, server):
+    server.route("/api/items/")(flaky_route(2))
+    item = api.resource("item")
+    item.retry = PyLapiRetry(total=3, backoff=0.01)
+    assert item.get("1")["gid"] == "1"
+    assert (api.metrics()["requests"], api.metrics()["retries"]) == (3, 2)
+
+
+def test_retry_after(api, server):
+    server.route("/api/items/")(flaky_route(1, 429, {"Retry-After": "0.3"}))
+    item = api.resource("item")
+    item.retry = PyLapiRetry(total=1, backoff=0.01)
+    start = time.perf_counter()
+    assert item.get("1")["gid"] == "1"
+    assert time.perf_counter() - start >= 0.3
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+from magico import MagicO
+
+from pylapi import PyLapiRewrite
+
+
+DATA = {"data": {"items": [{"x": 1, "tags": ["a", "b"]}, {"x": 2, "tags": []}], "owner": None, "count": 0}}
+
+
+@pytest.mark.parametrize("path", [
+    "$",
+    "$.data",
+    "$.data.items[0].x",
+    "$.data.items[-1].tags",
+    "$.data.items[0].tags[1]",
+    "$.data.items[0:1]",
+    "$.data.owner",
+    "$.data.missing.x",
+    "$.data.count",
+])
+def test_compiled_path(path):
+    # Compiled paths give what MagicO gives
+    assert PyLapiRewrite(path)(DATA) == MagicO(DATA)[path]
+
+
+def test_compiled_path_through_null():
+    assert PyLapiRewrite("$.data.owner.login")(DATA) == None
+
+
+def test_compiled_template():
+    rewrite = PyLapiRewrite({
+        "$.key": "$.data.count",
+        "items": [{"x": "$.data.items[1].x", "first": "$.data.items[0].tags[0]"}, "fixed", 3, True, None],
+        "owner": {"login": "$.data.owner.login"},
+    })
+    assert rewrite(DATA) == {
+        "$.key": 0,
+        "items": [{"x": 2, "first": "a"}, "fixed", 3, True, None],
+        "owner": {"login": None},
+    }
+
+
+@pytest.fixture
+def rewrite_api(api, server):
+    @server.route("/api/rewrites")
+    def echo(handler):
+        return {"data": dict(DATA["data"], received=json.loads(handler.body or b"{}"))}
+
+    @api.resource_class("rewrite", "rewrites")
+    class RewriteResource(api):
+        @api.resource_method("", http_method="POST", give="$.data.received", send={
+            "data": {
+                "name": "$.name",
+                "flags": {"done": "$.done", "note": "$.note"},
+                "tags": ["$.tags[0]", "$.tags[-1]", "fixed", 3, True, None],
+            },
+        })
+        def create(self): pass
+
+        @api.resource_method("", http_method="GET", give="$.data.items[0].tags[1]")
+        def first_tag(self): pass
+
+        @api.resource_method("", http_method="GET", give={
+            "first": "$.data.items[0].x",
+            "last": "$.data.items[-1].x",
+            "tags": ["$.data.items[0].tags[0]", "$.data.items[1].tags"],
+            "owner": {"login": "$.data.owner.login"},
+            "head": "$.data.items[0:1]",
+        })
+        def summary(self): pass
+
+    return api
+
+
+def test_send_template(rewrite_api):
+    data = {"name": 'Say "hi"', "done": False, "note": None, "tags": ["x", "y", "z"]}
+    assert rewrite_api.resource("rewrite").create(data=data) == {
+        "data": {
+            "name": 'Say "hi"',
+            "flags": {"done": False, "note": None},
+            "tags": ["x", "z", "fixed", 3, True, None],
+        },
+    }
+
+
+def test_give_templates(rewrite_api):
+    rewrite = rewrite_api.resource("rewrite")
+    assert rewrite.first_tag() == "b"
+    assert rewrite.summary() == {
+        "first": 1,
+        "last": 2,
+        "tags": ["a", []],
+        "owner": {"login": None},
+        "head": [{"x": 1, "tags": ["a", "b"]}],
+    }
@@ -0,0 +1,21 @@
+import gc
+
+from pylapi import PyLapiSession
+
+
+def test_thread_sessions_dropped_with_threads(api):
+    item = api.resource("item")
+    for _ in range(50):
+        items = [(item, "get", (str(_),)) for _ in range(4)]
+        assert all(_.ok for _ in api.bulk(items, concurrency=4))
+    gc.collect()
+    # Only the sessions of live threads, not one per thread ever run
+    assert len(api.session()._sessions) <= 1
+
+
+def test_close_closes_thread_sessions(server):
+    session = PyLapiSession()
+    session.request("GET", server.url + "/items/1")
+    session.close()
+    assert session.closed
+    assert len(session._sessions) == 0
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pylapi import PyLapiError, PyLapiSingleFlight
+
+
+class Interrupted(BaseException):
+    pass
+
+
+def test_sync_shared_result():
+    flight = PyLapiSingleFlight()
+    calls = []
+    results = []
+
+    def func():
+        calls.append(1)
+        time.sleep(0.1)
+        return "result"
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", func))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(results) == [("result", False)] + [("result", True)] * 4
+
+
+def test_sync_error_copied_for_each_waiter():
+    flight = PyLapiSingleFlight()
+    error = PyLapiError({"error": "failed"})
+    errors = []
+
+    def func():
+        time.sleep(0.1)
+        raise error
+
+    def call():
+        try:
+            flight.do("key", func)
+        except PyLapiError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 4
+    assert len({id(_) for _ in errors}) == 4
+    assert all(_.api_response == error.api_response for _ in errors)
+    assert all(_.__cause__ is error for _ in errors if _ is not error)
+
+
+def test_sync_waiter_takes_over_interrupted_call():
+    flight = PyLapiSingleFlight()
+    calls = []
+    results = []
+
+    def func():
+        calls.append(1)
+        time.sleep(0.1)
+        if len(calls) == 1:
+            raise Interrupted()
+        return "result"
+
+    def leader():
+        with pytest.raises(Interrupted):
+            flight.do("key", func)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    time.sleep(0.02)
+    results.append(flight.do("key", func))
+    thread.join()
+    assert results == [("result", False)]
+    assert len(calls) == 2
+
+
+def test_async_waiters_take_over_cancelled_call():
+    flight = PyLapiSingleFlight()
+    calls = []
+
+    async def func():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "result"
+
+    async def main():
+        leader = asyncio.create_task(flight.ado("key", func))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(flight.ado("key", func)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(main())
+    assert sorted(results) == [("result", False)] + [("result", True)] * 2
+    assert len(calls) == 2
+
+
+def test_async_error_copied_for_each_waiter():
+    flight = PyLapiSingleFlight()
+    error = PyLapiError({"error": "failed"})
+
+    async def func():
+        await asyncio.sleep(0.05)
+        raise error
+
+    async def main():
+        return await asyncio.gather(*[flight.ado("key", func) for _ in range(3)], return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert errors[0] is error
+    assert all(type(_) == PyLapiError and _ is not error and _.__cause__ is error for _ in errors[1:])
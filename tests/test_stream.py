@@ -0,0 +1,223 @@
+import asyncio
+import importlib.util
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from pylapi import PyLapiJSONStream
+
+
+def chunked_route(first_read: threading.Event):
+    # An export sent in chunks, the rest only once the client has read the first element (or after 2 seconds)
+    def route(handler):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send(text):
+            data = text.encode()
+            handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            handler.wfile.flush()
+
+        send('{"meta": {"skipped": [1, 2, {"x": "]"}]}, "data": [' + json.dumps({"gid": "0"}))
+        handler.server.waited = not first_read.wait(2)
+        for gid in range(1, 5):
+            send(", " + json.dumps({"gid": str(gid)}))
+        send('], "next_page": null}')
+        handler.wfile.write(b"0\r\n\r\n")
+    return route
+
+
+def export_resource(api):
+    @api.resource_class("export", "exports")
+    class ExportResource(api):
+        @api.resource_method("", http_method="GET", give="$.data", stream=True)
+        def getAll(self): pass
+
+        @api.resource_method("", http_method="GET", give="$.meta.skipped[2]", stream=True)
+        def getOne(self): pass
+
+    return api.resource("export")
+
+
+def test_stream_elements_as_they_arrive(api, server):
+    first_read = threading.Event()
+    server.route("/api/exports")(chunked_route(first_read))
+    gids = []
+    for element in export_resource(api).getAll():
+        gids.append(element["gid"])
+        first_read.set()
+    assert gids == ["0", "1", "2", "3", "4"]
+    assert not server.waited
+
+
+def test_async_stream_elements_as_they_arrive(api, server):
+    pytest.importorskip("aiohttp")
+    first_read = threading.Event()
+    server.route("/api/exports")(chunked_route(first_read))
+
+    async def main():
+        gids = []
+        try:
+            async for element in await export_resource(api).getAll():
+                gids.append(element["gid"])
+                first_read.set()
+        finally:
+            await api.aclose()
+        return gids
+
+    api.async_mode()
+    assert asyncio.run(main()) == ["0", "1", "2", "3", "4"]
+    assert not server.waited
+
+
+def test_async_stream_value(api, server):
+    pytest.importorskip("aiohttp")
+    first_read = threading.Event()
+    first_read.set()
+    server.route("/api/exports")(chunked_route(first_read))
+
+    async def main():
+        try:
+            return await export_resource(api).getOne()
+        finally:
+            await api.aclose()
+
+    api.async_mode()
+    assert asyncio.run(main()) == {"x": "]"}
+
+
+def test_parse_byte_by_byte():
+    document = json.dumps({"skip": {"a": [1, '"]']}, "data": [{"n": _, "s": "é"} for _ in range(3)]}).encode()
+    chunks = [document[_:_ + 1] for _ in range(len(document))]
+    is_array, elements = PyLapiJSONStream(chunks, "$.data").parse()
+    assert is_array and list(elements) == [{"n": _, "s": "é"} for _ in range(3)]
+
+    async def achunks():
+        for chunk in chunks:
+            yield chunk
+
+    async def aparse():
+        is_array, elements = await PyLapiJSONStream(achunks(), "$.data").aparse()
+        return is_array, [_ async for _ in elements]
+
+    assert asyncio.run(aparse()) == (True, [{"n": _, "s": "é"} for _ in range(3)])
+    assert PyLapiJSONStream([document], "$.skip.a[1]").parse() == (False, '"]')
+    assert PyLapiJSONStream([b'{"data": []}'], "$.data").parse()[0] == True
+    assert list(PyLapiJSONStream([b'{"data": []}'], "$.data").parse()[1]) == []
+
+
+def trickled_route(handler):
+    # The export in small chunks, 20 ms apart
+    handler.send_response(200)
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Transfer-Encoding", "chunked")
+    handler.end_headers()
+    document = '{"meta": {"skipped": [1, 2, {"x": "]"}]}, "data": [' + ", ".join(json.dumps({"gid": str(_)}) for _ in range(5)) + "]}"
+    for start in range(0, len(document), 16):
+        data = document[start:start + 16].encode()
+        handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        handler.wfile.flush()
+        time.sleep(0.02)
+    handler.wfile.write(b"0\r\n\r\n")
+
+
+def test_async_streams_on_one_resource_object(api, server):
+    pytest.importorskip("aiohttp")
+    server.route("/api/exports")(trickled_route)
+
+    async def main():
+        export = export_resource(api)
+
+        async def elements():
+            return [_["gid"] async for _ in await export.getAll()]
+
+        try:
+            return await asyncio.gather(export.getOne(), elements(), export.getOne())
+        finally:
+            await api.aclose()
+
+    api.async_mode()
+    assert asyncio.run(main()) == [{"x": "]"}, ["0", "1", "2", "3", "4"], {"x": "]"}]
+
+
+TOKENS = ["Hel", "lo", ", ", "world"]
+
+
+def events_route(received: list):
+    # Chat completion tokens as server-sent events, each sent only once the client has the one before
+    # (or after 2 seconds), then the [DONE] terminator and an event that must not be given
+    def route(handler):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send(text):
+            data = text.encode()
+            handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            handler.wfile.flush()
+
+        handler.server.waited = False
+        send(": keep-alive\n\n")
+        for index, token in enumerate(TOKENS):
+            event = json.dumps({"choices": [{"index": 0, "delta": {"content": token}}]})
+            # An event split across chunks
+            send(f"data: {event[:10]}")
+            send(f"{event[10:]}\n\n")
+            if index + 1 < len(TOKENS):
+                handler.server.waited |= not received[index].wait(2)
+        send("data: [DONE]\n\n")
+        send('data: {"choices": [{"delta": {"content": "late"}}]}\n\n')
+        handler.wfile.write(b"0\r\n\r\n")
+    return route
+
+
+def test_tutorial_ask_stream(server):
+    spec = importlib.util.spec_from_file_location("oapi", os.path.join(os.path.dirname(__file__), "..", "tutorials", "oapi.py"))
+    oapi = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(oapi)
+    received = [threading.Event() for _ in TOKENS]
+    server.route("/api/chat/completions")(events_route(received))
+    oapi.oAPI.auth("test-key")
+    conversation = oapi.oAPI.resource("conversation")
+    conversation.api_url = server.url
+    try:
+        tokens = []
+        for token in conversation.ask_stream("Hello?"):
+            received[len(tokens)].set()
+            tokens.append(token)
+    finally:
+        oapi.oAPI.close()
+    assert tokens == TOKENS
+    assert not server.waited
+    assert conversation.message_bank[-1] == {"role": "assistant", "content": "Hello, world"}
+
+
+def test_async_stream_events(api, server):
+    pytest.importorskip("aiohttp")
+    received = [threading.Event() for _ in TOKENS]
+    server.route("/api/chat/completions")(events_route(received))
+
+    @api.resource_class("chat", "chat")
+    class ChatResource(api):
+        @api.resource_method("completions", http_method="POST", give="$.choices[0].delta.content", stream=True)
+        def create(self): pass
+
+    async def main():
+        tokens = []
+        try:
+            async for token in await api.resource("chat").create(data={"stream": True}):
+                received[len(tokens)].set()
+                tokens.append(token)
+        finally:
+            await api.aclose()
+        return tokens
+
+    api.async_mode()
+    assert asyncio.run(main()) == TOKENS
+    assert not server.waited
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+
+from pylapi import PyLapiTimeout, PyLapiTimeoutError
+
+
+def slow_route(seconds: float):
+    def slow(handler):
+        time.sleep(seconds)
+        return {"data": {}}
+    return slow
+
+
+def trickled_route(seconds: float, size: int = 40):
+    """A body sent one byte at a time, each within any read timeout, over `seconds`."""
+    def trickled(handler):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(size))
+        handler.end_headers()
+        body = b'{"data": {}}'.ljust(size)
+        try:
+            for byte in body:
+                handler.wfile.write(bytes([byte]))
+                handler.wfile.flush()
+                time.sleep(seconds / size)
+        except OSError:
+            pass
+    return trickled
+
+
+def test_deadline(api, server):
+    server.route("/api/items/")(slow_route(0.5))
+    item = api.resource("item")
+    start = time.perf_counter()
+    with pytest.raises(PyLapiTimeoutError):
+        with api.deadline(0.1):
+            item.get("1")
+    assert time.perf_counter() - start < 0.4
+
+
+def test_deadline_trickled_body(api, server):
+    server.route("/api/items/")(trickled_route(1.5))
+    item = api.resource("item")
+    start = time.perf_counter()
+    with pytest.raises(PyLapiTimeoutError):
+        with api.deadline(0.3):
+            item.get("1")
+    assert time.perf_counter() - start < 0.8
+    # Bodies read within the deadline are returned, and their connection reused
+    server.reset()
+    with api.deadline(5):
+        assert item.get("1")["gid"] == "1"
+        assert item.get("2")["gid"] == "2"
+
+
+def test_method_timeout(api, server):
+    @api.resource_class("timed_item", "items")
+    class TimedItemResource(api):
+        @api.resource_method("{gid}", http_method="GET", give="$.data", timeout=PyLapiTimeout(connect=1, read=0.1))
+        def get_read(self, gid): pass
+
+        @api.resource_method("{gid}", http_method="GET", give="$.data", timeout=PyLapiTimeout(connect=1, read=5, total=0.3))
+        def get_total(self, gid): pass
+
+    api.retry = None
+    item = api.resource("timed_item")
+    server.route("/api/items/")(slow_route(0.5))
+    start = time.perf_counter()
+    with pytest.raises(PyLapiTimeoutError):
+        item.get_read("1")
+    assert time.perf_counter() - start < 0.4
+    server.route("/api/items/")(trickled_route(1.5))
+    start = time.perf_counter()
+    with pytest.raises(PyLapiTimeoutError):
+        item.get_total("1")
+    assert time.perf_counter() - start < 0.8
+    # The other methods keep the timeout of the API class
+    assert api.resource("item").get("1") == {}
+
+
+@pytest.mark.parametrize("route", [slow_route(1.5), trickled_route(1.5)], ids=["slow", "trickled"])
+def test_async_deadline(api, server, route):
+    pytest.importorskip("aiohttp")
+    server.route("/api/items/")(route)
+
+    async def get():
+        item = api.resource("item")
+        try:
+            async with api.deadline(0.3):
+                await item.get("1")
+        finally:
+            await api.aclose()
+
+    api.async_mode()
+    start = time.perf_counter()
+    with pytest.raises(PyLapiTimeoutError):
+        asyncio.run(get())
+    assert time.perf_counter() - start < 0.8
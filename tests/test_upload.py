@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import io
+import threading
+
+import pytest
+
+from pylapi import PyLapiUpload
+
+
+class RecordingFile(io.BytesIO):
+    """A file object recording the threads that read it."""
+
+    def __init__(self, data: bytes) -> None:
+        super().__init__(data)
+        self.threads = set()
+
+    def read(self, *args) -> bytes:
+        self.threads.add(threading.get_ident())
+        return super().read(*args)
+
+
+def upload_route(handler):
+    return {"data": {"size": len(handler.body), "sha256": hashlib.sha256(handler.body).hexdigest()}}
+
+
+def upload_resource(api):
+    @api.resource_class("upload", "uploads")
+    class UploadResource(api):
+        @api.resource_method("", http_method="POST", give="$.data")
+        def create(self): pass
+
+    return api.resource("upload")
+
+
+def test_upload_file(api, server, tmp_path):
+    server.route("/api/uploads")(upload_route)
+    data = bytes(range(256)) * 1000
+    path = tmp_path / "upload.bin"
+    path.write_bytes(data)
+    progress = []
+    result = upload_resource(api).create(body=PyLapiUpload(str(path), chunk_size=65536, progress=lambda *_: progress.append(_)))
+    assert result == {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+    assert progress[-1] == (len(data), len(data))
+
+
+def test_async_upload_reads_off_event_loop(api, server):
+    pytest.importorskip("aiohttp")
+    server.route("/api/uploads")(upload_route)
+    data = bytes(range(256)) * 1000
+    file = RecordingFile(data)
+    progress = []
+
+    async def main():
+        try:
+            upload = PyLapiUpload(file, chunk_size=65536, progress=lambda *_: progress.append(_))
+            return await upload_resource(api).create(body=upload), threading.get_ident()
+        finally:
+            await api.aclose()
+
+    api.async_mode()
+    result, loop_thread = asyncio.run(main())
+    assert result == {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+    assert file.threads and loop_thread not in file.threads
+    assert progress[-1] == (len(data), len(data))
+
+
+def test_async_multipart_upload(api, server):
+    pytest.importorskip("aiohttp")
+    server.route("/api/uploads")(upload_route)
+    file = RecordingFile(b"x" * 100000)
+
+    async def main():
+        try:
+            return await upload_resource(api).create(data={"name": "file"}, files={"file": ("file.bin", file)})
+        finally:
+            await api.aclose()
+
+    api.async_mode()
+    result = asyncio.run(main())
+    assert result["size"] > 100000
+    assert threading.get_ident() not in file.threads
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pylapi import PyLapi
+from conftest import ApiServer
+
+
+class CountingServer(ApiServer):
+    # Counts the connections accepted
+    def __init__(self) -> None:
+        super().__init__()
+        self.connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+
+@pytest.fixture
+def other_api():
+    # A second API class on its own server, registered after the resources of `api`
+    other = CountingServer()
+    threading.Thread(target=other.serve_forever, daemon=True).start()
+
+    class oAPI(PyLapi):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            self.api_url = other.url
+
+    @oAPI.resource_class("other", "others")
+    class OtherResource(oAPI):
+        @oAPI.resource_method("{gid}", http_method="GET")
+        def get(self, gid): pass
+
+    yield oAPI, other
+    oAPI.close()
+    other.shutdown()
+
+
+def wait_for(condition, seconds=2):
+    end = time.perf_counter() + seconds
+    while not condition() and time.perf_counter() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_warmup_own_host(api, other_api):
+    api.resource("item")  # Registered before the other API class
+    oAPI, other = other_api
+    assert oAPI.warmup(connections=2) == 2
+    assert wait_for(lambda: other.connections == 2)
+
+
+def test_awarmup_own_host(api, other_api):
+    pytest.importorskip("aiohttp")
+    oAPI, other = other_api
+
+    async def main():
+        try:
+            return await oAPI.awarmup(connections=2)
+        finally:
+            await oAPI.aclose()
+
+    oAPI.async_mode()
+    assert asyncio.run(main()) == 2
+    assert wait_for(lambda: other.connections == 2)
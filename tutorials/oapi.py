@@ -633,3 +633,34 @@ class Conversation(oAPI):
                 self.response_data.update({
                     "answers": answers,
                 })
+
+    # Stream the answer as it is generated: yields the tokens of the first choice
+    @oAPI.resource_method(method_path="chat/completions", http_method="POST", give="$.choices[0].delta.content", stream=True)
+    def ask_stream(self, question: str):
+
+        @oAPI.callback
+        def request(self, role="user", model="gpt-3.5-turbo", **kwargs):
+            self.message_bank.append({
+                "role": role,
+                "content": kwargs["question"],
+            })
+            self.raw_request["json"] = {
+                "model": model,
+                "messages": self.message_bank,
+                "temperature": 0.7,
+                "stream": True,
+            }
+            self.raw_request["params"] = {}
+
+        @oAPI.callback
+        def response(self, **kwargs):
+            if self.response_ok():
+                # Work over the stream: keep the answer once all its tokens are given
+                def answer(tokens):
+                    content = ""
+                    for token in tokens:
+                        if token:
+                            content += token
+                            yield token
+                    self.message_bank.append({"role": "assistant", "content": content})
+                self._response_data = answer(self.response_data)